@@ -0,0 +1,230 @@
+import argparse
+import contextvars
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from battery_forecast import HOUR_NS, NS_PER_S, SegmentForecaster
+from bilge_stats import PumpDutyStats
+from columnar import ColumnBatch, decode_rows
+from instrumentation import begin_run, export_run, log_event, logger, span
+
+# Headless alert evaluator, runs without Streamlit next to (or instead of) the dashboard.
+# Usage: python alert_worker.py --interval 60 --sink file:alerts.jsonl
+
+ALERT_INTERVAL = float(os.environ.get("BOATSTATUS_ALERT_INTERVAL", "60"))  # Seconds between cycles
+# Rule thresholds: forecast time to 12V, and completed pump runs in the current hour
+ALERT_MIN_HOURS_TO_12V = float(os.environ.get("BOATSTATUS_ALERT_MIN_HOURS_TO_12V", "24"))
+ALERT_MAX_PUMP_CYCLES = int(os.environ.get("BOATSTATUS_ALERT_MAX_PUMP_CYCLES", "6"))
+# Boats refreshed concurrently, the work is mostly waiting on the server
+ALERT_WORKERS = int(os.environ.get("BOATSTATUS_ALERT_WORKERS", "4"))
+
+# Readings the voltage trend is fitted on, the same as the page's recent view
+FORECAST_WINDOW = timedelta(hours=24)
+# Pump history kept per boat, only the current hour is evaluated
+PUMP_HISTORY = timedelta(hours=2)
+
+BATTERY_COLUMNS = ['created_at', 'Voltage']
+PUMP_COLUMNS = ['id', 'created_at', 'Status', 'El_Time']
+
+Alert = namedtuple('Alert', ['boat', 'rule', 'state', 'value', 'threshold', 'message', 'at'])
+
+class StdoutSink:
+    def send(self, alert):
+        print(json.dumps(alert._asdict(), default=str), flush=True)
+
+class FileSink:
+    # One JSON line per alert, appended
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, alert):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(alert._asdict(), default=str) + '\n')
+
+def make_sink(spec):
+    # 'stdout' or 'file:<path>'
+    kind, _, arg = spec.partition(':')
+    if kind == 'stdout':
+        return StdoutSink()
+    if kind == 'file' and arg:
+        return FileSink(arg)
+    raise ValueError(f"Unknown alert sink: {spec}")
+
+class BoatMonitor:
+    # Incremental state of one boat: the voltage trend over the forecast window and the
+    # recent pump runs. Memory stays bounded by the two windows, not by the table size.
+    def __init__(self, boat, supabase):
+        self.boat = boat
+        self.supabase = supabase
+        self.forecast = SegmentForecaster(int(FORECAST_WINDOW.total_seconds()) * NS_PER_S)
+        self.pump = PumpDutyStats(retention_days=PUMP_HISTORY / timedelta(days=1))
+        self.cursors = {}  # table -> highest id applied
+        self.refreshed_at = {}  # table -> time of the last refresh that read it
+
+    def _window(self, table, columns, history, now):
+        return self.supabase.fetch_columns(table, now - history, now, columns)
+
+    def _new_rows(self, table, columns, history, now):
+        # Rows inserted after the id cursor, late uploads of older readings included. A
+        # missing cursor, or a last refresh older than the history the rules need, starts
+        # over from the window instead of replaying a long backlog.
+        last_id = self.cursors.get(table)
+        refreshed_at = self.refreshed_at.get(table)
+        if last_id is None or refreshed_at is None or refreshed_at < now - history:
+            batch = self._window(table, columns, history, now)
+            if last_id is not None and len(batch):
+                # Rows already applied stay out
+                new = batch['id'] > last_id
+                batch = ColumnBatch(table, {name: column[new] for name, column in batch.columns.items()})
+        else:
+            rows = self.supabase.fetch_rows_after(table, last_id, columns)
+            names = columns + [c for c in ('id',) if c not in columns]
+            batch = decode_rows(table, [tuple(row[name] for name in names) for row in rows], names).in_time_order()
+        if not getattr(batch, 'stale', False):
+            self.refreshed_at[table] = now
+            if len(batch):
+                self.cursors[table] = max(last_id or 0, int(batch['id'].max()))
+        return batch
+
+    def refresh(self, now):
+        battery = self._new_rows('BatteryStatus', BATTERY_COLUMNS, FORECAST_WINDOW, now)
+        rows = len(battery)
+        if rows:
+            if self.forecast.last_ns is not None and battery['created_at'][0] <= self.forecast.last_ns:
+                # Late readings predate the trend, which only takes newer ones: refit it
+                # from the whole window
+                self.forecast = SegmentForecaster(int(FORECAST_WINDOW.total_seconds()) * NS_PER_S)
+                battery = self._window('BatteryStatus', BATTERY_COLUMNS, FORECAST_WINDOW, now)
+            voltages = battery['Voltage'].astype(np.float64)
+            valid = ~np.isnan(voltages)
+            self.forecast.update(battery['created_at'][valid], voltages[valid])
+        pump = self._new_rows('BilgePumpStatus', PUMP_COLUMNS, PUMP_HISTORY, now)
+        if len(pump):
+            self.pump.update_columns(pump)
+        return rows + len(pump)
+
+class TimeTo12VRule:
+    name = 'time_to_12v'
+
+    def __init__(self, threshold=ALERT_MIN_HOURS_TO_12V):
+        self.threshold = threshold
+
+    def evaluate(self, monitor, now):
+        # Returns (value, firing, message), None when there is nothing to judge
+        forecast = monitor.forecast.time_to_voltage(12)
+        if forecast is None:
+            return None
+        hours = (forecast.time_ns - now.timestamp() * NS_PER_S) / HOUR_NS
+        # A rising voltage crosses 12V upwards, only discharging counts
+        return hours, forecast.slope < 0 and hours < self.threshold, f"Battery forecast to reach 12V in {hours:.1f} h"
+
+class PumpCyclesRule:
+    name = 'pump_cycles_per_hour'
+
+    def __init__(self, threshold=ALERT_MAX_PUMP_CYCLES):
+        self.threshold = threshold
+
+    def evaluate(self, monitor, now):
+        cycles = monitor.pump.cycles_in_last_hour(now)
+        return cycles, cycles > self.threshold, f"Bilge pump ran {cycles} times this hour"
+
+def default_rules():
+    return [TimeTo12VRule(), PumpCyclesRule()]
+
+class AlertWorker:
+    # Refreshes every boat with new rows only, evaluates the rules and sends an alert when
+    # a rule starts or stops firing (not on every cycle while it fires)
+    def __init__(self, boats, sink, rules=None, max_workers=ALERT_WORKERS, fleet=None):
+        # boats: name -> SupabaseClient reading that boat's telemetry; fleet: a FleetIndex
+        # (see fleet.py) whose boats are refreshed together with batched queries
+        self.monitors = {name: BoatMonitor(name, supabase) for name, supabase in boats.items()}
+        self.fleet = fleet
+        self.sink = sink
+        self.rules = rules if rules is not None else default_rules()
+        self.max_workers = max_workers
+        self.firing = set()  # (boat, rule) pairs currently in alert
+
+    def _evaluate(self, monitor, now):
+        for rule in self.rules:
+            result = rule.evaluate(monitor, now)
+            if result is None:
+                continue
+            value, firing, message = result
+            key = (monitor.boat, rule.name)
+            if firing == (key in self.firing):
+                continue
+            if firing:
+                self.firing.add(key)
+            else:
+                self.firing.discard(key)
+                message = f"Resolved: {message}"
+            self.sink.send(Alert(monitor.boat, rule.name, 'firing' if firing else 'resolved', value, rule.threshold, message, now))
+
+    def run_cycle(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        run = begin_run('alert_worker')
+
+        def refresh(monitor):
+            try:
+                return monitor.refresh(now)
+            except Exception as e:
+                logger.error(f"Error refreshing boat {monitor.boat}: {str(e)}")
+                return 0
+
+        # Worker threads record their queries into this cycle's run metrics
+        context = contextvars.copy_context()
+        with span('alerts.refresh', boats=len(self.monitors)):
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                rows = sum(executor.map(lambda m: context.copy().run(refresh, m), self.monitors.values()))
+            if self.fleet is not None:
+                try:
+                    rows += self.fleet.refresh(now)
+                except Exception as e:
+                    logger.error(f"Error refreshing fleet: {str(e)}")
+        # Fleet boat indexes carry the same forecast and pump state as a BoatMonitor
+        monitors = list(self.monitors.values()) + (list(self.fleet.boats.values()) if self.fleet is not None else [])
+        with span('alerts.evaluate'):
+            for monitor in monitors:
+                self._evaluate(monitor, now)
+        log_event("alert_cycle", boats=len(monitors), rows=rows, firing=len(self.firing))
+        export_run(run)
+        return rows
+
+    def run_forever(self, interval=ALERT_INTERVAL):
+        while True:
+            started = time.monotonic()
+            self.run_cycle()
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate battery and bilge pump alert rules")
+    parser.add_argument('--interval', type=float, default=ALERT_INTERVAL, help="seconds between cycles")
+    parser.add_argument('--sink', default='stdout', help="stdout or file:<path>")
+    parser.add_argument('--once', action='store_true', help="run a single cycle and exit")
+    args = parser.parse_args()
+
+    # No local cache or rollups, the worker only ever reads the rule windows
+    from supabase_client import SupabaseClient
+    from fleet import FLEET_BOATS, FleetIndex
+    supabase = SupabaseClient(cache_path='', rollup_path='')
+    if FLEET_BOATS:
+        worker = AlertWorker({}, make_sink(args.sink), fleet=FleetIndex(supabase, FLEET_BOATS))
+    else:
+        worker = AlertWorker({'default': supabase}, make_sink(args.sink))
+    if args.once:
+        worker.run_cycle()
+        return 0
+    try:
+        worker.run_forever(args.interval)
+    except KeyboardInterrupt:
+        return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
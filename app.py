@@ -1,14 +1,14 @@
-import streamlit as st
 import time
 
-# Force reload of supabase_client
-import importlib
-import supabase_client
-importlib.reload(supabase_client)
+# Time-to-first-paint is measured from here, before any heavy import
+SCRIPT_START = time.perf_counter()
 
+import streamlit as st
 from supabase_client import init_supabase
+from debug_panel import begin_page_run, render_debug_sidebar
+from instrumentation import record_span
 
-# Initialize Supabase client
+# Shared client, created once per process and reused across reruns and pages
 supabase = init_supabase()
 
 def login():
@@ -30,10 +30,13 @@ def logout():
     st.rerun()
 
 def main():
-    st.write(f"Last reload: {time.time()}")  # Add this line to show when the app was last reloaded
-    
+    begin_page_run("App")
+    record_span('app.client_ready', time.perf_counter() - SCRIPT_START)
+
     if 'user' not in st.session_state or st.session_state.user is None:
         login()
+        record_span('app.first_paint', time.perf_counter() - SCRIPT_START, page='login')
+        render_debug_sidebar()
         return
 
     st.title("Battery Status, Boat Positions, and Bilge Pump Dashboard")
@@ -41,6 +44,8 @@ def main():
 
     st.write("Welcome to the Dashboard!")
     st.write("Please select a page from the sidebar to view specific information.")
+    record_span('app.first_paint', time.perf_counter() - SCRIPT_START, page='dashboard')
+    render_debug_sidebar()
 
 if __name__ == '__main__':
     main()
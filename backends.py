@@ -0,0 +1,175 @@
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from instrumentation import count_bytes
+from columnar import BOAT_COLUMN, decode_csv, decode_rows
+
+# Telemetry schema used by the SQLite stand-in, mirrors the Supabase tables
+TABLE_COLUMNS = {
+    'BatteryStatus': {'Voltage': 'REAL'},
+    'BoatPositions': {'Lat': 'REAL', 'Long': 'REAL', 'Accuracy': 'REAL'},
+    'BilgePumpStatus': {'Status': 'TEXT', 'El_Time': 'REAL'},
+}
+
+def _iso(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+class SupabaseBackend:
+    # Reads through the Supabase PostgREST API
+    def __init__(self, client):
+        self.client = client
+        # Count response bytes of every PostgREST request towards the active query span
+        try:
+            self.client.postgrest.session.event_hooks['response'].append(self._count_response)
+        except AttributeError:
+            pass
+
+    @staticmethod
+    def _count_response(response):
+        response.read()
+        count_bytes(len(response.content))
+
+    def _filtered(self, table, columns, start=None, end=None, id_range=None, boats=None):
+        query = self.client.from_(table).select(columns)
+        if boats is not None:
+            # All boats of a fleet in one request
+            query = query.in_(BOAT_COLUMN, list(boats))
+        if start is not None:
+            query = query.gte('created_at', _iso(start))
+        if end is not None:
+            query = query.lte('created_at', _iso(end))
+        if id_range is not None:
+            query = query.gte('id', id_range[0]).lt('id', id_range[1])
+        return query
+
+    def _page_query(self, table, columns, start=None, end=None, after=None, limit=1000, id_range=None, boats=None,
+                    after_id=None):
+        query = self._filtered(table, columns, start, end, id_range, boats)
+        if after_id is not None:
+            # Rows inserted after the row with that id, in insert order
+            return query.gt('id', after_id).order('id').limit(limit)
+        if after is not None:
+            # Keyset cursor: rows strictly after (created_at, id) of the last row seen
+            created_at, row_id = after
+            query = query.or_(f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt.{row_id})')
+        return query.order('created_at').order('id').limit(limit)
+
+    def fetch_page(self, table, columns, start=None, end=None, after=None, limit=1000, id_range=None, boats=None,
+                   after_id=None):
+        return self._page_query(table, columns, start, end, after, limit, id_range, boats, after_id).execute().data
+
+    def fetch_columns(self, table, columns, start=None, end=None, after=None, limit=1000, id_range=None, boats=None,
+                      after_id=None):
+        # Same page as CSV, decoded into typed arrays without building row dicts
+        response = self._page_query(table, columns, start, end, after, limit, id_range, boats, after_id).csv().execute()
+        return decode_csv(table, response.data if isinstance(response.data, str) else '', columns.split(','))
+
+    def fetch_latest(self, table, columns, start=None, end=None, limit=1000, boats=None):
+        query = self._filtered(table, columns, start, end, boats=boats)
+        response = query.order('created_at', desc=True).order('id', desc=True).limit(limit).execute()
+        return response.data
+
+    def id_bounds(self, table, start=None, end=None, boats=None):
+        first = self._filtered(table, 'id', start, end, boats=boats).order('id').limit(1).execute().data
+        if not first:
+            return None
+        last = self._filtered(table, 'id', start, end, boats=boats).order('id', desc=True).limit(1).execute().data
+        return first[0]['id'], last[0]['id']
+
+def _utc_text(value):
+    # Fixed-width UTC text, so stored timestamps compare correctly as strings
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')
+
+class SQLiteBackend:
+    # Offline stand-in with the same read interface, used by benchmarks and for local
+    # development without a Supabase instance
+    def __init__(self, path=':memory:'):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        for table, columns in TABLE_COLUMNS.items():
+            definition = ', '.join(f'"{name}" {kind}' for name, kind in {**columns, BOAT_COLUMN: 'TEXT'}.items())
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{table}" (id INTEGER PRIMARY KEY, created_at TEXT NOT NULL, {definition})'
+            )
+            self._conn.execute(f'CREATE INDEX IF NOT EXISTS "{table}_created_at" ON "{table}" (created_at, id)')
+
+    def insert(self, table, columns):
+        # columns: name -> sequence, created_at as datetimes (or text already in the stored
+        # fixed-width UTC format, as the synthetic generator writes it)
+        columns = dict(columns)
+        columns['created_at'] = [value if isinstance(value, str) else _utc_text(value) for value in columns['created_at']]
+        names = list(columns)
+        rows = zip(*(columns[name] for name in names))
+        placeholders = ', '.join('?' for _ in names)
+        quoted = ', '.join(f'"{name}"' for name in names)
+        with self._lock, self._conn:
+            self._conn.executemany(f'INSERT INTO "{table}" ({quoted}) VALUES ({placeholders})', rows)
+
+    def count(self, table):
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+    def _select(self, table, columns, start=None, end=None, id_range=None, after=None, boats=None, after_id=None):
+        if columns == '*':
+            select = '*'
+        else:
+            select = ', '.join(f'"{c.strip()}"' for c in columns.split(','))
+        clauses, params = [], []
+        if start is not None:
+            clauses.append('created_at >= ?')
+            params.append(_utc_text(start))
+        if end is not None:
+            clauses.append('created_at <= ?')
+            params.append(_utc_text(end))
+        if id_range is not None:
+            clauses.append('id >= ? AND id < ?')
+            params.extend(id_range)
+        if after is not None:
+            created_at, row_id = after
+            clauses.append('(created_at > ? OR (created_at = ? AND id > ?))')
+            params.extend([_utc_text(created_at), _utc_text(created_at), row_id])
+        if after_id is not None:
+            clauses.append('id > ?')
+            params.append(after_id)
+        if boats is not None:
+            boats = list(boats)
+            clauses.append(f'"{BOAT_COLUMN}" IN ({", ".join("?" for _ in boats)})')
+            params.extend(boats)
+        sql = f'SELECT {select} FROM "{table}"'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        return sql, params
+
+    def _rows(self, sql, params):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def fetch_page(self, table, columns, start=None, end=None, after=None, limit=1000, id_range=None, boats=None,
+                   after_id=None):
+        sql, params = self._select(table, columns, start, end, id_range, after, boats, after_id)
+        order = 'id' if after_id is not None else 'created_at, id'
+        return self._rows(sql + f' ORDER BY {order} LIMIT ?', params + [limit])
+
+    def fetch_columns(self, table, columns, start=None, end=None, after=None, limit=1000, id_range=None, boats=None,
+                      after_id=None):
+        sql, params = self._select(table, columns, start, end, id_range, after, boats, after_id)
+        order = 'id' if after_id is not None else 'created_at, id'
+        with self._lock:
+            rows = self._conn.execute(sql + f' ORDER BY {order} LIMIT ?', params + [limit]).fetchall()
+        return decode_rows(table, rows, [c.strip() for c in columns.split(',')])
+
+    def fetch_latest(self, table, columns, start=None, end=None, limit=1000, boats=None):
+        sql, params = self._select(table, columns, start, end, boats=boats)
+        return self._rows(sql + ' ORDER BY created_at DESC, id DESC LIMIT ?', params + [limit])
+
+    def id_bounds(self, table, start=None, end=None, boats=None):
+        sql, params = self._select(table, 'id', start, end, boats=boats)
+        sql = sql.replace('SELECT "id"', 'SELECT MIN(id), MAX(id)', 1)
+        with self._lock:
+            first, last = self._conn.execute(sql, params).fetchone()
+        return None if first is None else (first, last)
@@ -0,0 +1,353 @@
+from collections import deque, namedtuple
+import numpy as np
+import pandas as pd
+
+NS_PER_S = 1_000_000_000
+HOUR_NS = 3600 * NS_PER_S
+
+# Times are epoch nanoseconds, lower/upper bound the confidence interval (upper is None
+# when the slope interval includes zero, i.e. the target may never be reached)
+Forecast = namedtuple('Forecast', ['time_ns', 'lower_ns', 'upper_ns', 'slope', 'intercept', 'r_value'])
+
+def epoch_ns(series):
+    # Datetime column to int64 epoch nanoseconds without a Python call per row
+    return pd.DatetimeIndex(series).as_unit('ns').asi8
+
+class LinearTrend:
+    # Running least-squares statistics (means and co-moments, Welford style) so points
+    # can be added or removed in O(1) without losing precision on large epochs.
+    def __init__(self):
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.sxx = 0.0
+        self.sxy = 0.0
+        self.syy = 0.0
+
+    def add(self, x, y):
+        self.n += 1
+        dx = x - self.mean_x
+        dy = y - self.mean_y
+        self.mean_x += dx / self.n
+        self.mean_y += dy / self.n
+        self.sxx += dx * (x - self.mean_x)
+        self.sxy += dx * (y - self.mean_y)
+        self.syy += dy * (y - self.mean_y)
+
+    def remove(self, x, y):
+        if self.n <= 1:
+            self.__init__()
+            return
+        mean_x = (self.n * self.mean_x - x) / (self.n - 1)
+        mean_y = (self.n * self.mean_y - y) / (self.n - 1)
+        self.sxx -= (x - mean_x) * (x - self.mean_x)
+        self.sxy -= (x - mean_x) * (y - self.mean_y)
+        self.syy -= (y - mean_y) * (y - self.mean_y)
+        self.n -= 1
+        self.mean_x, self.mean_y = mean_x, mean_y
+
+    def add_arrays(self, x, y):
+        # Merge a whole batch at once (Chan et al. pairwise update)
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        nb = len(x)
+        if nb == 0:
+            return
+        mean_xb, mean_yb = x.mean(), y.mean()
+        dxb, dyb = x - mean_xb, y - mean_yb
+        na, n = self.n, self.n + nb
+        dx, dy = mean_xb - self.mean_x, mean_yb - self.mean_y
+        self.sxx += dxb @ dxb + dx * dx * na * nb / n
+        self.sxy += dxb @ dyb + dx * dy * na * nb / n
+        self.syy += dyb @ dyb + dy * dy * na * nb / n
+        self.mean_x += dx * nb / n
+        self.mean_y += dy * nb / n
+        self.n = n
+
+    def fit(self):
+        if self.n < 2 or self.sxx <= 0:
+            return None
+        slope = self.sxy / self.sxx
+        intercept = self.mean_y - slope * self.mean_x
+        r_value = self.sxy / np.sqrt(self.sxx * self.syy) if self.syy > 0 else 0.0
+        return slope, intercept, r_value
+
+    def slope_stderr(self):
+        if self.n < 3 or self.sxx <= 0:
+            return np.inf
+        slope = self.sxy / self.sxx
+        residual = max(self.syy - slope * self.sxy, 0.0) / (self.n - 2)
+        return np.sqrt(residual / self.sxx)
+
+    def time_to(self, target, confidence=0.95):
+        # When the fitted line crosses target, in the unit of x, bounded by the slope's
+        # confidence interval. The far bound is None if that interval includes zero.
+        fitted = self.fit()
+        if fitted is None or fitted[0] == 0:
+            return None
+        slope, intercept, r_value = fitted
+        delta = target - self.mean_y
+        crossing = self.mean_x + delta / slope
+        if self.n < 3:
+            return crossing, None, None, slope, intercept, r_value
+        # scipy is slow to import, load it on the first forecast only
+        from scipy import stats
+        margin = stats.t.ppf(0.5 + confidence / 2, self.n - 2) * self.slope_stderr()
+        steep, shallow = slope + np.copysign(margin, slope), slope - np.copysign(margin, slope)
+        near = self.mean_x + delta / steep
+        far = self.mean_x + delta / shallow if shallow * slope > 0 else None
+        lower, upper = (near, far) if far is None or near <= far else (far, near)
+        return crossing, lower, upper, slope, intercept, r_value
+
+    def band(self, x, confidence=0.95):
+        # Fitted line at x and the lines at either end of the slope's confidence interval
+        # (steeper first), all through the mean point; None before there is a fit
+        fitted = self.fit()
+        if fitted is None:
+            return None
+        slope = fitted[0]
+        margin = 0.0
+        if self.n >= 3:
+            from scipy import stats
+            margin = stats.t.ppf(0.5 + confidence / 2, self.n - 2) * self.slope_stderr()
+        dx = np.asarray(x, dtype=np.float64) - self.mean_x
+        steep, shallow = slope + np.copysign(margin, slope), slope - np.copysign(margin, slope)
+        return self.mean_y + slope * dx, self.mean_y + steep * dx, self.mean_y + shallow * dx
+
+class SlidingForecast:
+    # Linear trend over the readings of the last window_ns nanoseconds (all of them when
+    # window_ns is None). Appending readings and evicting old ones are O(1) each.
+    def __init__(self, window_ns=None):
+        self.window_ns = window_ns
+        self.trend = LinearTrend()
+        self._times = deque()
+        self._values = deque()
+
+    @property
+    def last_ns(self):
+        return self._times[-1] if self._times else None
+
+    def update(self, times_ns, voltages):
+        times_ns = np.asarray(times_ns, dtype=np.int64)
+        voltages = np.asarray(voltages, dtype=np.float64)
+        # Only readings newer than the last one seen are appended
+        if self._times:
+            newer = times_ns > self._times[-1]
+            times_ns, voltages = times_ns[newer], voltages[newer]
+        if len(times_ns) == 0:
+            return
+        if self.window_ns is not None:
+            cutoff = times_ns[-1] - self.window_ns
+            keep = times_ns >= cutoff
+            times_ns, voltages = times_ns[keep], voltages[keep]
+            while self._times and self._times[0] < cutoff:
+                self.trend.remove(self._times.popleft() / NS_PER_S, self._values.popleft())
+        self.trend.add_arrays(times_ns / NS_PER_S, voltages)
+        self._times.extend(times_ns.tolist())
+        self._values.extend(voltages.tolist())
+
+    def time_to_voltage(self, target_voltage=12.0, confidence=0.95):
+        result = self.trend.time_to(target_voltage, confidence)
+        if result is None:
+            return None
+        crossing, lower, upper, slope, intercept, r_value = result
+        to_ns = lambda seconds: None if seconds is None else int(seconds * NS_PER_S)
+        return Forecast(to_ns(crossing), to_ns(lower), to_ns(upper), slope, intercept, r_value)
+
+# Charge-cycle segmentation: a reading's phase comes from the slope of the readings within
+# PHASE_WINDOW_S seconds around it. A slope counts only when it clears PHASE_SLOPE_Z
+# standard errors and PHASE_SLOPE_V_PER_H, anything weaker is noise and keeps the phase
+# before it; phases shorter than MIN_SEGMENT_S are absorbed too. Both are times, so the
+# segmentation does not change with the logging interval.
+PHASE_WINDOW_S = 2 * 3600
+PHASE_SLOPE_Z = 3.0
+PHASE_SLOPE_V_PER_H = 0.02
+MIN_SEGMENT_S = 3600
+# Closed segments remembered by a SegmentForecaster
+MAX_SEGMENTS = 256
+# Readings behind the current discharge rate
+RATE_READINGS = 30
+
+CHARGE, DISCHARGE = 1, -1
+PHASE_NAMES = {CHARGE: 'charge', DISCHARGE: 'discharge'}
+
+# Times in epoch nanoseconds, slope in V/h of the least-squares line through the segment
+Segment = namedtuple('Segment', ['start_ns', 'end_ns', 'phase', 'readings', 'slope'])
+
+def window_fit(x, y, lo, hi):
+    # Slope, intercept and slope standard error of the least-squares line through
+    # x[lo[i]:hi[i]] for every i, all windows at once from prefix sums instead of a fit
+    # per window. The standard error is inf for windows of fewer than three points.
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(lo)
+    # Relative to the first point and the mean, keeps the sums small enough not to cancel
+    x0, y0 = x[0], y.mean()
+    x, y = x - x0, y - y0
+    k = (hi - lo).astype(np.float64)
+    count = np.maximum(k, 1)
+
+    def windowed(values):
+        total = np.r_[0.0, np.cumsum(values)]
+        return total[hi] - total[lo]
+
+    sx, sy = windowed(x), windowed(y)
+    sxx = windowed(x * x) - sx * sx / count
+    sxy = windowed(x * y) - sx * sy / count
+    syy = windowed(y * y) - sy * sy / count
+    valid = (k >= 2) & (sxx > 0)
+    slope = np.divide(sxy, sxx, out=np.zeros(n), where=valid)
+    intercept = y0 + sy / count - slope * (x0 + sx / count)
+    residual = np.maximum(syy - slope * sxy, 0.0) / np.maximum(k - 2, 1)
+    stderr = np.sqrt(np.divide(residual, sxx, out=np.full(n, np.inf), where=valid & (k >= 3)))
+    return slope, intercept, stderr
+
+def rolling_fit(x, y, window):
+    # Slope and intercept of the least-squares line through every trailing window of
+    # `window` points (fewer at the start)
+    n = len(x)
+    if n == 0:
+        return np.empty(0), np.empty(0)
+    hi = np.arange(1, n + 1)
+    slope, intercept, _ = window_fit(x, y, np.maximum(hi - window, 0), hi)
+    return slope, intercept
+
+def _fill(labels, initial):
+    # Unknown (0) labels take the label before them, leading ones `initial`
+    known = np.where(labels != 0, np.arange(len(labels)), 0)
+    np.maximum.accumulate(known, out=known)
+    filled = labels[known]
+    return np.where(filled != 0, filled, initial)
+
+def _runs(labels):
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    return starts, np.r_[starts[1:], len(labels)]
+
+def segment_phases(times_ns, voltages, window_s=PHASE_WINDOW_S, threshold=PHASE_SLOPE_V_PER_H,
+                   min_segment_s=MIN_SEGMENT_S, initial=DISCHARGE, z=PHASE_SLOPE_Z):
+    # Phase label (CHARGE/DISCHARGE) of every reading and the [start, end) positions of
+    # the phase runs, in one vectorized pass
+    times_ns = np.asarray(times_ns, dtype=np.int64)
+    n = len(times_ns)
+    if n == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    # Each reading is judged by the window centred on it, a trailing window lags
+    half_ns = window_s * NS_PER_S // 2
+    lo = np.searchsorted(times_ns, times_ns - half_ns, side='left')
+    hi = np.searchsorted(times_ns, times_ns + half_ns, side='right')
+    slope, _, stderr = window_fit((times_ns - times_ns[0]) / HOUR_NS, voltages, lo, hi)
+    # Hysteresis: a slope inside the noise band keeps the phase before it
+    bound = np.maximum(z * stderr, threshold)
+    labels = np.where(slope > bound, CHARGE, np.where(slope < -bound, DISCHARGE, 0))
+    labels = _fill(labels, initial)
+    starts, ends = _runs(labels)
+    # A run lasts until the next one starts. The last run is still open and may grow,
+    # only closed runs count as too short.
+    short = times_ns[ends[:-1]] - times_ns[starts[:-1]] < min_segment_s * NS_PER_S
+    if short.any():
+        short = np.r_[short, False]
+        labels = _fill(np.where(np.repeat(short, ends - starts), 0, labels), initial)
+        starts, ends = _runs(labels)
+    return labels, starts, ends
+
+class SegmentForecaster:
+    # 12V forecast from the current discharge segment only, so solar or shore charging
+    # in the range does not bend the trend. Closed segments are kept as summaries; new
+    # readings re-segment only the open segment (plus one slope window before it for
+    # context), and its fit is a SlidingForecast fed the new readings only unless the
+    # segment changed. window_ns caps how far back the open segment is fitted.
+    def __init__(self, window_ns=None, phase_window_s=PHASE_WINDOW_S, threshold=PHASE_SLOPE_V_PER_H,
+                 min_segment_s=MIN_SEGMENT_S):
+        self.window_ns = window_ns
+        self.phase_window_s = phase_window_s
+        self.threshold = threshold
+        self.min_segment_s = min_segment_s
+        self.segments = deque(maxlen=MAX_SEGMENTS)
+        self.current = SlidingForecast(window_ns)
+        self.phase = None
+        self._times = np.empty(0, dtype=np.int64)
+        self._values = np.empty(0)
+        self._open = 0  # Position of the open segment's first reading
+
+    @property
+    def last_ns(self):
+        return int(self._times[-1]) if len(self._times) else None
+
+    @property
+    def segment_start_ns(self):
+        return int(self._times[self._open]) if len(self._times) else None
+
+    @property
+    def phase_name(self):
+        return PHASE_NAMES.get(self.phase)
+
+    def _context_start(self, time_ns):
+        # First reading within one slope window before time_ns
+        return int(np.searchsorted(self._times, time_ns - self.phase_window_s * NS_PER_S))
+
+    def update(self, times_ns, voltages):
+        times_ns = np.asarray(times_ns, dtype=np.int64)
+        voltages = np.asarray(voltages, dtype=np.float64)
+        if len(self._times):
+            newer = times_ns > self._times[-1]
+            times_ns, voltages = times_ns[newer], voltages[newer]
+        if len(times_ns) == 0:
+            return
+        self._times = np.concatenate((self._times, times_ns))
+        self._values = np.concatenate((self._values, voltages))
+
+        context = self._context_start(self._times[self._open])
+        labels, starts, ends = segment_phases(
+            self._times[context:], self._values[context:], self.phase_window_s, self.threshold,
+            self.min_segment_s, self.phase or DISCHARGE)
+        starts, ends = starts + context, ends + context
+        # Readings before the open segment only gave the slopes context
+        keep = ends > self._open
+        starts, ends = np.maximum(starts[keep], self._open), ends[keep]
+        for start, end in zip(starts[:-1], ends[:-1]):
+            self._close(start, end, labels[start - context])
+        first_new = len(self._times) - len(times_ns)
+        if starts[-1] != self._open or self.phase != labels[starts[-1] - context]:
+            # The open segment moved, refit it from its first reading
+            self._open = int(starts[-1])
+            self.phase = int(labels[self._open - context])
+            self.current = SlidingForecast(self.window_ns)
+            first_new = self._open
+        self.current.update(self._times[first_new:], self._values[first_new:])
+
+        # Closed readings are no longer needed beyond the context of the next pass, and an
+        # open segment longer than the fit window keeps only the window
+        cut = self._context_start(self._times[self._open])
+        if self.window_ns is not None:
+            cut = max(cut, self._context_start(self._times[-1] - self.window_ns))
+        if cut > 0:
+            self._times, self._values = self._times[cut:], self._values[cut:]
+            self._open = max(self._open - cut, 0)
+
+    def _close(self, start, end, phase):
+        trend = LinearTrend()
+        trend.add_arrays(self._times[start:end] / HOUR_NS, self._values[start:end])
+        fitted = trend.fit()
+        self.segments.append(Segment(int(self._times[start]), int(self._times[end - 1]), PHASE_NAMES[int(phase)],
+                                     int(end - start), float(fitted[0]) if fitted else None))
+
+    def time_to_voltage(self, target_voltage=12.0, confidence=0.95):
+        # None while charging, a charging battery does not run down to 12V
+        if self.phase != DISCHARGE:
+            return None
+        return self.current.time_to_voltage(target_voltage, confidence)
+
+    def band(self, times_ns, confidence=0.95):
+        # (fit, steep, shallow) voltages of the current segment's trend at times_ns
+        if self.phase != DISCHARGE:
+            return None
+        return self.current.trend.band(np.asarray(times_ns, dtype=np.int64) / NS_PER_S, confidence)
+
+    def rate(self, readings=RATE_READINGS):
+        # Discharge or charge rate in V/h over the latest readings of the open segment
+        start = max(self._open, len(self._times) - readings)
+        if len(self._times) - start < 2:
+            return None
+        slope, _ = rolling_fit(self._times[start:] / HOUR_NS, self._values[start:], readings)
+        return float(slope[-1])
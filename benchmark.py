@@ -0,0 +1,175 @@
+import argparse
+import contextlib
+import json
+import logging
+import platform
+import subprocess
+import time
+from datetime import datetime, timedelta, timezone
+
+from backends import SQLiteBackend
+from battery_forecast import SegmentForecaster, epoch_ns
+from bilge_stats import PumpDutyStats
+from instrumentation import logger
+from downsampling import CHART_WIDTH_PX, downsample, pixel_budget
+from rollups import pick_resolution
+from supabase_client import SupabaseClient
+from synthetic_telemetry import populate
+from track_processing import simplify_track, track_colors
+from time_window import slice_window
+
+# Offline benchmark of the dashboard pipelines against the SQLite stand-in backend.
+# Usage: python benchmark.py --rows 10000 1000000 --days 1 30
+
+RESULTS_PATH = "bench_results.jsonl"
+
+class Timer:
+    def __init__(self):
+        self.timings = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        yield
+        self.timings[name] = time.perf_counter() - start
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+def _latest_time(client, table):
+    row = client.backend.fetch_latest(table, 'created_at', limit=1)[0]
+    return datetime.fromisoformat(row['created_at'])
+
+def _chart_spec_bytes(df):
+    try:
+        import altair as alt
+    except ImportError:
+        return None
+    chart = alt.Chart(df).mark_line().encode(x='created_at:T', y='Voltage:Q')
+    return len(chart.to_json())
+
+def bench_battery(client, days):
+    timer = Timer()
+    end = _latest_time(client, 'BatteryStatus')
+    start = end - timedelta(days=days)
+    # Same choice as the page: aggregates once they still fill the chart
+    resolution = pick_resolution(start, end, pixel_budget(CHART_WIDTH_PX))
+    if resolution is not None:
+        with timer.stage('fetch_rollup'):
+            df = client.fetch_rollup('BatteryStatus', resolution, start, end)
+    else:
+        with timer.stage('fetch'):
+            batch = client.fetch_columns('BatteryStatus', start, end, ['created_at', 'Voltage'], bulk=days > 7)
+        with timer.stage('frame'):
+            df = batch.to_frame()
+    with timer.stage('filter'):
+        df = slice_window(df, start, end)
+    with timer.stage('regression'):
+        forecaster = SegmentForecaster()
+        forecaster.update(epoch_ns(df['created_at']), df['Voltage'].to_numpy())
+        forecaster.time_to_voltage(12)
+    with timer.stage('downsample'):
+        df_chart = downsample(df, 'created_at', 'Voltage', pixel_budget(CHART_WIDTH_PX))
+    with timer.stage('chart_spec'):
+        spec_bytes = _chart_spec_bytes(df_chart)
+    return {'rows_fetched': len(df), 'resolution': resolution, 'chart_points': len(df_chart), 'chart_spec_bytes': spec_bytes, 'timings': timer.timings}
+
+def bench_positions(client, days, zoom=11):
+    timer = Timer()
+    end = _latest_time(client, 'BoatPositions')
+    start = end - timedelta(days=days)
+    with timer.stage('fetch'):
+        batch = client.fetch_columns('BoatPositions', start, end, ['created_at', 'Lat', 'Long', 'Accuracy'], bulk=days > 7)
+    with timer.stage('frame'):
+        df = batch.to_frame()
+    with timer.stage('simplify'):
+        lat = df['Lat'].to_numpy(dtype='float64')
+        lon = df['Long'].to_numpy(dtype='float64')
+        idx = simplify_track(lat, lon, zoom)
+        colors = track_colors(len(idx))
+    with timer.stage('layer_payload'):
+        payload = json.dumps({
+            'Long': lon[idx].round(6).tolist(),
+            'Lat': lat[idx].round(6).tolist(),
+            'color': colors.tolist(),
+        })
+    return {'rows_fetched': len(batch), 'points_drawn': len(idx), 'layer_bytes': len(payload), 'timings': timer.timings}
+
+def bench_bilge(client, days):
+    timer = Timer()
+    end = _latest_time(client, 'BilgePumpStatus')
+    start = end - timedelta(days=days)
+    with timer.stage('fetch_recent'):
+        client.fetch_latest_columns('BilgePumpStatus', ['created_at', 'Status', 'El_Time'], limit=10)
+    with timer.stage('fetch'):
+        batch = client.fetch_columns('BilgePumpStatus', start, end, ['created_at', 'Status', 'El_Time'])
+    with timer.stage('stats'):
+        stats = PumpDutyStats()
+        stats.update_columns(batch)
+    return {'rows_fetched': len(batch), 'timings': timer.timings}
+
+BENCHMARKS = {'battery': bench_battery, 'positions': bench_positions, 'bilge': bench_bilge}
+
+def run(rows, days_list, seed=0):
+    backend = SQLiteBackend()
+    started = time.perf_counter()
+    populate(backend, rows, seed=seed)
+    print(f"Generated {rows} rows per table in {time.perf_counter() - started:.1f}s")
+    # No local cache, every stage measures the backend round trip. Rollups are kept in
+    # memory, their first read includes building them from the whole table.
+    client = SupabaseClient(backend=backend, cache_path='', rollup_path=':memory:')
+    results = []
+    for days in days_list:
+        for page, bench in BENCHMARKS.items():
+            result = bench(client, days)
+            result.update({'page': page, 'table_rows': rows, 'days': days})
+            results.append(result)
+            total = sum(result['timings'].values())
+            stages = ', '.join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in result['timings'].items())
+            print(f"{page:<10} {rows:>10} rows {days:>4}d  {total * 1000:8.1f}ms  ({stages})")
+    return results
+
+def compare(results, path):
+    # Print the change against the most recent stored run of the same configuration
+    previous = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                previous[(record['page'], record['table_rows'], record['days'])] = record
+    except FileNotFoundError:
+        return
+    for result in results:
+        before = previous.get((result['page'], result['table_rows'], result['days']))
+        if before is None:
+            continue
+        old, new = sum(before['timings'].values()), sum(result['timings'].values())
+        change = (new - old) / old * 100 if old else 0.0
+        print(f"{result['page']:<10} {result['table_rows']:>10} rows {result['days']:>4}d  "
+              f"{change:+6.1f}% vs {before.get('revision') or 'previous run'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard pipelines on synthetic telemetry")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--days', type=float, nargs='+', default=[1, 30])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=RESULTS_PATH)
+    args = parser.parse_args()
+    # Per-query log lines would drown the results
+    logger.setLevel(logging.WARNING)
+
+    revision = _git_revision()
+    run_at = datetime.now(timezone.utc).isoformat()
+    for rows in args.rows:
+        results = run(rows, args.days, args.seed)
+        compare(results, args.output)
+        with open(args.output, 'a') as f:
+            for result in results:
+                result.update({'revision': revision, 'run_at': run_at, 'python': platform.python_version()})
+                f.write(json.dumps(result) + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+
+# Days of hourly/daily buckets kept in memory
+STATS_RETENTION_DAYS = 30
+
+def _parse_time(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+HOUR_NS = 3600 * 1_000_000_000
+DAY_NS = 24 * HOUR_NS
+
+def _from_ns(ns):
+    return pd.Timestamp(int(ns), unit='ns', tz='UTC').to_pydatetime()
+
+class PumpDutyStats:
+    # Bilge pump duty-cycle statistics updated from new events only. A pump event with a
+    # positive El_Time is one completed run lasting El_Time seconds.
+    def __init__(self, retention_days=STATS_RETENTION_DAYS):
+        self.retention = timedelta(days=retention_days)
+        self.cycles_per_hour = {}   # UTC hour start -> completed runs
+        self.runtime_per_day = {}   # UTC date -> total El_Time seconds
+        self.longest_per_day = {}   # UTC date -> longest El_Time seconds
+        self.last_id = None         # highest event id applied
+        self.latest = None          # created_at of the newest event applied
+
+    def since(self):
+        # Start bound for the next delta query (events at the bound are skipped in update)
+        return self.latest
+
+    def update(self, rows):
+        # Events are told apart by id and the sums do not depend on order, so rows can
+        # come in any order, late uploads older than the newest event included
+        last_id = self.last_id
+        applied = 0
+        for row in rows:
+            row_id = row.get('id', 0)
+            if last_id is not None and row_id <= last_id:
+                continue
+            created_at = _parse_time(row['created_at'])
+            self.last_id = row_id if self.last_id is None else max(self.last_id, row_id)
+            self.latest = created_at if self.latest is None else max(self.latest, created_at)
+            applied += 1
+            try:
+                runtime = float(row.get('El_Time') or 0)
+            except (TypeError, ValueError):
+                runtime = 0.0
+            # NaN (a missing El_Time) is not a run either
+            if not runtime > 0:
+                continue
+            hour = created_at.replace(minute=0, second=0, microsecond=0)
+            day = created_at.date()
+            self.cycles_per_hour[hour] = self.cycles_per_hour.get(hour, 0) + 1
+            self.runtime_per_day[day] = self.runtime_per_day.get(day, 0.0) + runtime
+            self.longest_per_day[day] = max(self.longest_per_day.get(day, 0.0), runtime)
+        if applied:
+            self._evict()
+        return applied
+
+    def update_columns(self, batch):
+        # update() for a ColumnBatch: the runs are bucketed per hour and per day with
+        # array operations, no row dicts are built
+        if not len(batch):
+            return 0
+        times = batch['created_at']
+        ids = batch['id']
+        runtime = batch['El_Time'].astype(np.float64)
+        if self.last_id is not None:
+            new = ids > self.last_id
+            times, ids, runtime = times[new], ids[new], runtime[new]
+            if not len(times):
+                return 0
+        self.last_id = max(self.last_id or 0, int(ids.max()))
+        latest = _from_ns(times.max())
+        self.latest = latest if self.latest is None else max(self.latest, latest)
+        run = runtime > 0
+        run_times, run_seconds = times[run], runtime[run]
+        hours, cycles = np.unique(run_times // HOUR_NS, return_counts=True)
+        for hour, count in zip(hours, cycles):
+            key = _from_ns(hour * HOUR_NS)
+            self.cycles_per_hour[key] = self.cycles_per_hour.get(key, 0) + int(count)
+        days, day_of_run = np.unique(run_times // DAY_NS, return_inverse=True)
+        totals = np.bincount(day_of_run, weights=run_seconds, minlength=len(days))
+        longest = np.zeros(len(days))
+        np.maximum.at(longest, day_of_run, run_seconds)
+        for day, total, run_max in zip(days, totals, longest):
+            key = _from_ns(day * DAY_NS).date()
+            self.runtime_per_day[key] = self.runtime_per_day.get(key, 0.0) + float(total)
+            self.longest_per_day[key] = max(self.longest_per_day.get(key, 0.0), float(run_max))
+        self._evict()
+        return len(times)
+
+    def _evict(self):
+        cutoff = self.latest - self.retention
+        for hour in [h for h in self.cycles_per_hour if h < cutoff]:
+            del self.cycles_per_hour[hour]
+        for day in [d for d in self.runtime_per_day if d < cutoff.date()]:
+            del self.runtime_per_day[day]
+            self.longest_per_day.pop(day, None)
+
+    def cycles_in_last_hour(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        hour = now.replace(minute=0, second=0, microsecond=0)
+        return self.cycles_per_hour.get(hour, 0)
+
+    def longest_run(self):
+        return max(self.longest_per_day.values(), default=0.0)
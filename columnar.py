@@ -0,0 +1,121 @@
+import io
+import os
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Decoded type of every telemetry column: 'timestamp' becomes int64 epoch nanoseconds,
+# 'category' a pandas Categorical, anything else a NumPy dtype. Positions stay float64,
+# float32 would round a fix to about a metre
+TABLE_SCHEMAS = {
+    'BatteryStatus': {'id': 'int64', 'created_at': 'timestamp', 'Voltage': 'float32'},
+    'BoatPositions': {'id': 'int64', 'created_at': 'timestamp', 'Lat': 'float64', 'Long': 'float64', 'Accuracy': 'float32'},
+    'BilgePumpStatus': {'id': 'int64', 'created_at': 'timestamp', 'Status': 'category', 'El_Time': 'float32'},
+}
+
+# Column telling the boats of a fleet apart, present only in multi-boat deployments
+BOAT_COLUMN = os.environ.get("BOATSTATUS_BOAT_COLUMN", "boat_id")
+
+def _schema(table):
+    # The boat column is a handful of repeated ids, kept as a categorical
+    return {**TABLE_SCHEMAS.get(table, {}), BOAT_COLUMN: 'category'}
+
+def _ns_to_iso(ns):
+    # Postgres keeps microseconds, so the round trip through the cursor is exact
+    seconds, remainder = divmod(int(ns), 1_000_000_000)
+    moment = datetime.fromtimestamp(seconds, tz=timezone.utc).replace(microsecond=remainder // 1000)
+    return moment.isoformat()
+
+def _convert(values, kind):
+    if kind == 'timestamp':
+        values = np.asarray(values)
+        if values.dtype.kind in 'iu':
+            # Already epoch nanoseconds
+            return values.astype(np.int64)
+        return pd.DatetimeIndex(pd.to_datetime(values, format='ISO8601', utc=True)).as_unit('ns').asi8
+    if kind == 'category':
+        return pd.Categorical(values)
+    if kind is None:
+        return np.asarray(values, dtype=object)
+    return np.asarray(values, dtype=kind)
+
+class ColumnBatch:
+    # Typed column arrays of one table, in (created_at, id) order
+    # Set on copies served from the last-known-good data, see transport.mark_stale
+    stale = False
+    as_of = None
+    error = None
+
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = columns
+
+    @classmethod
+    def empty(cls, table, names):
+        schema = _schema(table)
+        return cls(table, {name: _convert([], schema.get(name)) for name in names})
+
+    @classmethod
+    def concat(cls, table, batches, names):
+        batches = [b for b in batches if len(b)]
+        if not batches:
+            return cls.empty(table, names)
+        if len(batches) == 1:
+            return batches[0]
+        columns = {}
+        for name in batches[0].columns:
+            parts = [b.columns[name] for b in batches]
+            columns[name] = union_categoricals(parts) if isinstance(parts[0], pd.Categorical) else np.concatenate(parts)
+        return cls(table, columns)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def in_time_order(self):
+        # Rows sorted by (created_at, id), the batch itself when it already is
+        times = self.columns['created_at']
+        if len(times) < 2 or not np.any(np.diff(times) < 0):
+            return self
+        order = np.lexsort((self.columns['id'], times))
+        return ColumnBatch(self.table, {name: column[order] for name, column in self.columns.items()})
+
+    def last_cursor(self):
+        return _ns_to_iso(self.columns['created_at'][-1]), int(self.columns['id'][-1])
+
+    def to_frame(self):
+        data = {}
+        for name, values in self.columns.items():
+            if name == 'created_at':
+                values = pd.to_datetime(values, unit='ns', utc=True)
+            data[name] = values
+        df = pd.DataFrame(data)
+        if self.stale:
+            df.attrs.update(stale=True, as_of=self.as_of, error=self.error)
+        return df
+
+def decode_csv(table, text, names):
+    # PostgREST CSV response straight into typed arrays, no per-row Python objects
+    if not text or not text.strip():
+        return ColumnBatch.empty(table, names)
+    schema = _schema(table)
+    dtypes = {name: kind for name, kind in schema.items() if kind not in ('timestamp', 'int64')}
+    frame = pd.read_csv(io.StringIO(text), dtype=dtypes)
+    if frame.empty:
+        return ColumnBatch.empty(table, names)
+    columns = {}
+    for name in frame.columns:
+        kind = schema.get(name)
+        # read_csv already produced categoricals and floats of the right type
+        columns[name] = frame[name].array if kind == 'category' else _convert(frame[name].to_numpy(), kind)
+    return ColumnBatch(table, columns)
+
+def decode_rows(table, rows, names):
+    # Row tuples (e.g. from SQLite) into typed arrays, one column at a time
+    if not rows:
+        return ColumnBatch.empty(table, names)
+    schema = _schema(table)
+    return ColumnBatch(table, {name: _convert(values, schema.get(name)) for name, values in zip(names, zip(*rows))})
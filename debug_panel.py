@@ -0,0 +1,40 @@
+import os
+import streamlit as st
+from query_cache import shared_cache
+from instrumentation import begin_run, export_run
+
+# Set BOATSTATUS_DEBUG=1 to show cache and timing details in the sidebar
+DEBUG = os.environ.get("BOATSTATUS_DEBUG") == "1"
+
+def begin_page_run(page):
+    # Collect the spans and queries of this script run for this session
+    st.session_state.page_metrics = begin_run(page)
+    return st.session_state.page_metrics
+
+def render_debug_sidebar():
+    run = st.session_state.get('page_metrics')
+    if run is not None:
+        export_run(run)
+    if not DEBUG:
+        return
+    stats = shared_cache.stats()
+    st.sidebar.header("Debug")
+    st.sidebar.text(f"Query cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+    import supabase_client
+    if supabase_client.supabase is not None:
+        breaker = supabase_client.supabase.breaker
+        st.sidebar.text(f"Circuit: {breaker.state}, {breaker.failures} consecutive failures")
+    if run is None:
+        return
+    import pandas as pd
+    metrics = run.as_dict()
+    if metrics['spans']:
+        spans = pd.DataFrame(metrics['spans'])
+        spans['ms'] = (spans.pop('seconds') * 1000).round(1)
+        st.sidebar.caption("Stage timings")
+        st.sidebar.dataframe(spans, hide_index=True)
+    if metrics['queries']:
+        queries = pd.DataFrame(metrics['queries'])
+        queries['ms'] = (queries.pop('seconds') * 1000).round(1)
+        st.sidebar.caption("Queries")
+        st.sidebar.dataframe(queries, hide_index=True)
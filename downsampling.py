@@ -0,0 +1,72 @@
+import numpy as np
+
+# Width in pixels the charts are assumed to fill (Streamlit does not report the real one)
+CHART_WIDTH_PX = 1000
+# Point markers are drawn only when consecutive points are at least this far apart
+MARKER_SPACING_PX = 8
+
+def pixel_budget(width_px=CHART_WIDTH_PX, mode='lttb'):
+    # LTTB keeps one point per pixel column, min/max keeps two (low and high)
+    return width_px if mode == 'lttb' else 2 * width_px
+
+def show_markers(n_points, width_px=CHART_WIDTH_PX):
+    return n_points * MARKER_SPACING_PX <= width_px
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keeps first and last point, and from every bucket
+    # in between the point forming the largest triangle with the previous pick and the
+    # mean of the next bucket.
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Mean of every bucket, computed at once from cumulative sums
+    x_sum = np.concatenate(([0.0], np.cumsum(x)))
+    y_sum = np.concatenate(([0.0], np.cumsum(y)))
+    lo, hi = edges[:-1], edges[1:]
+    counts = hi - lo
+    x_mean = (x_sum[hi] - x_sum[lo]) / counts
+    y_mean = (y_sum[hi] - y_sum[lo]) / counts
+    # The last bucket looks ahead to the final point
+    x_next = np.append(x_mean[1:], x[-1])
+    y_next = np.append(y_mean[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        bx, by = x[lo[i]:hi[i]], y[lo[i]:hi[i]]
+        area = np.abs((x[a] - x_next[i]) * (by - y[a]) - (x[a] - bx) * (y_next[i] - y[a]))
+        a = lo[i] + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def min_max_indices(x, y, n_out):
+    # Keeps the lowest and highest reading of every bucket, so spikes survive downsampling
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    n_buckets = n_out // 2
+    if n_out >= n or n_buckets < 1:
+        return np.arange(n)
+    bucket = np.arange(n) * n_buckets // n
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_buckets))
+    ends = np.append(starts[1:], n) - 1
+    keep = np.concatenate((order[starts], order[ends], [0, n - 1]))
+    return np.unique(keep)
+
+def downsample(df, x_col, y_col, n_out, mode='lttb'):
+    if len(df) <= n_out:
+        return df
+    x = df[x_col]
+    if x.dtype.kind == 'M':
+        # Datetimes (tz-aware or not) are bucketed on their integer epoch
+        x = x.astype('int64')
+    if mode == 'lttb':
+        idx = lttb_indices(x.to_numpy(), df[y_col].to_numpy(), n_out)
+    else:
+        idx = min_max_indices(x.to_numpy(), df[y_col].to_numpy(), n_out)
+    return df.iloc[idx]
@@ -0,0 +1,271 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from columnar import TABLE_SCHEMAS
+from instrumentation import log_event, logger, query_span
+from telemetry_cache import to_epoch_us
+
+# Streams a telemetry range to CSV or Parquet one page at a time, so memory stays flat
+# however long the range is. Progress is checkpointed to a cursor sidecar next to the
+# output and an interrupted export continues from there with --resume. Parquet output
+# needs pyarrow, which is optional (pip install pyarrow); CSV works without it.
+# Usage: python export.py BatteryStatus --start 2024-01-01 --end 2024-04-01 --output battery.parquet
+
+ROW_GROUP_ROWS = 100_000  # Parquet rows buffered per row group
+PART_ROWS = 1_000_000     # Parquet rows per part file, a finished part is the resume checkpoint
+PROGRESS_EVERY = 50       # Pages between progress reports
+
+def cursor_path(output):
+    return output.rstrip('/') + '.cursor.json'
+
+def _load_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _save_state(path, state):
+    # Written whole and renamed, an interrupted export never leaves half a sidecar
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, default=str)
+    os.replace(tmp_path, path)
+
+class ExportProgress:
+    def __init__(self, start=None, end=None, rows=0):
+        self.start_ns = to_epoch_us(start) * 1000 if start is not None else None
+        self.end_ns = to_epoch_us(end) * 1000 if end is not None else None
+        self.rows = rows
+        self.pages = 0
+        self.bytes = 0
+        self.last_ns = None
+        self.started = time.monotonic()
+        self._rows_at_start = rows
+
+    def add(self, batch, nbytes):
+        self.rows += len(batch)
+        self.pages += 1
+        self.bytes = nbytes
+        self.last_ns = int(batch['created_at'][-1])
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return (self.rows - self._rows_at_start) / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def fraction(self):
+        # Share of the time range written so far, None for open-ended ranges
+        if self.start_ns is None or self.end_ns is None or self.last_ns is None or self.end_ns <= self.start_ns:
+            return None
+        return min(max((self.last_ns - self.start_ns) / (self.end_ns - self.start_ns), 0.0), 1.0)
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'pages': self.pages,
+            'bytes': self.bytes,
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'bytes_per_second': round(self.bytes / self.elapsed, 1) if self.elapsed > 0 else 0.0,
+            'fraction': self.fraction,
+        }
+
+# Sinks keep their checkpoint (what is on disk, the rows in it and the cursor of its last
+# row) as one dict replaced whole, so an interrupt anywhere leaves the data and the cursor
+# in step and a resumed export neither skips nor repeats a page.
+
+class CsvSink:
+    # One CSV file, every page is flushed and checkpointed by its byte offset
+    def __init__(self, path, state=None):
+        self.path = path
+        if state is not None and os.path.exists(path):
+            # Drop whatever was written after the last checkpoint
+            os.truncate(path, state['offset'])
+            self._file = open(path, 'a', newline='')
+            self._state = {'offset': state['offset'], 'rows': state['rows'], 'after': state['after']}
+        else:
+            self._file = open(path, 'w', newline='')
+            self._state = {'offset': 0, 'rows': 0, 'after': None}
+
+    def write(self, frame, after):
+        frame.to_csv(self._file, header=self._state['offset'] == 0, index=False)
+        self._file.flush()
+        self._state = {'offset': self._file.tell(), 'rows': self._state['rows'] + len(frame), 'after': after}
+        return True
+
+    def state(self):
+        # Offset, rows and cursor after the last complete page
+        return self._state
+
+    def close(self):
+        self._file.close()
+
+def _arrow_schema(table, names):
+    import pyarrow as pa
+    types = {'timestamp': pa.timestamp('us', tz='UTC'), 'category': pa.string(),
+             'int64': pa.int64(), 'float32': pa.float32(), 'float64': pa.float64()}
+    schema = TABLE_SCHEMAS.get(table, {})
+    return pa.schema([(name, types.get(schema.get(name), pa.string())) for name in names])
+
+class ParquetSink:
+    # A directory of part files, readable as one dataset (pandas.read_parquet(path)).
+    # Row groups of ROW_GROUP_ROWS are written as pages arrive; a part is closed every
+    # PART_ROWS rows and only closed parts count, so a resumed export rewrites at most one.
+    def __init__(self, path, table, names, state=None):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.path = path
+        self.schema = _arrow_schema(table, names)
+        if state is not None:
+            self._state = {'parts': list(state['parts']), 'rows': state['rows'], 'after': state['after']}
+        else:
+            self._state = {'parts': [], 'rows': 0, 'after': None}
+        os.makedirs(path, exist_ok=True)
+        for part in glob.glob(os.path.join(path, 'part-*.parquet')):
+            if os.path.basename(part) not in self._state['parts']:
+                os.remove(part)
+        self._writer = None
+        self._buffer = []
+        self._buffered = 0
+        self._part_rows = 0
+        self._after = None
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        frame = pd.concat(self._buffer, ignore_index=True)
+        for name in frame.columns:
+            if isinstance(frame[name].dtype, pd.CategoricalDtype):
+                frame[name] = frame[name].astype(object)
+        if self._writer is None:
+            name = f'part-{len(self._state["parts"]):05d}.parquet'
+            self._writer = pq.ParquetWriter(os.path.join(self.path, name), self.schema)
+            self._part_name = name
+        self._writer.write_table(pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False))
+        self._part_rows += len(frame)
+        self._buffer, self._buffered = [], 0
+
+    def _close_part(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._state = {'parts': self._state['parts'] + [self._part_name],
+                           'rows': self._state['rows'] + self._part_rows, 'after': self._after}
+            self._writer = None
+            self._part_rows = 0
+
+    def write(self, frame, after):
+        # True when the rows written so far are safely on disk (a checkpoint)
+        self._buffer.append(frame)
+        self._buffered += len(frame)
+        self._after = after
+        if self._buffered >= ROW_GROUP_ROWS:
+            self._flush()
+        if self._part_rows >= PART_ROWS:
+            self._close_part()
+            return True
+        return False
+
+    def state(self):
+        # Closed parts, their rows and the cursor of their last row
+        return self._state
+
+    def close(self):
+        self._close_part()
+
+def export_range(supabase, table, output, start=None, end=None, columns=None, fmt=None, resume=False, on_progress=None):
+    # Returns the final ExportProgress. Pages stream from the server through to the sink,
+    # nothing but the current page and the Parquet row group buffer is held in memory.
+    fmt = fmt or ('parquet' if output.endswith('.parquet') else 'csv')
+    columns = list(columns or TABLE_SCHEMAS[table])
+    names = columns + [c for c in ('created_at', 'id') if c not in columns]
+    sidecar = cursor_path(output)
+    state = _load_state(sidecar) if resume else None
+    request = {'table': table, 'start': start, 'end': end, 'columns': names, 'format': fmt}
+    if state is not None:
+        if {k: state.get(k) for k in request} != json.loads(json.dumps(request, default=str)):
+            raise ValueError(f"{sidecar} belongs to a different export, remove it or drop --resume")
+        if state.get('complete'):
+            logger.info(f"Export to {output} already complete")
+            return ExportProgress(start, end, state['rows'])
+    sink = ParquetSink(output, table, names, state) if fmt == 'parquet' else CsvSink(output, state)
+    # Resume from the sink's checkpoint, the rows after it were dropped with the partial page
+    resumed = sink.state()
+    after = tuple(resumed['after']) if resumed['after'] else None
+    progress = ExportProgress(start, end, resumed['rows'])
+
+    def checkpoint(complete=False):
+        _save_state(sidecar, {**request, 'complete': complete, **sink.state()})
+
+    with query_span(table) as query:
+        frames = ((batch, batch.to_frame()[names]) for batch in supabase.iter_columns(table, start, end, columns, after))
+        try:
+            for batch, frame in frames:
+                done = sink.write(frame, batch.last_cursor())
+                progress.add(batch, query.bytes)
+                if done:
+                    checkpoint()
+                if on_progress is not None and progress.pages % PROGRESS_EVERY == 0:
+                    on_progress(progress)
+            sink.close()
+        except BaseException:
+            # Keep everything up to the last checkpoint for --resume, CSV pages are
+            # checkpointed as they are written
+            if isinstance(sink, CsvSink):
+                checkpoint()
+                sink.close()
+            raise
+        checkpoint(complete=True)
+        query.rows = progress.rows
+    log_event("export", table=table, output=output, format=fmt, **progress.as_dict())
+    return progress
+
+def _print_progress(progress):
+    info = progress.as_dict()
+    done = f"{info['fraction'] * 100:5.1f}% " if info['fraction'] is not None else ''
+    print(f"{done}{info['rows']:>10} rows  {info['rows_per_second']:>9.0f} rows/s  "
+          f"{info['bytes_per_second'] / 1e6:6.2f} MB/s", file=sys.stderr, flush=True)
+
+def _parse_time(value):
+    if value is None:
+        return None
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a telemetry table range to CSV or Parquet")
+    parser.add_argument('table', choices=sorted(TABLE_SCHEMAS))
+    parser.add_argument('--start', help="ISO date or time, UTC unless given")
+    parser.add_argument('--end', help="ISO date or time, UTC unless given")
+    parser.add_argument('--columns', help="comma separated, default all")
+    parser.add_argument('--output', required=True, help="*.csv file or *.parquet directory")
+    parser.add_argument('--format', choices=['csv', 'parquet'])
+    parser.add_argument('--resume', action='store_true', help="continue from the cursor sidecar")
+    args = parser.parse_args()
+
+    # Straight from the server, no local cache or rollups
+    from supabase_client import SupabaseClient
+    supabase = SupabaseClient(cache_path='', rollup_path='')
+    columns = args.columns.split(',') if args.columns else None
+    progress = export_range(supabase, args.table, args.output, _parse_time(args.start), _parse_time(args.end),
+                            columns, args.format, args.resume, on_progress=_print_progress)
+    _print_progress(progress)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
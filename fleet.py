@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+from battery_forecast import HOUR_NS, NS_PER_S, SegmentForecaster
+from bilge_stats import PumpDutyStats
+from columnar import BOAT_COLUMN, ColumnBatch
+from instrumentation import log_event, span
+
+# Fleet mode: boats told apart by BOATSTATUS_BOAT_COLUMN (see columnar.py). Comma
+# separated boat ids, empty keeps the dashboard in single-boat mode
+FLEET_BOATS = [boat.strip() for boat in os.environ.get("BOATSTATUS_FLEET", "").split(',') if boat.strip()]
+# Seconds between refreshes of the shared fleet index, every session reads the same one
+FLEET_REFRESH_INTERVAL = float(os.environ.get("BOATSTATUS_FLEET_REFRESH_INTERVAL", "30"))
+
+# Recent history held in memory per boat, the same as the battery page's recent view
+FLEET_WINDOW = timedelta(hours=24)
+
+# Columns kept per boat, id is always added for the cursor
+FLEET_COLUMNS = {
+    'BatteryStatus': ['created_at', 'Voltage'],
+    'BoatPositions': ['created_at', 'Lat', 'Long', 'Accuracy'],
+    'BilgePumpStatus': ['created_at', 'Status', 'El_Time'],
+}
+
+def partition(batch):
+    # Rows of a batched fleet query split per boat, each part keeping the batch's order
+    if not len(batch):
+        return {}
+    boats = pd.Categorical(batch[BOAT_COLUMN])
+    order = np.argsort(boats.codes, kind='stable')
+    # Rows without a boat id have code -1 and sort before the first boat
+    bounds = np.searchsorted(boats.codes[order], np.arange(len(boats.categories) + 1))
+    parts = {}
+    for code, boat in enumerate(boats.categories):
+        rows = order[bounds[code]:bounds[code + 1]]
+        if len(rows):
+            parts[str(boat)] = ColumnBatch(batch.table, {name: column[rows] for name, column in batch.columns.items()})
+    return parts
+
+def _timestamp(ns):
+    return pd.Timestamp(int(ns), unit='ns', tz='UTC')
+
+class BoatIndex:
+    # One boat's recent rows per table as typed columns in time order, with the battery
+    # forecast and pump statistics kept current as rows arrive. Latest values and the
+    # cached forecast are read without a query or a scan.
+    def __init__(self, boat, window=FLEET_WINDOW):
+        self.boat = boat
+        self.window_ns = int(window.total_seconds()) * NS_PER_S
+        self.batches = {}  # table -> ColumnBatch trimmed to the window
+        self.forecast = SegmentForecaster(self.window_ns)
+        self.pump = PumpDutyStats(retention_days=window / timedelta(days=1))
+        self._time_to_12v = None
+        self._forecast_dirty = False
+
+    def append(self, table, batch):
+        # Rows in any order, late uploads older than rows already held are merged in place
+        current = self.batches.get(table)
+        late = current is not None and len(current) and batch['created_at'].min() < current['created_at'][-1]
+        merged = ColumnBatch.concat(table, [current, batch] if current is not None else [batch], list(batch.columns))
+        merged = merged.in_time_order()
+        times = merged['created_at']
+        first = int(np.searchsorted(times, times[-1] - self.window_ns))
+        if first:
+            merged = ColumnBatch(table, {name: column[first:] for name, column in merged.columns.items()})
+        self.batches[table] = merged
+        if table == 'BatteryStatus':
+            if late:
+                # The forecaster only takes newer readings, it is rebuilt from the window
+                self.forecast = SegmentForecaster(self.window_ns)
+                batch = merged
+            else:
+                batch = batch.in_time_order()
+            voltages = batch['Voltage'].astype(np.float64)
+            valid = ~np.isnan(voltages)
+            self.forecast.update(batch['created_at'][valid], voltages[valid])
+            self._forecast_dirty = True
+        elif table == 'BilgePumpStatus':
+            self.pump.update_columns(batch)
+
+    def latest(self, table):
+        # Newest row of the table as a dict, None before the first row
+        batch = self.batches.get(table)
+        if batch is None or not len(batch):
+            return None
+        return {name: column[-1] for name, column in batch.columns.items()}
+
+    def time_to_12v(self):
+        # Refitted only after new readings, repeated reads reuse the last forecast
+        if self._forecast_dirty:
+            self._time_to_12v = self.forecast.time_to_voltage(12)
+            self._forecast_dirty = False
+        return self._time_to_12v
+
+    def summary(self, now):
+        battery = self.latest('BatteryStatus')
+        position = self.latest('BoatPositions')
+        pump = self.latest('BilgePumpStatus')
+        forecast = self.time_to_12v()
+        hours = None
+        if forecast is not None and forecast.slope < 0:
+            # Only a falling voltage reaches 12V
+            hours = (forecast.time_ns - now.timestamp() * NS_PER_S) / HOUR_NS
+        return {
+            'boat': self.boat,
+            'voltage': float(battery['Voltage']) if battery else None,
+            'voltage_at': _timestamp(battery['created_at']) if battery else None,
+            'hours_to_12v': hours,
+            'lat': float(position['Lat']) if position else None,
+            'lon': float(position['Long']) if position else None,
+            'accuracy': float(position['Accuracy']) if position else None,
+            'position_at': _timestamp(position['created_at']) if position else None,
+            'pump_cycles_hour': self.pump.cycles_in_last_hour(now),
+            'pump_at': _timestamp(pump['created_at']) if pump else None,
+        }
+
+class FleetIndex:
+    # Per-boat indexes of every boat in the fleet, refreshed with one batched query per
+    # table for all boats. Each table keeps a single id cursor, ids are unique across
+    # boats and follow insert order, so a refresh only asks for rows inserted after it,
+    # a boat's late upload of buffered readings included.
+    def __init__(self, supabase, boats, window=FLEET_WINDOW):
+        self.supabase = supabase
+        self.window = window
+        self.boats = {boat: BoatIndex(boat, window) for boat in boats}
+        self.cursors = {}  # table -> highest id applied
+        self.refreshed_at = None
+        self._refreshed_mono = None
+        self._lock = threading.Lock()
+
+    def _new_rows(self, table, now):
+        # A missing cursor, or a last refresh older than the window, starts over from the
+        # window instead of reading everything inserted since
+        last_id = self.cursors.get(table)
+        if last_id is not None and self.refreshed_at is not None and self.refreshed_at >= now - self.window:
+            return self.supabase.fetch_fleet_columns(table, self.boats, columns=FLEET_COLUMNS[table], after_id=last_id)
+        batch = self.supabase.fetch_fleet_columns(table, self.boats, now - self.window, columns=FLEET_COLUMNS[table])
+        if last_id is not None and len(batch):
+            # Rows already applied stay out
+            new = batch['id'] > last_id
+            batch = ColumnBatch(table, {name: column[new] for name, column in batch.columns.items()})
+        return batch
+
+    def refresh(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            rows = 0
+            with span('fleet.refresh', boats=len(self.boats)):
+                for table in FLEET_COLUMNS:
+                    batch = self._new_rows(table, now)
+                    # Stale fallbacks are empty for delta reads, the cursor stays put
+                    if not len(batch) or getattr(batch, 'stale', False):
+                        continue
+                    self.cursors[table] = max(self.cursors.get(table, 0), int(batch['id'].max()))
+                    for boat, part in partition(batch).items():
+                        if boat in self.boats:
+                            self.boats[boat].append(table, part)
+                    rows += len(batch)
+            self.refreshed_at = now
+            self._refreshed_mono = time.monotonic()
+        log_event("fleet_refresh", boats=len(self.boats), rows=rows)
+        return rows
+
+    def refresh_if_due(self, interval=FLEET_REFRESH_INTERVAL):
+        # Sessions share the index, only the first rerun after the interval queries
+        if self._refreshed_mono is None or time.monotonic() - self._refreshed_mono >= interval:
+            return self.refresh()
+        return 0
+
+    def overview(self, now=None):
+        # One summary per boat from values the indexes already hold
+        now = now or datetime.now(timezone.utc)
+        return [index.summary(now) for index in self.boats.values()]
+
+fleet = None
+_fleet_lock = threading.Lock()
+
+def init_fleet(supabase, boats=None):
+    # One fleet index per process like the client itself, None in single-boat mode
+    global fleet
+    boats = FLEET_BOATS if boats is None else boats
+    if not boats:
+        return None
+    if fleet is None:
+        with _fleet_lock:
+            if fleet is None:
+                fleet = FleetIndex(supabase, boats)
+    return fleet
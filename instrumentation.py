@@ -0,0 +1,174 @@
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("boatstatus")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(os.environ.get("BOATSTATUS_LOG_LEVEL", "INFO"))
+
+# Write metrics after every page run, *.prom files get the Prometheus text format,
+# anything else one JSON line per run
+METRICS_PATH = os.environ.get("BOATSTATUS_METRICS_PATH")
+
+def log_event(event, **fields):
+    # Structured log line: event name followed by its fields as JSON
+    logger.info("%s %s", event, json.dumps(fields, default=str))
+
+class QueryStats:
+    def __init__(self, table):
+        self.table = table
+        self.rows = 0
+        self.bytes = 0
+        self.pages = 0
+        self._lock = threading.Lock()
+
+    def add_page(self, nbytes=0):
+        with self._lock:
+            self.pages += 1
+            self.bytes += nbytes
+
+    def add_bytes(self, nbytes):
+        with self._lock:
+            self.bytes += nbytes
+
+class RunMetrics:
+    # Spans and queries of one page run (or one worker cycle)
+    def __init__(self, name=None):
+        self.name = name
+        self.started = time.time()
+        self.spans = []
+        self.queries = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name, seconds, fields):
+        with self._lock:
+            self.spans.append((name, seconds, fields))
+
+    def add_query(self, stats, seconds):
+        with self._lock:
+            self.queries.append((stats, seconds))
+
+    def as_dict(self):
+        return {
+            'run': self.name,
+            'started': self.started,
+            'spans': [{'name': n, 'seconds': s, **f} for n, s, f in self.spans],
+            'queries': [{'table': q.table, 'rows': q.rows, 'bytes': q.bytes, 'pages': q.pages, 'seconds': s}
+                        for q, s in self.queries],
+        }
+
+class Registry:
+    # Process-wide totals, the source of the Prometheus export
+    def __init__(self):
+        self.span_seconds = {}
+        self.span_count = {}
+        self.query_totals = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name, seconds):
+        with self._lock:
+            self.span_seconds[name] = self.span_seconds.get(name, 0.0) + seconds
+            self.span_count[name] = self.span_count.get(name, 0) + 1
+
+    def add_query(self, stats, seconds):
+        with self._lock:
+            totals = self.query_totals.setdefault(stats.table, {'rows': 0, 'bytes': 0, 'pages': 0, 'queries': 0, 'seconds': 0.0})
+            totals['rows'] += stats.rows
+            totals['bytes'] += stats.bytes
+            totals['pages'] += stats.pages
+            totals['queries'] += 1
+            totals['seconds'] += seconds
+
+    def prometheus_text(self):
+        with self._lock:
+            lines = [
+                "# TYPE boatstatus_span_seconds summary",
+            ]
+            for name in sorted(self.span_seconds):
+                lines.append(f'boatstatus_span_seconds_sum{{span="{name}"}} {self.span_seconds[name]:.6f}')
+                lines.append(f'boatstatus_span_seconds_count{{span="{name}"}} {self.span_count[name]}')
+            for metric, name in (('rows', 'query_rows'), ('bytes', 'query_bytes'), ('pages', 'query_pages'), ('queries', 'queries')):
+                lines.append(f"# TYPE boatstatus_{name}_total counter")
+                for table in sorted(self.query_totals):
+                    lines.append(f'boatstatus_{name}_total{{table="{table}"}} {self.query_totals[table][metric]}')
+            lines.append("# TYPE boatstatus_query_seconds_total counter")
+            for table in sorted(self.query_totals):
+                lines.append(f'boatstatus_query_seconds_total{{table="{table}"}} {self.query_totals[table]["seconds"]:.6f}')
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+_current_run = contextvars.ContextVar("boatstatus_run", default=None)
+_active_query = contextvars.ContextVar("boatstatus_query", default=None)
+
+def begin_run(name=None):
+    # Start collecting spans for the calling thread/context, returns the new collector
+    run = RunMetrics(name)
+    _current_run.set(run)
+    return run
+
+def current_run():
+    return _current_run.get()
+
+def record_span(name, seconds, **fields):
+    # For durations measured elsewhere, e.g. from process or script start
+    registry.add_span(name, seconds)
+    run = _current_run.get()
+    if run is not None:
+        run.add_span(name, seconds, fields)
+    logger.debug("span %s", json.dumps({'name': name, 'seconds': round(seconds, 6), **fields}, default=str))
+
+@contextlib.contextmanager
+def span(name, **fields):
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        record_span(name, time.perf_counter() - start, **fields)
+
+@contextlib.contextmanager
+def query_span(table):
+    # Times one logical query; pages and bytes are added by the transport while it runs
+    stats = QueryStats(table)
+    token = _active_query.set(stats)
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        _active_query.reset(token)
+        seconds = time.perf_counter() - start
+        registry.add_query(stats, seconds)
+        run = _current_run.get()
+        if run is not None:
+            run.add_query(stats, seconds)
+        log_event("query", table=table, rows=stats.rows, bytes=stats.bytes, pages=stats.pages, seconds=round(seconds, 6))
+
+def count_page(nbytes=0):
+    stats = _active_query.get()
+    if stats is not None:
+        stats.add_page(nbytes)
+
+def count_bytes(nbytes):
+    stats = _active_query.get()
+    if stats is not None:
+        stats.add_bytes(nbytes)
+
+def export_run(run, path=METRICS_PATH):
+    if not path:
+        return
+    if path.endswith('.prom'):
+        # Written whole and renamed, so a node_exporter textfile collector never reads half a file
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(registry.prometheus_text())
+        os.replace(tmp_path, path)
+    else:
+        with open(path, 'a') as f:
+            f.write(json.dumps(run.as_dict(), default=str) + '\n')
@@ -0,0 +1,122 @@
+import queue
+from collections import deque
+import pandas as pd
+
+# Seconds between delta polls in live mode
+LIVE_POLL_INTERVAL = 5
+# Rows kept per live buffer
+LIVE_BUFFER_ROWS = 5000
+
+class PollingSource:
+    # Short-interval delta polling: every poll asks only for rows inserted after the
+    # highest id already seen. Ids follow insert order, so a boat's late upload of older
+    # readings is picked up too, a (created_at, id) cursor would skip it.
+    def __init__(self, supabase, table, columns='*', after_id=None, boats=None):
+        self.supabase = supabase
+        self.table = table
+        self.columns = columns
+        self.boats = boats
+        self.after_id = after_id if after_id is not None else supabase.latest_id(table, boats)
+
+    def poll(self):
+        if self.after_id is None:
+            # The server was unreachable when the source was created, without a cursor
+            # the poll would download the whole table
+            self.after_id = self.supabase.latest_id(self.table, self.boats)
+            return []
+        rows = self.supabase.fetch_rows_after(self.table, self.after_id, self.columns, self.boats)
+        if rows:
+            self.after_id = max(row['id'] for row in rows)
+        return rows
+
+class LocalEventSource:
+    # In-process stand-in for an insert subscription, rows pushed from any thread are
+    # returned by the next poll
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def push(self, row):
+        self._queue.put(row)
+
+    def poll(self):
+        rows = []
+        while True:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                return rows
+
+class LiveBuffer:
+    # Bounded buffer of parsed readings. New rows are parsed once, as their own chunk,
+    # so an update costs the new rows only.
+    def __init__(self, maxlen=LIVE_BUFFER_ROWS):
+        self.maxlen = maxlen
+        self._chunks = deque()
+        self._size = 0
+
+    def __len__(self):
+        return min(self._size, self.maxlen)
+
+    def append(self, df):
+        if df.empty:
+            return 0
+        if not df['created_at'].is_monotonic_increasing:
+            df = df.sort_values('created_at', kind='stable')
+        self._chunks.append(df)
+        self._size += len(df)
+        while self._chunks and self._size - len(self._chunks[0]) >= self.maxlen:
+            self._size -= len(self._chunks.popleft().index)
+        if len(self._chunks) > 64:
+            # Merge small chunks now and then so building the frame stays cheap
+            merged = pd.concat(self._chunks).tail(self.maxlen)
+            self._chunks = deque([merged])
+            self._size = len(merged)
+        return len(df)
+
+    def append_rows(self, rows):
+        if not rows:
+            return 0
+        df = pd.DataFrame(rows)
+        df['created_at'] = pd.to_datetime(df['created_at'], format='ISO8601', utc=True)
+        return self.append(df)
+
+    def frame(self):
+        # Rows in time order, a chunk of late uploads can hold readings older than the
+        # chunks before it
+        if not self._chunks:
+            return pd.DataFrame()
+        df = pd.concat(self._chunks, ignore_index=True)
+        if not df['created_at'].is_monotonic_increasing:
+            df = df.sort_values('created_at', kind='stable', ignore_index=True)
+        return df.tail(self.maxlen)
+
+    def latest(self):
+        # Newest reading, the last row of the chunk reaching furthest
+        if not self._chunks:
+            return None
+        return max((chunk.iloc[-1] for chunk in self._chunks), key=lambda row: row['created_at'])
+
+def frame_cursor(df):
+    # Highest id of a loaded frame, None when it has no ids (rollups)
+    if df is None or df.empty or 'id' not in df.columns:
+        return None
+    return int(df['id'].max())
+
+_source_factory = PollingSource
+
+def set_source_factory(factory):
+    # factory(supabase, table, columns, after_id, boats) opens the live source of every page, such
+    # as a LocalEventSource fed in-process instead of delta polling
+    global _source_factory
+    _source_factory = factory or PollingSource
+
+def open_source(supabase, table, columns='*', after_id=None, boats=None):
+    # after_id is the highest id of the rows already shown, polling continues from there
+    # so the rows between a cached load and now are not skipped
+    return _source_factory(supabase, table, columns, after_id, boats)
+
+def live_fragment(run_every):
+    # st.fragment reruns only the decorated function, st.experimental_fragment on older Streamlit
+    import streamlit as st
+    fragment = getattr(st, 'fragment', None) or st.experimental_fragment
+    return fragment(run_every=run_every)
@@ -1,20 +1,36 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-import altair as alt
-from scipy import stats
-from datetime import datetime, timedelta
+from datetime import timedelta
 from supabase_client import init_supabase
-import pytz
+from fleet import FLEET_BOATS
+from time_window import day_bounds, load_window, recent_bounds, utc_now
+from debug_panel import begin_page_run, render_debug_sidebar
+from instrumentation import span
+from transport import stale_notice
+from downsampling import CHART_WIDTH_PX, downsample, pixel_budget, show_markers
+from rollups import RESOLUTIONS, pick_resolution
+from battery_forecast import HOUR_NS, SegmentForecaster, epoch_ns
+from live_feed import LIVE_POLL_INTERVAL, LiveBuffer, frame_cursor, live_fragment, open_source
 
 st.title("Battery Status")
+begin_page_run("Battery Status")
 
 # Initialize Supabase client
 supabase = init_supabase()
 
+# Fleet mode: the page shows one boat of the fleet at a time
+boat = st.sidebar.selectbox("Boat", FLEET_BOATS) if FLEET_BOATS else None
+boats = [boat] if boat is not None else None
+if st.session_state.get('battery_boat') != boat:
+    # State built from another boat's rows starts over
+    st.session_state.battery_boat = boat
+    for key in ('battery_live', 'forecast_key'):
+        st.session_state.pop(key, None)
+
 # Date range selection
 st.sidebar.header("Date Range Selection")
-now = datetime.now(pytz.utc)
-today = now.date()
+now = utc_now()
 
 # Initialize session state
 if 'show_recent' not in st.session_state:
@@ -22,9 +38,7 @@ if 'show_recent' not in st.session_state:
 if 'apply_custom_range' not in st.session_state:
     st.session_state.apply_custom_range = False
 if 'start_date' not in st.session_state:
-    st.session_state.start_date = now - timedelta(hours=24)
-if 'end_date' not in st.session_state:
-    st.session_state.end_date = now
+    st.session_state.start_date, st.session_state.end_date = recent_bounds(24, now)
 if 'first_load' not in st.session_state:
     st.session_state.first_load = True
 
@@ -43,53 +57,117 @@ if st.sidebar.button("Apply Custom Range"):
     st.session_state.apply_custom_range = True
     st.session_state.show_recent = False
     st.session_state.first_load = False
-    st.session_state.start_date = datetime.combine(start_date, datetime.min.time()).replace(tzinfo=pytz.utc)
-    st.session_state.end_date = datetime.combine(end_date, datetime.max.time()).replace(tzinfo=pytz.utc)
+    st.session_state.start_date, st.session_state.end_date = day_bounds(start_date, end_date)
 
 # Set date range based on the current state
 if st.session_state.show_recent:
-    start_date = now - timedelta(hours=24)
-    end_date = now
+    start_date, end_date = recent_bounds(24, now)
     st.sidebar.info("Showing last 24 hours of data. Use the date inputs and 'Apply Custom Range' to select a custom range.")
 elif st.session_state.apply_custom_range:
     start_date = st.session_state.start_date
     end_date = st.session_state.end_date
     st.sidebar.info(f"Showing data from {start_date.strftime('%Y-%m-%d %H:%M:%S')} to {end_date.strftime('%Y-%m-%d %H:%M:%S')} UTC. Click 'Show Recent Data' to reset.")
 elif st.session_state.first_load:
-    start_date = now - timedelta(hours=24)
-    end_date = now
+    start_date, end_date = recent_bounds(24, now)
     st.sidebar.info(f"Showing data for the last 24 hours by default. Use the date inputs and 'Apply Custom Range' to select a custom range.")
 else:
     st.sidebar.info("Select a date range and click 'Apply Custom Range' to update the data.")
 
+# Chart downsampling
+downsampling_mode = st.sidebar.selectbox("Chart Downsampling", ["LTTB", "Min/Max per bucket"])
+
+# Readings the 12V forecast is fitted on
+FORECAST_WINDOWS = {"Whole range": None, "Last 24 hours": 24 * HOUR_NS, "Last 6 hours": 6 * HOUR_NS}
+forecast_window = st.sidebar.selectbox("Forecast Window", list(FORECAST_WINDOWS))
+
+# Live mode appends new readings without rerunning the whole page
+live_mode = st.sidebar.checkbox("Live Mode", value=False)
+
 if start_date > end_date:
     st.error("Error: End date must fall after start date.")
     st.stop()
 
 # Fetch data from the BatteryStatus table
+def fetch_battery_frame(start_date, end_date):
+    # Weeks or months are drawn from hourly or daily aggregates, as long as they still
+    # fill the chart
+    resolution = pick_resolution(start_date, end_date, pixel_budget(CHART_WIDTH_PX))
+    if resolution is not None:
+        df = supabase.fetch_rollup('BatteryStatus', resolution, start_date, end_date, boats=boats)
+        if df is not None:
+            return df
+    # The date range is applied server-side, only the selected window is downloaded
+    # Long custom ranges fetch their pages concurrently
+    bulk = end_date - start_date > timedelta(days=7)
+    batch = supabase.fetch_columns('BatteryStatus', start_date, end_date, ['created_at', 'Voltage'], bulk=bulk, boats=boats)
+    with span('battery.frame', rows=len(batch)):
+        # Already typed arrays, created_at becomes a UTC datetime column (and an empty
+        # frame still carries the stale flag of a failed read)
+        df = batch.to_frame()
+    return df
+
 def load_battery_data(start_date, end_date):
     try:
-        response = supabase.fetch_battery_data()
-        df = pd.DataFrame(response)
-        # Use format='ISO8601' to handle the datetime format from Supabase
-        df['created_at'] = pd.to_datetime(df['created_at'], format='ISO8601', utc=True)
-        return df[(df['created_at'] >= start_date) & (df['created_at'] <= end_date)]
+        # Shared across sessions and pages, a narrower window is sliced from a cached wider one
+        resolution = pick_resolution(start_date, end_date, pixel_budget(CHART_WIDTH_PX))
+        return load_window('BatteryStatus', start_date, end_date, fetch_battery_frame, variant=(resolution or 'raw', boat),
+                           bucket=RESOLUTIONS.get(resolution))
     except Exception as e:
         st.error(f"Error fetching battery data: {str(e)}")
         return pd.DataFrame()
 
+# Raw readings the forecast is fitted on when the chart shows aggregates, hourly means
+# would flatten the segment boundaries and the fit
+FORECAST_RAW_DAYS = 7
+
+def load_forecast_data(df_battery, rollup, start_date, end_date):
+    if not rollup:
+        return df_battery
+    def fetch_raw(start_date, end_date):
+        batch = supabase.fetch_columns('BatteryStatus', start_date, end_date, ['created_at', 'Voltage'], boats=boats)
+        return batch.to_frame()
+    try:
+        start = max(start_date, end_date - timedelta(days=FORECAST_RAW_DAYS))
+        return load_window('BatteryStatus', start, end_date, fetch_raw, variant=('raw', boat))
+    except Exception as e:
+        st.error(f"Error fetching battery readings for the forecast: {str(e)}")
+        return pd.DataFrame(columns=['created_at', 'Voltage'])
+
+def render_forecast_band(forecaster, forecast):
+    # Trend of the current discharge segment from its start to the far end of the
+    # confidence interval, the band spans the slope's interval
+    import altair as alt
+    end_ns = forecast.upper_ns if forecast.upper_ns is not None else forecast.time_ns
+    times_ns = np.linspace(forecaster.segment_start_ns, max(end_ns, forecast.time_ns), 100).astype(np.int64)
+    fit, steep, shallow = forecaster.band(times_ns)
+    df_band = pd.DataFrame({
+        'created_at': pd.to_datetime(times_ns, unit='ns', utc=True),
+        'Voltage': fit,
+        'low': np.minimum(steep, shallow),
+        'high': np.maximum(steep, shallow),
+    })
+    x = alt.X('created_at:T', axis=alt.Axis(title='Time (UTC)', format='%Y-%m-%d %H:%M'))
+    band = alt.Chart(df_band).mark_area(opacity=0.3).encode(x=x, y=alt.Y('low:Q', scale=alt.Scale(zero=False), title='Voltage'), y2='high:Q')
+    line = alt.Chart(df_band).mark_line(strokeDash=[4, 4]).encode(x=x, y='Voltage:Q')
+    target = alt.Chart(pd.DataFrame({'Voltage': [12.0]})).mark_rule(color='red').encode(y='Voltage:Q')
+    st.altair_chart((band + line + target).properties(title='12V Forecast, Current Discharge Segment'), use_container_width=True)
+
 # Load data for the selected range or on first load
 if st.session_state.show_recent or st.session_state.apply_custom_range or st.session_state.first_load:
-    df_battery = load_battery_data(start_date, end_date)
+    with span('battery.load'):
+        df_battery = load_battery_data(start_date, end_date)
+
+    # Served from the last-known-good copy while the server is unreachable
+    notice = stale_notice(df_battery)
+    if notice:
+        st.warning(notice)
 
     # Plot Voltage over time using Altair
     if not df_battery.empty and 'Voltage' in df_battery.columns and 'created_at' in df_battery.columns:
-        # Sort values by created_at
-        df_battery.sort_values('created_at', inplace=True)
-
-        # Compute min and max voltage
-        min_voltage = df_battery['Voltage'].min()
-        max_voltage = df_battery['Voltage'].max()
+        # Compute min and max voltage (rollups carry the extremes of every bucket)
+        rollup = 'Voltage_min' in df_battery.columns
+        min_voltage = df_battery['Voltage_min' if rollup else 'Voltage'].min()
+        max_voltage = df_battery['Voltage_max' if rollup else 'Voltage'].max()
 
         # Calculate y-axis limits with 1% extension
         y_min = min_voltage - 0.01 * abs(min_voltage)
@@ -107,8 +185,15 @@ if st.session_state.show_recent or st.session_state.apply_custom_range or st.ses
         # Linear interpolation for missing data
         df_battery['Voltage'] = df_battery['Voltage'].interpolate(method='linear')
 
+        # Downsample to the chart's pixel budget, the forecast below keeps full resolution
+        mode = 'lttb' if downsampling_mode == 'LTTB' else 'minmax'
+        with span('battery.downsample', rows=len(df_battery)):
+            df_chart = downsample(df_battery, 'created_at', 'Voltage', pixel_budget(CHART_WIDTH_PX, mode), mode)
+
         # Create Altair chart with dynamic y-axis limits and custom X-axis label
-        line = alt.Chart(df_battery).mark_line().encode(
+        # (altair is imported here, pages without data never pay for it)
+        import altair as alt
+        line = alt.Chart(df_chart).mark_line().encode(
             x=alt.X('created_at:T', axis=alt.Axis(title='Time (UTC)', format='%Y-%m-%d %H:%M:%S')),
             y=alt.Y('Voltage:Q', scale=alt.Scale(domain=[y_min, y_max])),
             tooltip=[
@@ -117,58 +202,126 @@ if st.session_state.show_recent or st.session_state.apply_custom_range or st.ses
             ]
         )
 
-        # Add points to highlight individual data points
-        points = alt.Chart(df_battery).mark_circle(size=60).encode(
-            x='created_at:T',
-            y='Voltage:Q',
-            tooltip=[
-                alt.Tooltip('created_at:T', title='Time (UTC)', format='%Y-%m-%d %H:%M:%S'),
-                alt.Tooltip('Voltage:Q', title='Voltage', format='.2f')
-            ]
-        )
+        chart = line
+        if rollup:
+            # Range of the readings behind every averaged point
+            band = alt.Chart(df_battery).mark_area(opacity=0.3).encode(
+                x='created_at:T',
+                y=alt.Y('Voltage_min:Q', scale=alt.Scale(domain=[y_min, y_max])),
+                y2='Voltage_max:Q'
+            )
+            chart = band + line
+        # Add points to highlight individual data points, only while they stay readable
+        if show_markers(len(df_chart), CHART_WIDTH_PX):
+            points = alt.Chart(df_chart).mark_circle(size=60).encode(
+                x='created_at:T',
+                y='Voltage:Q',
+                tooltip=[
+                    alt.Tooltip('created_at:T', title='Time (UTC)', format='%Y-%m-%d %H:%M:%S'),
+                    alt.Tooltip('Voltage:Q', title='Voltage', format='.2f')
+                ]
+            )
+            # Combine line and points
+            chart = chart + points
 
-        # Combine line and points
-        chart = (line + points).properties(
+        chart = chart.properties(
             title='Voltage Over Time (Auto-scaled Y-axis)'
         ).interactive()
 
-        st.altair_chart(chart, use_container_width=True)
-
-        # Linear regression to predict when Voltage will reach 12V
-        # Convert datetime to timestamp (in seconds) for linear regression
-        df_battery['timestamp'] = df_battery['created_at'].apply(lambda x: x.timestamp())
-
-        # Fit a linear regression model on the data
-        slope, intercept, r_value, p_value, std_err = stats.linregress(df_battery['timestamp'], df_battery['Voltage'])
+        with span('battery.chart', points=len(df_chart)):
+            st.altair_chart(chart, use_container_width=True)
+        if rollup:
+            resolution = pick_resolution(start_date, end_date, pixel_budget(CHART_WIDTH_PX))
+            st.caption(f"Averages per {resolution}, the band shows the lowest and highest reading")
 
-        # Define a function to predict the timestamp when voltage will be 12V
-        def predict_time_for_voltage(target_voltage):
-            if slope != 0:
-                target_timestamp = (target_voltage - intercept) / slope
-                return pd.to_datetime(target_timestamp, unit='s', utc=True)
-            else:
-                return None
+        # Linear trend of the current discharge segment to predict when Voltage will reach
+        # 12V, charging phases in the range are left out. The forecaster is kept in the
+        # session, closed segments are cached and only the open one is refitted on reruns.
+        forecast_key = (boat, forecast_window, None if st.session_state.show_recent else (start_date, end_date))
+        if st.session_state.get('forecast_key') != forecast_key:
+            st.session_state.forecast_key = forecast_key
+            window_ns = FORECAST_WINDOWS[forecast_window]
+            if window_ns is None and st.session_state.show_recent:
+                # The recent view slides, so the whole range is the last 24 hours
+                window_ns = 24 * HOUR_NS
+            st.session_state.forecaster = SegmentForecaster(window_ns)
+        forecaster = st.session_state.forecaster
+        df_forecast = load_forecast_data(df_battery, rollup, start_date, end_date)
+        valid = df_forecast['Voltage'].notna().to_numpy()
+        with span('battery.forecast', rows=int(valid.sum())):
+            forecaster.update(epoch_ns(df_forecast['created_at'])[valid], df_forecast['Voltage'].to_numpy()[valid])
+            # Forecast when the voltage will reach 12V
+            forecast = forecaster.time_to_voltage(12)
+        latest_time = df_battery['Voltage_last_at' if rollup else 'created_at'].iloc[-1]
+        if forecaster.phase_name is not None:
+            segment_start = pd.Timestamp(forecaster.segment_start_ns, tz='UTC').strftime('%Y-%m-%d %H:%M')
+            rate = forecaster.rate()
+            rate_text = f", currently {rate:+.3f} V/h" if rate is not None else ""
+            st.caption(f"Current {forecaster.phase_name} segment since {segment_start} UTC{rate_text}")
 
-        # Forecast when the voltage will reach 12V
-        forecast_time = predict_time_for_voltage(12)
-
-        # Compare forecast_time with timezone-aware max 'created_at'
-        if forecast_time is not None and forecast_time > df_battery['created_at'].max():
-            time_difference = forecast_time - df_battery['created_at'].max()
+        # Compare forecast time with timezone-aware max 'created_at'
+        if forecast is not None and pd.Timestamp(forecast.time_ns, tz='UTC') > latest_time:
+            forecast_time = pd.Timestamp(forecast.time_ns, tz='UTC')
+            time_difference = forecast_time - latest_time
             days_to_reach_12v = time_difference.days + time_difference.seconds / 86400  # Convert seconds to days
 
             st.success(f"The voltage is forecasted to reach 12V on {forecast_time.strftime('%Y-%m-%d %H:%M:%S')} UTC.")
             st.info(f"It will take approximately {days_to_reach_12v:.2f} days to reach 12V.")
+            if forecast.lower_ns is not None:
+                lower = pd.Timestamp(forecast.lower_ns, tz='UTC').strftime('%Y-%m-%d %H:%M')
+                upper = pd.Timestamp(forecast.upper_ns, tz='UTC').strftime('%Y-%m-%d %H:%M') if forecast.upper_ns is not None else 'not reached'
+                st.caption(f"95% confidence interval: {lower} to {upper} UTC")
+            render_forecast_band(forecaster, forecast)
+        elif forecaster.phase_name == 'charge':
+            st.info("The battery is charging, no 12V forecast until it discharges again.")
         else:
             st.warning("Insufficient data or voltage will not reach 12V based on current trend.")
 
         # Display the most recent voltage reading
+        # (a bucket carries its last reading and that reading's own time)
         latest_reading = df_battery.iloc[-1]
-        st.info(f"Latest voltage reading: {latest_reading['Voltage']:.2f}V at {latest_reading['created_at'].strftime('%Y-%m-%d %H:%M:%S')} UTC")
+        latest_voltage = latest_reading['Voltage_last'] if rollup else latest_reading['Voltage']
+        latest_at = latest_reading['Voltage_last_at'] if rollup else latest_reading['created_at']
+        st.info(f"Latest voltage reading: {latest_voltage:.2f}V at {latest_at.strftime('%Y-%m-%d %H:%M:%S')} UTC")
     else:
         st.warning("No battery data available to plot for the selected date range.")
+
+    # Live mode: poll for new readings and re-render only the live chart
+    if live_mode:
+        if 'battery_live' not in st.session_state:
+            buffer = LiveBuffer()
+            if not df_battery.empty:
+                buffer.append(df_battery[['created_at', 'Voltage']])
+            # A window reaching now continues from its own last row, the loaded frame can be
+            # a cached copy older than the newest reading
+            after = frame_cursor(df_battery) if end_date >= now else None
+            st.session_state.battery_live = (open_source(supabase, 'BatteryStatus', ['created_at', 'Voltage'], after, boats), buffer)
+
+        @live_fragment(LIVE_POLL_INTERVAL)
+        def live_voltage():
+            source, buffer = st.session_state.battery_live
+            buffer.append_rows(source.poll())
+            st.subheader("Live Voltage")
+            if len(buffer) == 0:
+                st.info("Waiting for new battery readings...")
+                return
+            import altair as alt
+            df_live = downsample(buffer.frame(), 'created_at', 'Voltage', pixel_budget(CHART_WIDTH_PX))
+            live_chart = alt.Chart(df_live).mark_line().encode(
+                x=alt.X('created_at:T', axis=alt.Axis(title='Time (UTC)', format='%Y-%m-%d %H:%M:%S')),
+                y=alt.Y('Voltage:Q', scale=alt.Scale(zero=False))
+            )
+            st.altair_chart(live_chart, use_container_width=True)
+            latest_reading = buffer.latest()
+            st.info(f"Latest voltage reading: {latest_reading['Voltage']:.2f}V at {latest_reading['created_at'].strftime('%Y-%m-%d %H:%M:%S')} UTC")
+
+        live_voltage()
+    else:
+        st.session_state.pop('battery_live', None)
 else:
     st.info("Please select a date range and click 'Apply Custom Range' or click 'Show Recent Data' to view the battery status.")
 
+render_debug_sidebar()
+
 # Set first_load to False after the first execution
 st.session_state.first_load = False
@@ -1,17 +1,36 @@
 import streamlit as st
 import pandas as pd
-import pydeck as pdk
-from datetime import datetime, timedelta
+from datetime import timedelta
 from supabase_client import init_supabase
+from fleet import FLEET_BOATS
+from time_window import day_bounds, load_window, utc_today
+from debug_panel import DEBUG, begin_page_run, render_debug_sidebar
+from instrumentation import span
+from transport import stale_notice
+from downsampling import CHART_WIDTH_PX, pixel_budget
+from rollups import RESOLUTIONS, pick_resolution
+from track_processing import simplify_track, track_colors
+from spatial import AnchorWatch, FixIndex, GeofenceSet, anchor_drag, load_geofences
+from live_feed import LIVE_POLL_INTERVAL, LiveBuffer, frame_cursor, live_fragment, open_source
 
 st.title("Boat Positions")
+begin_page_run("Boat Positions")
 
 # Initialize Supabase client
 supabase = init_supabase()
 
+# Fleet mode: the page shows one boat of the fleet at a time
+boat = st.sidebar.selectbox("Boat", FLEET_BOATS) if FLEET_BOATS else None
+boats = [boat] if boat is not None else None
+if st.session_state.get('positions_boat') != boat:
+    # State built from another boat's rows starts over
+    st.session_state.positions_boat = boat
+    for key in ('positions_live',):
+        st.session_state.pop(key, None)
+
 # Date range selection
 st.sidebar.header("Date Range Selection")
-today = datetime.now().date()
+today = utc_today()
 
 # Initialize session state
 if 'show_today' not in st.session_state:
@@ -51,50 +70,160 @@ if st.session_state.show_today:
 elif st.session_state.apply_custom_range:
     start_date = st.session_state.start_date
     end_date = st.session_state.end_date
-    st.sidebar.info(f"Showing data from {start_date} to {end_date}. Click 'Show Today's Data' to reset.")
+    st.sidebar.info(f"Showing data from {start_date} to {end_date} (UTC). Click 'Show Today's Data' to reset.")
 elif st.session_state.first_load:
     st.sidebar.info(f"Showing data for the last week by default. Use the date inputs and 'Apply Custom Range' to select a custom range.")
 else:
     st.sidebar.info("Select a date range and click 'Apply Custom Range' to update the data.")
 
+# Map zoom, the track is simplified to the detail visible at this level
+map_zoom = st.sidebar.slider("Map Zoom", min_value=5, max_value=18, value=11)
+
+# Live mode appends new fixes without rerunning the whole page
+live_mode = st.sidebar.checkbox("Live Mode", value=False)
+
+# Anchor watch: alarm when the boat drifts out of its swing circle
+anchor_watch = st.sidebar.checkbox("Anchor Watch", value=False)
+swing_radius = st.sidebar.number_input("Swing Radius (m)", min_value=5, max_value=500, value=40, step=5, disabled=not anchor_watch)
+
+# Geofences configured with BOATSTATUS_GEOFENCES
+geofence_list = load_geofences()
+
 if start_date > end_date:
     st.error("Error: End date must fall after start date.")
     st.stop()
 
 # Fetch data from the BoatPositions table
+def fetch_boat_positions_frame(start, end):
+    # Long ranges are drawn from hourly or daily position centroids
+    resolution = pick_resolution(start, end, pixel_budget(CHART_WIDTH_PX))
+    if resolution is not None:
+        df = supabase.fetch_rollup('BoatPositions', resolution, start, end, boats=boats)
+        if df is not None:
+            return df.dropna(subset=['Lat', 'Long'])
+    batch = supabase.fetch_columns('BoatPositions', start, end, ['created_at', 'Lat', 'Long', 'Accuracy'], boats=boats)
+    with span('positions.frame', rows=len(batch)):
+        df = batch.to_frame()
+    return df
+
 def load_boat_positions(start_date, end_date):
     try:
-        response = supabase.fetch_boat_positions()
-        df = pd.DataFrame(response)
-        df['created_at'] = pd.to_datetime(df['created_at'], utc=True)
-        # Convert the datetime column to date for comparison
-        mask = (df['created_at'].dt.date >= start_date) & (df['created_at'].dt.date <= end_date)
-        return df[mask]
+        # Whole UTC days, the range is applied server-side
+        start, end = day_bounds(start_date, end_date)
+        # Shared across sessions and pages, a narrower window is sliced from a cached wider one
+        resolution = pick_resolution(start, end, pixel_budget(CHART_WIDTH_PX))
+        return load_window('BoatPositions', start, end, fetch_boat_positions_frame, variant=(resolution or 'raw', boat),
+                           bucket=RESOLUTIONS.get(resolution))
     except Exception as e:
         st.error(f"Error fetching boat positions: {str(e)}")
         return pd.DataFrame()
 
+def track_state(name, key, build, feed, lat, lon, accuracy, times):
+    # Anchor watch or fix index of the loaded track, kept in the session under `name`.
+    # A rerun with the same key feeds only the fixes appended since the last run, any
+    # other change of the track builds it again.
+    cached = st.session_state.get(name)
+    if cached is not None and cached[0] == key and 0 < cached[2] <= len(lat) and times.iloc[cached[2] - 1] == cached[3]:
+        state, applied = cached[1], cached[2]
+    else:
+        state, applied = build(), 0
+    if len(lat) > applied:
+        feed(state, lat[applied:], lon[applied:], accuracy[applied:])
+    st.session_state[name] = (key, state, len(lat), times.iloc[-1])
+    return state
+
 # Load data for the selected range or on first load
 if st.session_state.show_today or st.session_state.apply_custom_range or st.session_state.first_load:
-    df_boat_positions = load_boat_positions(start_date, end_date)
+    with span('positions.load'):
+        df_boat_positions = load_boat_positions(start_date, end_date)
 
-    if not df_boat_positions.empty and 'Lat' in df_boat_positions.columns and 'Long' in df_boat_positions.columns:
-        # Sort boat positions by time
-        df_boat_positions = df_boat_positions.sort_values('created_at')
+    # Served from the last-known-good copy while the server is unreachable
+    notice = stale_notice(df_boat_positions)
+    if notice:
+        st.warning(notice)
 
+    if not df_boat_positions.empty and 'Lat' in df_boat_positions.columns and 'Long' in df_boat_positions.columns:
         # Prepare data for map
-        map_data = df_boat_positions[['Lat', 'Long', 'Accuracy', 'created_at']].dropna()
-        
-        # Create color column (red for all points, blue for the last one)
-        colors = [[255, 0, 0] for _ in range(len(map_data) - 1)] + [[0, 0, 255]]
-        map_data['color'] = colors
+        map_data = df_boat_positions[['Lat', 'Long', 'Accuracy']].dropna()
+        lat = map_data['Lat'].to_numpy(dtype='float64')
+        lon = map_data['Long'].to_numpy(dtype='float64')
 
-        # Create PyDeck layer
+        # Drop stationary fixes and simplify the track to what is visible at this zoom
+        with span('positions.simplify', fixes=len(lat)):
+            idx = simplify_track(lat, lon, map_zoom)
+
+        # Compact columnar layer data: rounded coordinates and per-channel colors
+        # (red for all points, blue for the last one)
+        colors = track_colors(len(idx))
+        layer_data = pd.DataFrame({
+            'Long': lon[idx].round(6),
+            'Lat': lat[idx].round(6),
+            'Accuracy': map_data['Accuracy'].to_numpy(dtype='float32')[idx].round(1),
+            'r': colors[:, 0],
+            'g': colors[:, 1],
+            'b': colors[:, 2],
+        })
+
+        accuracy = map_data['Accuracy'].to_numpy(dtype='float64')
+        times = df_boat_positions.loc[map_data.index, 'created_at']
+        watch = None
+        if anchor_watch and len(lat):
+            # Anchor at the densest spot of the track, drift checked for every fix
+            with span('positions.anchor', fixes=len(lat)):
+                watch = track_state('anchor_track', (boat, start_date, end_date, swing_radius), lambda: AnchorWatch(swing_radius),
+                                    AnchorWatch.update, lat, lon, accuracy, times)
+                dragged = anchor_drag(lat, lon, accuracy, *watch.anchor, swing_radius)
+            # Live fixes go to a watch continuing from this one, the session's copy keeps
+            # only the loaded track
+            st.session_state.anchor_watch = watch.follow()
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Anchor", f"{watch.anchor[0]:.5f}, {watch.anchor[1]:.5f}")
+            col2.metric("Latest Fix From Anchor (m)", f"{watch.latest_distance:.0f}")
+            col3.metric("Worst Drift Beyond Circle (m)", f"{max(watch.max_drift, 0.0):.0f}")
+            if dragged.any():
+                first = times.iloc[int(dragged.argmax())]
+                st.error(f"Anchor drag: outside the {swing_radius} m swing circle from {first.strftime('%Y-%m-%d %H:%M:%S')} UTC")
+            else:
+                st.success(f"Holding within the {swing_radius} m swing circle")
+        else:
+            st.session_state.pop('anchor_watch', None)
+            st.session_state.pop('anchor_track', None)
+
+        if geofence_list and len(lat):
+            with span('positions.geofences', fixes=len(lat)):
+                if watch is not None:
+                    index = watch.index
+                else:
+                    index = track_state('track_index', (boat, start_date, end_date), lambda: FixIndex(ref_lat=float(lat[0])),
+                                        FixIndex.add, lat, lon, accuracy, times)
+                exits = GeofenceSet(geofence_list).exits(index)
+            if exits:
+                st.warning(f"{len(exits)} geofence exits in the selected range")
+                st.table(pd.DataFrame({
+                    'Geofence': [fence.name for fence, _ in exits],
+                    'Left At (UTC)': [times.iloc[i].strftime('%Y-%m-%d %H:%M:%S') for _, i in exits],
+                }))
+
+        # Create PyDeck layer (pydeck is imported here, pages without data never pay for it)
+        import pydeck as pdk
+        layers = []
+        if watch is not None:
+            # Swing circle around the estimated anchor
+            layers.append(pdk.Layer(
+                "ScatterplotLayer",
+                pd.DataFrame({'Long': [watch.anchor[1]], 'Lat': [watch.anchor[0]]}),
+                get_position=['Long', 'Lat'],
+                get_radius=swing_radius,
+                stroked=True,
+                filled=False,
+                get_line_color=[0, 128, 0],
+                line_width_min_pixels=2,
+            ))
         layer = pdk.Layer(
             "ScatterplotLayer",
-            map_data,
+            layer_data,
             get_position=['Long', 'Lat'],
-            get_color='color',
+            get_color='[r, g, b]',
             get_radius='Accuracy',
             radius_scale=2,
             radius_min_pixels=3,
@@ -103,18 +232,70 @@ if st.session_state.show_today or st.session_state.apply_custom_range or st.sess
 
         # Set the viewport location
         view_state = pdk.ViewState(
-            longitude=map_data['Long'].mean(),
-            latitude=map_data['Lat'].mean(),
-            zoom=11,
+            longitude=lon.mean(),
+            latitude=lat.mean(),
+            zoom=map_zoom,
             pitch=0)
 
+        if DEBUG:
+            source = 'centroids' if 'fixes' in df_boat_positions.columns else 'fixes'
+            st.caption(f"Track: {len(map_data)} {source}, {len(layer_data)} drawn")
+
         # Render the map
-        st.pydeck_chart(pdk.Deck(layers=[layer], initial_view_state=view_state, map_style='mapbox://styles/mapbox/light-v9'))
+        with span('positions.map', points=len(layer_data)):
+            st.pydeck_chart(pdk.Deck(layers=layers + [layer], initial_view_state=view_state, map_style='mapbox://styles/mapbox/light-v9'))
 
     else:
         st.warning("No boat position data available to display for the selected date range.")
+
+    # Live mode: poll for new fixes and re-render only the live table
+    if live_mode:
+        if 'positions_live' not in st.session_state:
+            buffer = LiveBuffer()
+            if not df_boat_positions.empty:
+                buffer.append(df_boat_positions[['created_at', 'Lat', 'Long', 'Accuracy']])
+            # A range ending today continues from its own last fix, the loaded frame can be
+            # a cached copy older than the newest fix
+            after = frame_cursor(df_boat_positions) if end_date >= today else None
+            st.session_state.positions_live = (open_source(supabase, 'BoatPositions', ['created_at', 'Lat', 'Long', 'Accuracy'], after, boats), buffer)
+
+        @live_fragment(LIVE_POLL_INTERVAL)
+        def live_positions():
+            source, buffer = st.session_state.positions_live
+            new_rows = source.poll()
+            buffer.append_rows(new_rows)
+            st.subheader("Live Position")
+            latest_fix = buffer.latest()
+            if latest_fix is None:
+                st.info("Waiting for new boat positions...")
+                return
+            # A fix stored without an accuracy (NULL) is shown without one
+            accuracy = f" (±{latest_fix['Accuracy']:.0f} m)" if pd.notna(latest_fix['Accuracy']) else ""
+            st.info(f"Latest fix: {latest_fix['Lat']:.6f}, {latest_fix['Long']:.6f}{accuracy} at {latest_fix['created_at'].strftime('%Y-%m-%d %H:%M:%S')} UTC")
+            watch = st.session_state.get('anchor_watch')
+            if watch is not None:
+                # Only the new fixes are checked against the anchor
+                if new_rows:
+                    watch.update([row['Lat'] for row in new_rows], [row['Long'] for row in new_rows],
+                                 [row['Accuracy'] for row in new_rows])
+                if watch.dragging:
+                    st.error(f"Anchor drag: latest fix {watch.latest_distance:.0f} m from the anchor")
+                else:
+                    st.success(f"Holding: latest fix {watch.latest_distance:.0f} m from the anchor")
+            if geofence_list:
+                inside = GeofenceSet(geofence_list).containing(latest_fix['Lat'], latest_fix['Long'])
+                st.caption("Inside: " + (", ".join(fence.name for fence in inside) if inside else "no geofence"))
+            recent_fixes = buffer.frame().tail(10).iloc[::-1].copy()
+            recent_fixes['created_at'] = recent_fixes['created_at'].dt.strftime('%Y-%m-%d %H:%M:%S')
+            st.table(recent_fixes[['created_at', 'Lat', 'Long', 'Accuracy']])
+
+        live_positions()
+    else:
+        st.session_state.pop('positions_live', None)
 else:
     st.info("Please select a date range and click 'Apply Custom Range' or click 'Show Today's Data' to view the boat positions.")
 
+render_debug_sidebar()
+
 # Set first_load to False after the first execution
 st.session_state.first_load = False
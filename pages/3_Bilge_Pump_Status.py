@@ -1,37 +1,125 @@
 import streamlit as st
 import pandas as pd
+from datetime import timedelta
 from supabase_client import init_supabase
+from fleet import FLEET_BOATS
+from bilge_stats import PumpDutyStats
+from debug_panel import begin_page_run, render_debug_sidebar
+from instrumentation import span
+from transport import stale_notice
+from live_feed import LIVE_POLL_INTERVAL, LiveBuffer, live_fragment, open_source
+from time_window import utc_now
+
+# History used to seed the duty-cycle statistics on first load
+STATS_HISTORY_DAYS = 7
+
+PUMP_COLUMNS = ['id', 'created_at', 'Status', 'El_Time']
+
+def select_boat():
+    # Fleet mode: the page shows one boat of the fleet at a time, state built from another
+    # boat's events starts over
+    boat = st.sidebar.selectbox("Boat", FLEET_BOATS) if FLEET_BOATS else None
+    if st.session_state.get('bilge_boat') != boat:
+        st.session_state.bilge_boat = boat
+        for key in ('pump_stats', 'bilge_live'):
+            st.session_state.pop(key, None)
+    return [boat] if boat is not None else None
+
+def update_pump_stats(supabase, boats=None):
+    # Keep the statistics in the session and feed them only events newer than the last one
+    if 'pump_stats' not in st.session_state:
+        st.session_state.pump_stats = PumpDutyStats()
+    stats = st.session_state.pump_stats
+    since = stats.since() or utc_now() - timedelta(days=STATS_HISTORY_DAYS)
+    stats.update_columns(supabase.fetch_columns('BilgePumpStatus', since, columns=PUMP_COLUMNS, boats=boats))
+    return stats
+
+def render_recent_events(df):
+    st.subheader("Recent Bilge Pump Actions (Last 10 Entries)")
+
+    # Oldest first, newest at the bottom
+    recent_data = df.sort_values('created_at').tail(10).copy()
+
+    # Format the 'created_at' column to display only date and time
+    recent_data['created_at'] = recent_data['created_at'].dt.strftime('%Y-%m-%d %H:%M:%S')
+
+    # Display the table with formatted columns
+    st.table(recent_data[['created_at', 'Status', 'El_Time']].rename(columns={
+        'created_at': 'Timestamp (UTC)',
+        'Status': 'Pump Status',
+        'El_Time': 'Duration (seconds)'
+    }))
+
+def render_pump_activity(stats):
+    # Duty-cycle trends, rising pump activity is the first sign of a leak
+    st.subheader("Pump Activity")
+    col1, col2, col3 = st.columns(3)
+    today = utc_now().date()
+    col1.metric("Cycles This Hour", stats.cycles_in_last_hour())
+    col2.metric("Runtime Today (s)", f"{stats.runtime_per_day.get(today, 0.0):.0f}")
+    col3.metric("Longest Run (s)", f"{stats.longest_run():.0f}")
+
+    if stats.cycles_per_hour:
+        st.caption("Cycles per hour (UTC)")
+        st.bar_chart(pd.Series(stats.cycles_per_hour, name='Cycles').sort_index())
+    if stats.runtime_per_day:
+        st.caption("Total runtime per day in seconds (UTC)")
+        st.bar_chart(pd.Series(stats.runtime_per_day, name='Runtime (s)').sort_index())
 
 def main():
     st.title("Bilge Pump Status")
-    
+    begin_page_run("Bilge Pump Status")
+
     supabase = init_supabase()
-    
-    # Fetch bilge pump data
-    bilge_pump_data = supabase.fetch_bilge_pump_data()
-    
-    if bilge_pump_data:
-        df = pd.DataFrame(bilge_pump_data)
-        df['created_at'] = pd.to_datetime(df['created_at'])
-        df = df.sort_values('created_at', ascending=False)
-        
-        st.subheader("Recent Bilge Pump Actions (Last 10 Entries)")
-        
-        # Display only the 10 most recent entries, but reverse the order
-        recent_data = df.head(10).iloc[::-1]
-        
-        # Format the 'created_at' column to display only date and time
-        recent_data['created_at'] = recent_data['created_at'].dt.strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Display the table with formatted columns
-        st.table(recent_data[['created_at', 'Status', 'El_Time']].rename(columns={
-            'created_at': 'Timestamp',
-            'Status': 'Pump Status',
-            'El_Time': 'Duration (seconds)'
-        }))
-        
+    boats = select_boat()
+
+    # Live mode appends new events without rerunning the whole page
+    live_mode = st.sidebar.checkbox("Live Mode", value=False)
+
+    # Fetch only the 10 most recent bilge pump events
+    with span('bilge.load'):
+        latest_events = supabase.fetch_latest_columns('BilgePumpStatus', PUMP_COLUMNS, limit=10, boats=boats)
+    with span('bilge.stats'):
+        stats = update_pump_stats(supabase, boats)
+
+    # Served from the last-known-good copy while the server is unreachable
+    notice = stale_notice(latest_events)
+    if notice:
+        st.warning(notice)
+
+    if live_mode:
+        if 'bilge_live' not in st.session_state:
+            buffer = LiveBuffer(maxlen=10)
+            buffer.append(latest_events.to_frame())
+            # Continue from the newest event shown
+            after = int(latest_events['id'].max()) if len(latest_events) else None
+            st.session_state.bilge_live = (open_source(supabase, 'BilgePumpStatus', PUMP_COLUMNS, after, boats), buffer)
+
+        # Only this fragment reruns, each poll costs the new events only
+        @live_fragment(LIVE_POLL_INTERVAL)
+        def live_pump():
+            source, buffer = st.session_state.bilge_live
+            new_rows = source.poll()
+            buffer.append_rows(new_rows)
+            stats.update(new_rows)
+            if len(buffer) == 0:
+                st.info("Waiting for bilge pump events...")
+                return
+            render_recent_events(buffer.frame())
+            render_pump_activity(stats)
+
+        live_pump()
+        render_debug_sidebar()
+        return
+
+    st.session_state.pop('bilge_live', None)
+    if len(latest_events):
+        render_recent_events(latest_events.to_frame())
+        render_pump_activity(stats)
     else:
         st.warning("No bilge pump data available.")
 
+    render_debug_sidebar()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,75 @@
+import streamlit as st
+import pandas as pd
+from supabase_client import init_supabase
+from fleet import FLEET_REFRESH_INTERVAL, init_fleet
+from debug_panel import DEBUG, begin_page_run, render_debug_sidebar
+from instrumentation import span
+
+def format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value is not None else '—'
+
+def format_number(value, pattern):
+    return pattern.format(value) if value is not None else '—'
+
+def render_overview(summaries):
+    table = pd.DataFrame({
+        'Boat': [s['boat'] for s in summaries],
+        'Voltage (V)': [format_number(s['voltage'], '{:.2f}') for s in summaries],
+        'Hours to 12V': [format_number(s['hours_to_12v'], '{:.1f}') for s in summaries],
+        'Last Reading (UTC)': [format_time(s['voltage_at']) for s in summaries],
+        'Position': [f"{s['lat']:.5f}, {s['lon']:.5f}" if s['lat'] is not None else '—' for s in summaries],
+        'Last Fix (UTC)': [format_time(s['position_at']) for s in summaries],
+        'Pump Cycles This Hour': [s['pump_cycles_hour'] for s in summaries],
+        'Last Pump Event (UTC)': [format_time(s['pump_at']) for s in summaries],
+    })
+    st.table(table)
+
+def render_map(summaries):
+    positions = pd.DataFrame([s for s in summaries if s['lat'] is not None and s['lon'] is not None])
+    if positions.empty:
+        st.info("No boat positions in the last 24 hours.")
+        return
+    import pydeck as pdk
+    layer = pdk.Layer(
+        "ScatterplotLayer",
+        positions[['boat', 'lat', 'lon']],
+        get_position=['lon', 'lat'],
+        get_color=[0, 0, 255],
+        get_radius=50,
+        radius_min_pixels=5,
+        pickable=True,
+    )
+    view_state = pdk.ViewState(longitude=positions['lon'].mean(), latitude=positions['lat'].mean(), zoom=8, pitch=0)
+    st.pydeck_chart(pdk.Deck(layers=[layer], initial_view_state=view_state, tooltip={'text': '{boat}'},
+                             map_style='mapbox://styles/mapbox/light-v9'))
+
+def main():
+    st.title("Fleet Overview")
+    begin_page_run("Fleet Overview")
+
+    supabase = init_supabase()
+    fleet = init_fleet(supabase)
+    if fleet is None:
+        st.info("Fleet mode is off. Set BOATSTATUS_FLEET to a comma separated list of boat ids to compare boats here.")
+        render_debug_sidebar()
+        return
+
+    # The shared index is refreshed with new rows only, at most once per interval
+    with span('fleet.load', boats=len(fleet.boats)):
+        fleet.refresh_if_due()
+    with span('fleet.overview', boats=len(fleet.boats)):
+        summaries = fleet.overview()
+
+    if fleet.refreshed_at is not None:
+        st.caption(f"Refreshed {format_time(fleet.refreshed_at)} UTC, every {FLEET_REFRESH_INTERVAL:.0f} s")
+    render_overview(summaries)
+    render_map(summaries)
+
+    if DEBUG:
+        held = {boat: sum(len(batch) for batch in index.batches.values()) for boat, index in fleet.boats.items()}
+        st.caption("Rows held per boat: " + ", ".join(f"{boat} {rows}" for boat, rows in held.items()))
+
+    render_debug_sidebar()
+
+if __name__ == "__main__":
+    main()
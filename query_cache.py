@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from transport import is_stale
+
+# Seconds a loaded window stays valid for every session in the process
+QUERY_CACHE_TTL = float(os.environ.get("BOATSTATUS_QUERY_CACHE_TTL", "60"))
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("BOATSTATUS_QUERY_CACHE_MAX_ENTRIES", "32"))
+
+class QueryCache:
+    # Process-wide TTL + LRU cache. Concurrent misses on the same key wait for a
+    # single loader call instead of each hitting Supabase.
+    def __init__(self, ttl=QUERY_CACHE_TTL, max_entries=QUERY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another session is loading this key, reuse its result once done
+            event.wait()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+            # The other load failed, try again ourselves
+
+        try:
+            value = loader()
+            if is_stale(value):
+                # Fallback data is not cached, the next rerun tries the server again
+                return value
+            with self._lock:
+                self._entries[key] = (time.monotonic(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    def find(self, match):
+        # Freshest live entry whose key satisfies match(key), None when there is none.
+        # Never loads, callers fall back to get_or_load.
+        with self._lock:
+            now = time.monotonic()
+            for key in reversed(self._entries):
+                stamp, value = self._entries[key]
+                if now - stamp < self.ttl and match(key):
+                    break
+            else:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+shared_cache = QueryCache()
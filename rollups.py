@@ -0,0 +1,194 @@
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from telemetry_cache import to_epoch_us
+
+# Bucket widths in seconds, finest first
+RESOLUTIONS = {'hour': 3600, 'day': 86400}
+
+# Raw columns every rollup is computed from
+ROLLUP_COLUMNS = {
+    'BatteryStatus': ['created_at', 'Voltage'],
+    'BoatPositions': ['created_at', 'Lat', 'Long', 'Accuracy'],
+    'BilgePumpStatus': ['created_at', 'El_Time'],
+}
+
+# Stored aggregates per table: (column, source column, op). NaN readings are skipped by
+# every op, so buckets merge correctly when their rows arrive over several syncs, late
+# uploads included: a 'last' value is paired with its reading time ('last_at', named
+# like it plus _at) and only replaced by a later reading.
+ROLLUP_SPECS = {
+    'BatteryStatus': [
+        ('n', 'Voltage', 'count'), ('v_sum', 'Voltage', 'sum'), ('v_min', 'Voltage', 'min'),
+        ('v_max', 'Voltage', 'max'), ('v_last', 'Voltage', 'last'), ('v_last_at', 'Voltage', 'last_at'),
+    ],
+    'BoatPositions': [
+        ('n', 'Lat', 'count'), ('lat_sum', 'Lat', 'sum'), ('lon_n', 'Long', 'count'), ('lon_sum', 'Long', 'sum'),
+        ('acc_n', 'Accuracy', 'count'), ('acc_sum', 'Accuracy', 'sum'),
+    ],
+    # El_Time of events that are not pump runs is blanked first, see _source_values
+    'BilgePumpStatus': [
+        ('cycles', 'El_Time', 'count'), ('runtime', 'El_Time', 'sum'), ('longest', 'El_Time', 'max'),
+    ],
+}
+
+# Frame columns returned by RollupStore.query, named like the raw columns where they
+# stand in for them
+ROLLUP_OUTPUTS = {
+    'BatteryStatus': [
+        ('Voltage', 'v_sum / n'), ('Voltage_min', 'v_min'), ('Voltage_max', 'v_max'),
+        ('Voltage_last', 'v_last'), ('Voltage_last_at', 'v_last_at'), ('readings', 'n'),
+    ],
+    'BoatPositions': [
+        ('Lat', 'lat_sum / n'), ('Long', 'lon_sum / lon_n'), ('Accuracy', 'acc_sum / NULLIF(acc_n, 0)'), ('fixes', 'n'),
+    ],
+    'BilgePumpStatus': [('cycles', 'cycles'), ('runtime', 'runtime'), ('longest', 'longest')],
+}
+
+# Merge of a stored bucket with the same bucket from newer rows
+_MERGE = {
+    'count': '{c} + excluded.{c}',
+    'sum': '{c} + excluded.{c}',
+    'min': 'min(coalesce({c}, excluded.{c}), coalesce(excluded.{c}, {c}))',
+    'max': 'max(coalesce({c}, excluded.{c}), coalesce(excluded.{c}, {c}))',
+    'last': 'CASE WHEN excluded.{c}_at >= coalesce({c}_at, excluded.{c}_at) THEN excluded.{c} ELSE {c} END',
+    'last_at': 'max(coalesce({c}, excluded.{c}), coalesce(excluded.{c}, {c}))',
+}
+# Stored as integers, every other op as REAL
+_INTEGER_OPS = ('count', 'last_at')
+# Output columns holding epoch nanoseconds, returned as UTC datetimes
+_TIME_OUTPUTS = ('Voltage_last_at',)
+
+def pick_resolution(start, end, budget):
+    # Coarsest resolution that still gives the chart at least `budget` points,
+    # None when the range is short enough to draw from raw rows
+    seconds = (end - start).total_seconds()
+    for name, width in reversed(RESOLUTIONS.items()):
+        if seconds / width >= budget:
+            return name
+    return None
+
+def _source_values(table, batch, column):
+    values = np.asarray(batch[column], dtype=np.float64)
+    if table == 'BilgePumpStatus':
+        # Only events with a positive run time are pump runs
+        values = np.where(values > 0, values, np.nan)
+    return values
+
+def _reduce(values, starts, op, times):
+    valid = ~np.isnan(values)
+    if op == 'count':
+        return np.add.reduceat(valid.astype(np.int64), starts)
+    if op == 'sum':
+        return np.add.reduceat(np.where(valid, values, 0.0), starts)
+    if op == 'min':
+        return np.fmin.reduceat(values, starts)
+    if op == 'max':
+        return np.fmax.reduceat(values, starts)
+    # last: value (or time, for last_at) of the last valid row of every bucket
+    last = np.maximum.reduceat(np.where(valid, np.arange(len(values)), -1), starts)
+    if op == 'last_at':
+        return np.where(last >= 0, times[last], -1)
+    return np.where(last >= 0, values[last], np.nan)
+
+class RollupStore:
+    # Hourly and daily aggregates of the telemetry tables in a local SQLite file. Updated
+    # incrementally from rows inserted after a per-table id watermark, never evicted, so
+    # long ranges read a few thousand buckets instead of every raw row.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS _rollup_state (tbl TEXT PRIMARY KEY, created_at TEXT, row_id INTEGER)"
+        )
+        for table, spec in ROLLUP_SPECS.items():
+            types = {name: "INTEGER" if op in _INTEGER_OPS else "REAL" for name, _, op in spec}
+            definition = ', '.join(f'{name} {kind}' for name, kind in types.items())
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{table}_rollup" '
+                f'(resolution TEXT NOT NULL, bucket INTEGER NOT NULL, {definition}, PRIMARY KEY (resolution, bucket))'
+            )
+            # Files written before a column was added get it, their buckets cannot fill it
+            # in so they are rebuilt from the raw rows on the next sync
+            existing = {row[1] for row in self._conn.execute(f'PRAGMA table_info("{table}_rollup")')}
+            missing = [name for name in types if name not in existing]
+            for name in missing:
+                self._conn.execute(f'ALTER TABLE "{table}_rollup" ADD COLUMN {name} {types[name]}')
+            if missing:
+                self._conn.execute(f'DELETE FROM "{table}_rollup"')
+                self._conn.execute("DELETE FROM _rollup_state WHERE tbl = ?", (table,))
+        self._conn.commit()
+
+    def watermark(self, table):
+        # Highest id folded in, None before the first fill
+        with self._lock:
+            row = self._conn.execute("SELECT row_id FROM _rollup_state WHERE tbl = ?", (table,)).fetchone()
+        return row[0] if row else None
+
+    def update(self, table, batch):
+        # Fold a ColumnBatch of rows inserted after the watermark into every resolution.
+        # Late rows land in the buckets they belong to, however old.
+        if not len(batch):
+            return
+        # Buckets need time order, rows read by id are not
+        batch = batch.in_time_order()
+        times = batch['created_at']
+        seconds = times // 1_000_000_000
+        spec = ROLLUP_SPECS[table]
+        values = {source: _source_values(table, batch, source) for _, source, _ in spec}
+
+        names = ', '.join(name for name, _, _ in spec)
+        placeholders = ', '.join('?' for _ in range(len(spec) + 2))
+        updates = ', '.join(f'{name} = {_MERGE[op].format(c=name)}' for name, _, op in spec)
+        sql = (f'INSERT INTO "{table}_rollup" (resolution, bucket, {names}) VALUES ({placeholders}) '
+               f'ON CONFLICT (resolution, bucket) DO UPDATE SET {updates}')
+        records = []
+        for resolution, width in RESOLUTIONS.items():
+            buckets = seconds // width * width
+            starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+            columns = []
+            for _, source, op in spec:
+                column = _reduce(values[source], starts, op, times).tolist()
+                if op == 'last_at':
+                    # A bucket without a valid reading has no last reading time
+                    column = [None if at < 0 else at for at in column]
+                columns.append(column)
+            records.extend((resolution, *row) for row in zip(buckets[starts].tolist(), *columns))
+
+        last_id = int(batch['id'].max())
+        with self._lock, self._conn:
+            self._conn.executemany(sql, records)
+            self._conn.execute(
+                "INSERT INTO _rollup_state (tbl, row_id) VALUES (?, ?) "
+                "ON CONFLICT (tbl) DO UPDATE SET row_id = max(row_id, excluded.row_id)",
+                (table, last_id),
+            )
+
+    def query(self, table, resolution, start=None, end=None):
+        outputs = ROLLUP_OUTPUTS[table]
+        width = RESOLUTIONS[resolution]
+        sql = f'SELECT bucket, {", ".join(expr for _, expr in outputs)} FROM "{table}_rollup" WHERE resolution = ?'
+        params = [resolution]
+        if start is not None:
+            # Include the bucket the range starts in
+            sql += " AND bucket >= ?"
+            params.append(to_epoch_us(start) // 1_000_000 // width * width)
+        if end is not None:
+            sql += " AND bucket <= ?"
+            params.append(to_epoch_us(end) // 1_000_000)
+        sql += " ORDER BY bucket"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        df = pd.DataFrame(rows, columns=['created_at'] + [name for name, _ in outputs])
+        df['created_at'] = pd.to_datetime(df['created_at'], unit='s', utc=True)
+        for name in _TIME_OUTPUTS:
+            if name in df.columns:
+                df[name] = pd.to_datetime(df[name], unit='ns', utc=True)
+        return df
+
+    def clear(self, table):
+        with self._lock, self._conn:
+            self._conn.execute(f'DELETE FROM "{table}_rollup"')
+            self._conn.execute("DELETE FROM _rollup_state WHERE tbl = ?", (table,))
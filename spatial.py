@@ -0,0 +1,244 @@
+import json
+import os
+from collections import namedtuple
+import numpy as np
+from track_processing import EARTH_RADIUS_M, project
+
+# A fix counts as outside a circle only when it is outside by more than this many times
+# its reported Accuracy, so a noisy fix does not raise an alarm on its own
+ACCURACY_SIGMAS = 2.0
+# Accuracy assumed for fixes that do not report one, in meters
+DEFAULT_ACCURACY_M = 10.0
+# Consecutive outside fixes before the anchor counts as dragging
+DRAG_MIN_FIXES = 3
+# Candidate fixes tried when looking for the anchored position
+ANCHOR_CANDIDATES = 256
+# Fixes searched brute force before they are merged into the tree
+INDEX_REBUILD_MIN = 256
+# Headroom of a projected radius query over the great-circle radius it stands in for
+SEARCH_SLACK = 1.01
+
+# Circular geofences as JSON: [{"name": "Marina", "lat": 43.55, "lon": 7.02, "radius_m": 300}]
+GEOFENCES = os.environ.get("BOATSTATUS_GEOFENCES", "")
+
+Geofence = namedtuple('Geofence', ['name', 'lat', 'lon', 'radius_m'])
+
+def haversine(lat1, lon1, lat2, lon2):
+    # Great-circle distance in meters, broadcasting over arrays
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def search_radius(radius_m, ref_lat, lat):
+    # Projected distances stretch east-west by cos(ref_lat) / cos(lat). A radius query in
+    # the projection, widened by the worst stretch within radius_m of lat, holds every
+    # fix within radius_m on the sphere; the exact test is haversine.
+    reach = np.degrees(radius_m / EARTH_RADIUS_M)
+    poleward = min(abs(lat) + reach, 89.9)
+    stretch = np.cos(np.radians(ref_lat)) / np.cos(np.radians(poleward))
+    return radius_m * max(1.0, stretch) * SEARCH_SLACK
+
+def _accuracy(accuracy, n):
+    if accuracy is None:
+        return np.full(n, DEFAULT_ACCURACY_M)
+    accuracy = np.asarray(accuracy, dtype=np.float64)
+    return np.where(np.isnan(accuracy), DEFAULT_ACCURACY_M, accuracy)
+
+def weighted_center(lat, lon, accuracy=None):
+    # Inverse-variance weighted mean position, precise fixes count more
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    weights = 1.0 / np.maximum(_accuracy(accuracy, len(lat)), 1.0) ** 2
+    return float(np.average(lat, weights=weights)), float(np.average(lon, weights=weights))
+
+def drift(lat, lon, accuracy, center_lat, center_lon, radius_m):
+    # Meters beyond the circle after allowing for each fix's accuracy, <= 0 means inside
+    distance = haversine(center_lat, center_lon, lat, lon)
+    return distance - radius_m - ACCURACY_SIGMAS * _accuracy(accuracy, len(np.atleast_1d(distance)))
+
+def _long_runs(mask, min_len):
+    # Mask of the True runs at least min_len long
+    edges = np.flatnonzero(np.diff(np.r_[0, mask.astype(np.int8), 0]))
+    starts, ends = edges[::2], edges[1::2]
+    keep = ends - starts >= min_len
+    delta = np.zeros(len(mask) + 1, dtype=np.int64)
+    np.add.at(delta, starts[keep], 1)
+    np.add.at(delta, ends[keep], -1)
+    return np.cumsum(delta[:-1]) > 0
+
+def anchor_drag(lat, lon, accuracy, anchor_lat, anchor_lon, swing_radius_m, min_fixes=DRAG_MIN_FIXES):
+    # Fixes that are part of a run of at least min_fixes consecutive fixes outside the
+    # swing circle, over a whole range at once
+    return _long_runs(drift(lat, lon, accuracy, anchor_lat, anchor_lon, swing_radius_m) > 0, min_fixes)
+
+class FixIndex:
+    # KD-tree over fixes projected to meters around a fixed reference latitude. New fixes
+    # go to a pending tail that is searched brute force; the tree is rebuilt once the tail
+    # outgrows a quarter of it, so adding fixes is amortized cheap and a radius query only
+    # visits nearby fixes instead of the whole track.
+    def __init__(self, ref_lat):
+        self.ref_lat = ref_lat
+        self._columns = np.empty((0, 5))  # x, y, lat, lon, accuracy (grown by doubling)
+        self._n = 0
+        self._tree = None
+        self._tree_size = 0
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def lat(self):
+        return self._columns[:self._n, 2]
+
+    @property
+    def lon(self):
+        return self._columns[:self._n, 3]
+
+    @property
+    def accuracy(self):
+        return self._columns[:self._n, 4]
+
+    def add(self, lat, lon, accuracy=None):
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        k = len(lat)
+        if k == 0:
+            return
+        if self._n + k > len(self._columns):
+            grown = np.empty((max(2 * len(self._columns), self._n + k, 1024), 5))
+            grown[:self._n] = self._columns[:self._n]
+            self._columns = grown
+        x, y = project(lat, lon, self.ref_lat)
+        self._columns[self._n:self._n + k] = np.column_stack((x, y, lat, lon, _accuracy(accuracy, k)))
+        self._n += k
+        if self._n - self._tree_size > max(INDEX_REBUILD_MIN, self._tree_size // 4):
+            self.flush()
+
+    def flush(self):
+        # Merge the pending tail into the tree (scipy is imported on first use)
+        from scipy.spatial import cKDTree
+        self._tree = cKDTree(self._columns[:self._n, :2].copy())
+        self._tree_size = self._n
+
+    def _point(self, lat, lon):
+        x, y = project([lat], [lon], self.ref_lat)
+        return np.array([x[0], y[0]])
+
+    def within(self, lat, lon, radius_m):
+        # Sorted indices of the fixes within radius_m of the position
+        point = self._point(lat, lon)
+        found = []
+        if self._tree is not None:
+            found.append(np.asarray(self._tree.query_ball_point(point, radius_m), dtype=np.int64))
+        tail = self._columns[self._tree_size:self._n, :2]
+        found.append(self._tree_size + np.flatnonzero(np.hypot(*(tail - point).T) <= radius_m))
+        return np.sort(np.concatenate(found))
+
+    def densest(self, radius_m, candidates=ANCHOR_CANDIDATES):
+        # Index of the fix with the most neighbours within radius_m, tried on an even
+        # sample of the fixes: where the boat spent most of its time
+        if self._n == 0:
+            return None
+        if self._tree_size != self._n:
+            self.flush()
+        sample = np.unique(np.linspace(0, self._n - 1, min(self._n, candidates)).astype(np.int64))
+        counts = self._tree.query_ball_point(self._columns[sample, :2], radius_m, return_length=True)
+        return int(sample[np.argmax(counts)])
+
+def estimate_anchor(index, swing_radius_m):
+    # Weighted centre of the fixes around the densest spot of the track
+    best = index.densest(swing_radius_m)
+    if best is None:
+        return None
+    members = index.within(index.lat[best], index.lon[best], swing_radius_m)
+    return weighted_center(index.lat[members], index.lon[members], index.accuracy[members])
+
+class AnchorWatch:
+    # Incremental anchor-drag check. The anchor is estimated from the first fixes (or
+    # given); every later fix costs one distance, so checking the latest fix is O(1).
+    def __init__(self, swing_radius_m, anchor=None, min_fixes=DRAG_MIN_FIXES):
+        self.swing_radius_m = swing_radius_m
+        self.anchor = anchor
+        self.min_fixes = min_fixes
+        self.index = None
+        self.outside_run = 0    # Consecutive fixes outside the circle, up to the latest
+        self.max_drift = 0.0    # Meters beyond the circle, worst fix so far
+        self.latest_distance = None
+
+    @property
+    def dragging(self):
+        return self.outside_run >= self.min_fixes
+
+    def update(self, lat, lon, accuracy=None):
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+        lat, lon = lat[valid], lon[valid]
+        accuracy = None if accuracy is None else np.atleast_1d(np.asarray(accuracy, dtype=np.float64))[valid]
+        if len(lat) == 0:
+            return self.dragging
+        if self.index is None:
+            self.index = FixIndex(ref_lat=float(lat[0]))
+        self.index.add(lat, lon, accuracy)
+        if self.anchor is None:
+            self.anchor = estimate_anchor(self.index, self.swing_radius_m)
+        beyond = drift(lat, lon, accuracy, *self.anchor, self.swing_radius_m)
+        outside = beyond > 0
+        if outside.all():
+            self.outside_run += len(outside)
+        else:
+            self.outside_run = len(outside) - 1 - int(np.flatnonzero(~outside)[-1])
+        self.max_drift = max(self.max_drift, float(beyond.max()))
+        self.latest_distance = float(haversine(*self.anchor, lat[-1], lon[-1]))
+        return self.dragging
+
+    def follow(self):
+        # A watch going on from this one's anchor and drag state without its fix index,
+        # for checking live fixes a poll at a time
+        watch = AnchorWatch(self.swing_radius_m, self.anchor, self.min_fixes)
+        watch.outside_run, watch.max_drift, watch.latest_distance = self.outside_run, self.max_drift, self.latest_distance
+        return watch
+
+def geofence_exits(inside):
+    # Indices of the first fix outside after a fix inside
+    inside = np.asarray(inside, dtype=bool)
+    return np.flatnonzero(inside[:-1] & ~inside[1:]) + 1
+
+def load_geofences(spec=GEOFENCES):
+    if not spec:
+        return []
+    return [Geofence(f['name'], float(f['lat']), float(f['lon']), float(f['radius_m'])) for f in json.loads(spec)]
+
+class GeofenceSet:
+    # Circular geofences. Whole ranges go through the fix index (one radius query per
+    # fence), a single fix through a KD-tree over the fence centres. Both only gather
+    # candidates, a fix is inside when its haversine distance is within the radius.
+    def __init__(self, fences):
+        self.fences = list(fences)
+        self._tree = None
+        if self.fences:
+            from scipy.spatial import cKDTree
+            self.ref_lat = float(np.mean([f.lat for f in self.fences]))
+            x, y = project([f.lat for f in self.fences], [f.lon for f in self.fences], self.ref_lat)
+            self._tree = cKDTree(np.column_stack((x, y)))
+            self._max_radius = max(f.radius_m for f in self.fences)
+
+    def containing(self, lat, lon):
+        # Fences the position is inside of
+        if self._tree is None:
+            return []
+        x, y = project([lat], [lon], self.ref_lat)
+        near = self._tree.query_ball_point([x[0], y[0]], search_radius(self._max_radius, self.ref_lat, lat))
+        return [self.fences[i] for i in sorted(near)
+                if haversine(self.fences[i].lat, self.fences[i].lon, lat, lon) <= self.fences[i].radius_m]
+
+    def exits(self, index):
+        # (fence, fix index) for every time the track left a fence
+        events = []
+        for fence in self.fences:
+            near = index.within(fence.lat, fence.lon, search_radius(fence.radius_m, index.ref_lat, fence.lat))
+            near = near[haversine(fence.lat, fence.lon, index.lat[near], index.lon[near]) <= fence.radius_m]
+            inside = np.zeros(len(index), dtype=bool)
+            inside[near] = True
+            events.extend((fence, int(i)) for i in geofence_exits(inside))
+        return sorted(events, key=lambda event: event[1])
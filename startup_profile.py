@@ -0,0 +1,33 @@
+import argparse
+import subprocess
+import sys
+
+# Import cost of the dashboard's dependencies and modules, each measured in a fresh
+# interpreter so nothing is already cached.
+# Usage: python startup_profile.py [module ...]
+
+MODULES = [
+    'streamlit', 'pandas', 'numpy', 'scipy.stats', 'altair', 'pydeck', 'supabase',
+    'supabase_client', 'battery_forecast', 'downsampling', 'track_processing', 'debug_panel',
+]
+
+SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+def import_seconds(module):
+    result = subprocess.run([sys.executable, '-c', SNIPPET.format(module=module)], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of dashboard modules")
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    args = parser.parse_args()
+    for module in args.modules:
+        seconds = import_seconds(module)
+        shown = "not installed or failed" if seconds is None else f"{seconds * 1000:8.1f}ms"
+        print(f"{module:<20} {shown}")
+    print("Time-to-first-paint per run is recorded as the app.first_paint span (BOATSTATUS_DEBUG=1 or BOATSTATUS_METRICS_PATH).")
+
+if __name__ == '__main__':
+    main()
@@ -1,93 +1,494 @@
 import os
-from supabase import create_client, Client
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from telemetry_cache import CURSOR_COLUMNS, EPOCH, TelemetryCache, to_epoch_us
+from backends import SupabaseBackend
+from columnar import BOAT_COLUMN, TABLE_SCHEMAS, ColumnBatch, decode_rows
+from rollups import ROLLUP_COLUMNS, RollupStore
+from transport import CircuitBreaker, http_client, mark_stale, with_retry
+import contextvars
+from instrumentation import count_page, log_event, logger, query_span
 
 # Load environment variables
 load_dotenv()
 
-def get_supabase_client() -> Client:
+def get_supabase_client():
+    # supabase pulls in its whole HTTP stack, import it only when a client is built
+    from supabase import ClientOptions, create_client
     url: str = os.environ.get("SUPABASE_URL")
     key: str = os.environ.get("SUPABASE_KEY")
-    print(f"Supabase URL: {url}")
-    print(f"Supabase Key: {key[:5]}...{key[-5:]}")
     if not url or not key:
         raise ValueError("Supabase URL or Key is missing from environment variables")
-    return create_client(url, key)
+    logger.info(f"Supabase URL: {url}")
+    # Pooled keep-alive connections with timeouts, see transport.py
+    return create_client(url, key, options=ClientOptions(httpx_client=http_client()))
+
+# Local telemetry cache, set BOATSTATUS_CACHE_PATH to an empty string to disable it
+CACHE_PATH = os.environ.get("BOATSTATUS_CACHE_PATH", ".telemetry_cache.sqlite")
+# Days of history kept locally, unset keeps everything
+CACHE_RETENTION_DAYS = os.environ.get("BOATSTATUS_CACHE_RETENTION_DAYS")
+# Hourly/daily aggregates for long ranges, an empty string disables them
+ROLLUP_PATH = os.environ.get("BOATSTATUS_ROLLUP_PATH", ".telemetry_rollups.sqlite")
+
+PAGE_SIZE = 1000  # Rows per request, PostgREST caps responses at 1000 by default
+
+# Bulk mode: concurrent page requests for long historical pulls
+BULK_MAX_WORKERS = int(os.environ.get("BOATSTATUS_BULK_MAX_WORKERS", "8"))
+
+# Results kept as last-known-good copies, served marked stale while the server is unreachable
+LAST_GOOD_ENTRIES = 16
+
+TABLES = ('BatteryStatus', 'BoatPositions', 'BilgePumpStatus')
+
+def _select_columns(columns):
+    if columns == '*':
+        return columns
+    if isinstance(columns, str):
+        columns = [c.strip() for c in columns.split(',')]
+    columns = list(columns)
+    for column in CURSOR_COLUMNS:
+        if column not in columns:
+            columns.append(column)
+    return ','.join(columns)
+
+def _bounds_us(start, end):
+    return (to_epoch_us(start) if start is not None else float('-inf'),
+            to_epoch_us(end) if end is not None else float('inf'))
+
+def _trim(result, start, end):
+    # The part of a last-known-good result inside [start, end]
+    lo, hi = _bounds_us(start, end)
+    if isinstance(result, ColumnBatch):
+        times = result['created_at'] // 1000
+        first, last = int(np.searchsorted(times, lo, side='left')), int(np.searchsorted(times, hi, side='right'))
+        return ColumnBatch(result.table, {name: column[first:last] for name, column in result.columns.items()})
+    return [row for row in result if lo <= to_epoch_us(row['created_at']) <= hi]
 
 class SupabaseClient:
-    def __init__(self):
-        self.client = get_supabase_client()
-        print("Supabase client initialized successfully")
+    def __init__(self, backend=None, cache_path=CACHE_PATH, retention_days=CACHE_RETENTION_DAYS, rollup_path=ROLLUP_PATH):
+        # Any object with fetch_page/fetch_latest/id_bounds can serve reads, see backends.py
+        self.backend = backend if backend is not None else SupabaseBackend(get_supabase_client())
+        self.client = getattr(self.backend, 'client', None)
+        self.cache = None
+        if cache_path:
+            retention_days = float(retention_days) if retention_days else None
+            self.cache = TelemetryCache(cache_path, retention_days=retention_days)
+        self.rollups = RollupStore(rollup_path) if rollup_path else None
+        self._sync_lock = threading.Lock()
+        # Every read goes through one breaker, an unreachable server fails fast for all sessions
+        self.breaker = CircuitBreaker()
+        self._last_good = OrderedDict()
+        self._last_good_lock = threading.Lock()
+        self._synced_at = {}
+        logger.info("Supabase client initialized successfully")
+
+    def _call(self, fn):
+        return with_retry(fn, breaker=self.breaker)
 
-    def fetch_battery_data(self):
+    def _last_good_for(self, key):
+        # The copy of the same request, else the newest copy of the same kind of request
+        # (key without its start and end) whose range overlaps, cut to the requested range.
+        # A window moving with the clock is never requested twice with the same bounds.
+        if key in self._last_good:
+            return self._last_good[key]
+        lo, hi = _bounds_us(key[2], key[3])
+        for other in reversed(self._last_good):
+            if other[:2] + other[4:] != key[:2] + key[4:]:
+                continue
+            other_lo, other_hi = _bounds_us(other[2], other[3])
+            if other_lo <= hi and lo <= other_hi:
+                result, as_of = self._last_good[other]
+                return _trim(result, key[2], key[3]), as_of
+        return None
+
+    def _guarded(self, key, load, empty):
+        # Fresh results are remembered; when loading fails the last-known-good copy is
+        # served instead, marked stale (empty and stale if there is none). Keys are
+        # (table, kind, start, end, ...).
         try:
-            all_data = []
-            page = 1
-            page_size = 1000  # Adjust this value based on your needs
+            result = load()
+        except Exception as e:
+            logger.error(f"Error fetching {key[0]}: {str(e)}")
+            with self._last_good_lock:
+                result, as_of = self._last_good_for(key) or (empty, None)
+            return mark_stale(result, as_of, str(e))
+        if not getattr(result, 'stale', False):
+            with self._last_good_lock:
+                self._last_good[key] = (result, datetime.now(timezone.utc))
+                self._last_good.move_to_end(key)
+                while len(self._last_good) > LAST_GOOD_ENTRIES:
+                    self._last_good.popitem(last=False)
+        return result
+
+    def _fetch_page(self, table, columns, start=None, end=None, after=None, limit=PAGE_SIZE, id_range=None, columnar=False, boats=None,
+                    after_id=None):
+        # Backends only take the boats filter when it is set, single-boat backends need not know it
+        extra = {'boats': boats} if boats is not None else {}
+        if after_id is not None:
+            extra['after_id'] = after_id
+        if columnar:
+            return self.backend.fetch_columns(table, columns, start, end, after, limit, id_range, **extra)
+        return self.backend.fetch_page(table, columns, start, end, after, limit, id_range, **extra)
+
+    def _iter_pages(self, table, start=None, end=None, columns='*', after=None, page_size=PAGE_SIZE, id_range=None, columnar=False, boats=None):
+        columns = _select_columns(columns)
+        while True:
+            data = self._call(lambda: self._fetch_page(table, columns, start, end, after, page_size, id_range, columnar, boats))
+            count_page()
+            if data:
+                yield data
+            # A short page is the last one, and an id slice no wider than a page cannot
+            # hold more rows than the full page just returned
+            if len(data) < page_size or (id_range is not None and id_range[1] - id_range[0] <= page_size):
+                break
+            after = data.last_cursor() if columnar else (data[-1]['created_at'], data[-1]['id'])
+
+    def _iter_new_pages(self, table, after_id, columns='*', columnar=False, boats=None):
+        # Rows inserted after the row with id after_id, in insert order. Incremental reads
+        # follow ids, not a (created_at, id) cursor: a boat uploading buffered readings
+        # late adds rows older than ones already read, which a time cursor never revisits.
+        columns = _select_columns(columns)
+        while True:
+            data = self._call(lambda: self._fetch_page(table, columns, limit=PAGE_SIZE, columnar=columnar, boats=boats,
+                                                       after_id=after_id))
+            count_page()
+            if data:
+                yield data
+            if len(data) < PAGE_SIZE:
+                break
+            after_id = int(data['id'][-1]) if columnar else data[-1]['id']
 
-            while True:
-                response = self.client.from_('BatteryStatus').select('*').range((page - 1) * page_size, page * page_size - 1).execute()
-                data = response.data
-                all_data.extend(data)
+    def _collect(self, table, pages, columns, columnar):
+        if columnar:
+            return ColumnBatch.concat(table, pages, _select_columns(columns).split(','))
+        all_data = []
+        for data in pages:
+            all_data.extend(data)
+        return all_data
 
-                if len(data) < page_size:
-                    break
+    def _fetch_bulk(self, table, start=None, end=None, columns='*', max_workers=BULK_MAX_WORKERS, columnar=False, boats=None):
+        # Split the id span of the range into page-sized slices and fetch them concurrently.
+        # Ids follow insert order, not created_at (a boat uploads buffered readings late),
+        # so the slices are sorted back into (created_at, id) order like every other read.
+        fleet = {'boats': boats} if boats is not None else {}
+        bounds = self._call(lambda: self.backend.id_bounds(table, start, end, **fleet))
+        if bounds is None:
+            return self._collect(table, [], columns, columnar)
+        first_id, last_id = bounds
+        slices = [(lo, min(lo + PAGE_SIZE, last_id + 1)) for lo in range(first_id, last_id + 1, PAGE_SIZE)]
 
-                page += 1
+        def fetch_slice(id_range):
+            pages = self._iter_pages(table, start, end, columns, id_range=id_range, columnar=columnar, boats=boats)
+            return self._collect(table, pages, columns, columnar)
+
+        # Worker threads report pages and bytes to the caller's query span
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            parts = list(executor.map(lambda id_range: context.copy().run(fetch_slice, id_range), slices))
+        if columnar:
+            return self._collect(table, parts, columns, columnar).in_time_order()
+        rows = [row for rows in parts for row in rows]
+        rows.sort(key=lambda row: (to_epoch_us(row['created_at']), row['id']))
+        return rows
+
+    def _fetch_range(self, table, start=None, end=None, columns='*', bulk=False, columnar=False, boats=None):
+        if bulk:
+            return self._fetch_bulk(table, start, end, columns, columnar=columnar, boats=boats)
+        return self._collect(table, self._iter_pages(table, start, end, columns, columnar=columnar, boats=boats), columns, columnar)
+
+    def _sync(self, table, start=None, backfill=True):
+        # Only rows inserted after the highest id synced are requested from the server. The
+        # first fill pulls the window the read asks for (start on, within the retention)
+        # in bulk mode, a later read reaching further back backfills the rows before it
+        # (reads of the newest rows pass backfill=False).
+        cutoff = self.cache.cutoff()
+        if start is None or (cutoff is not None and to_epoch_us(start) < to_epoch_us(cutoff)):
+            start = cutoff
+        with self._sync_lock:
+            last_id = self.cache.watermark(table)
+            if last_id is None:
+                data = self._fetch_bulk(table, start=start)
+                self.cache.insert(table, data)
+                self.cache.set_filled_from(table, start)
+                fetched = len(data)
+            else:
+                fetched = 0
+                if backfill and not self.cache.holds(table, start):
+                    filled_from = EPOCH + timedelta(microseconds=self.cache.filled_from(table))
+                    data = self._fetch_bulk(table, start=start, end=filled_from)
+                    self.cache.insert(table, data, advance=False)
+                    self.cache.set_filled_from(table, start)
+                    fetched += len(data)
+                for data in self._iter_new_pages(table, last_id):
+                    self.cache.insert(table, data)
+                    fetched += len(data)
+            evicted = self.cache.evict(table)
+            self._synced_at[table] = datetime.now(timezone.utc)
+        log_event("cache_sync", table=table, fetched=fetched, evicted=evicted)
+
+    def _sync_rollups(self, table):
+        # Fold rows inserted after the rollup watermark into the hourly and daily buckets
+        with self._sync_lock:
+            last_id = self.rollups.watermark(table)
+            if last_id is None:
+                # First fill covers the whole history, pulled in bulk mode
+                batches = [self._fetch_bulk(table, columns=ROLLUP_COLUMNS[table], columnar=True)]
+            else:
+                batches = self._iter_new_pages(table, last_id, ROLLUP_COLUMNS[table], columnar=True)
+            fetched = 0
+            for batch in batches:
+                self.rollups.update(table, batch)
+                fetched += len(batch)
+            self._synced_at['rollup', table] = datetime.now(timezone.utc)
+        log_event("rollup_sync", table=table, fetched=fetched)
+
+    def _fetch_latest(self, table, start=None, end=None, columns='*', limit=PAGE_SIZE, boats=None):
+        fleet = {'boats': boats} if boats is not None else {}
+        data = self._call(lambda: self.backend.fetch_latest(table, _select_columns(columns), start, end, limit, **fleet))
+        count_page()
+        return data
+
+    def _read(self, table, start=None, end=None, columns='*', bulk=False, descending=False, limit=None):
+        # The newest rows come from one request unless the local copy already has them,
+        # a cache never filled is not filled for them (that would download the whole
+        # retained history first)
+        latest = descending and limit is not None and limit <= PAGE_SIZE
+        if self.cache is None or not self.cache.covers(start) or (latest and self.cache.watermark(table) is None):
+            if latest:
+                return self._fetch_latest(table, start, end, columns, limit)
+            all_data = self._fetch_range(table, start, end, columns, bulk)
+            if descending:
+                all_data.reverse()
+            return all_data[:limit] if limit is not None else all_data
+        try:
+            self._sync(table, start, backfill=not latest)
+        except Exception as e:
+            # Serve what the local copy already holds
+            logger.warning(f"Sync of {table} failed ({str(e)}), serving cached rows")
+            rows = self.cache.query(table, start, end, columns, descending, limit)
+            return mark_stale(rows, self._synced_at.get(table), str(e))
+        rows = self.cache.query(table, start, end, columns, descending, limit)
+        if latest and len(rows) < limit and not self.cache.holds(table, start):
+            # Fewer rows held than asked for, the older ones are on the server only
+            return self._fetch_latest(table, start, end, columns, limit)
+        return rows
+
+    def resync(self, table=None):
+        # Drop the local copy and download the retained history again, rollups are
+        # rebuilt on their next read
+        for name in [table] if table else TABLES:
+            if self.rollups is not None:
+                self.rollups.clear(name)
+            if self.cache is not None:
+                self.cache.clear(name)
+                self._sync(name)
+
+    def latest_id(self, table, boats=None):
+        # Highest id inserted so far, the starting point for polling by id
+        try:
+            fleet = {'boats': boats} if boats is not None else {}
+            bounds = self._call(lambda: self.backend.id_bounds(table, **fleet))
+            return bounds[1] if bounds else 0
+        except Exception as e:
+            logger.error(f"Error fetching latest {table} id: {str(e)}")
+            return None
 
-            print(f"Battery data fetched: {len(all_data)} records")
+    def fetch_rows_after(self, table, after_id, columns='*', boats=None):
+        # Rows inserted after the row with id after_id in id order, straight from the
+        # server; late uploads of older readings are included
+        try:
+            with query_span(table) as query:
+                all_data = []
+                for data in self._iter_new_pages(table, after_id, columns, boats=boats):
+                    all_data.extend(data)
+                query.rows = len(all_data)
             return all_data
         except Exception as e:
-            print(f"Error fetching battery data: {str(e)}")
+            logger.error(f"Error fetching new {table} rows: {str(e)}")
             return []
 
-    def fetch_boat_positions(self):
+    def _read_columns(self, table, start=None, end=None, columns=None, bulk=False, boats=None):
+        names = _select_columns(columns).split(',')
+        # The local cache holds a single boat's history, reads of chosen boats bypass it
+        if self.cache is None or boats is not None or not self.cache.covers(start):
+            return self._fetch_range(table, start, end, columns, bulk, columnar=True, boats=boats)
         try:
-            response = self.client.from_('BoatPositions').select('*').execute()
-            print(f"Boat positions fetched: {len(response.data)} records")
-            return response.data
+            self._sync(table, start)
         except Exception as e:
-            print(f"Error fetching boat positions: {str(e)}")
-            return []
+            logger.warning(f"Sync of {table} failed ({str(e)}), serving cached rows")
+            batch = self.cache.query_columns(table, start, end, names)
+            return mark_stale(batch, self._synced_at.get(table), str(e))
+        return self.cache.query_columns(table, start, end, names)
+
+    def fetch_columns(self, table, start=None, end=None, columns=None, bulk=False, boats=None):
+        # Typed column arrays (see columnar.py) for the range instead of a list of dicts.
+        # boats limits the rows to those boats in fleet mode.
+        columns = list(columns or TABLE_SCHEMAS[table])
+        boats = tuple(sorted(boats)) if boats is not None else None
+
+        def load():
+            with query_span(table) as query:
+                batch = self._read_columns(table, start, end, columns, bulk, boats)
+                query.rows = len(batch)
+            return batch
+
+        empty = ColumnBatch.empty(table, _select_columns(columns).split(','))
+        return self._guarded((table, 'columns', start, end, tuple(columns), boats), load, empty)
+
+    def _read_latest_columns(self, table, columns, limit, boats=None):
+        names = _select_columns(columns).split(',')
+
+        def fetch():
+            # One request for the newest rows, few enough that decoding the dicts is free
+            rows = self._fetch_latest(table, columns=columns, limit=limit, boats=boats)
+            return decode_rows(table, [tuple(row[name] for name in names) for row in reversed(rows)], names)
 
-    def fetch_bilge_pump_data(self):
+        # A cache never filled is left to range reads, which fill only their window
+        if self.cache is None or boats is not None or self.cache.watermark(table) is None:
+            return fetch()
         try:
-            response = self.client.from_('BilgePumpStatus').select('*').execute()
-            print(f"Bilge pump data fetched: {len(response.data)} records")
-            return response.data
+            self._sync(table, backfill=False)
         except Exception as e:
-            print(f"Error fetching bilge pump data: {str(e)}")
-            return []
+            logger.warning(f"Sync of {table} failed ({str(e)}), serving cached rows")
+            batch = self.cache.query_columns(table, names=names, limit=limit)
+            return mark_stale(batch, self._synced_at.get(table), str(e))
+        batch = self.cache.query_columns(table, names=names, limit=limit)
+        if len(batch) < limit and not self.cache.holds(table, None):
+            # Fewer rows held than asked for, the older ones are on the server only
+            return fetch()
+        return batch
+
+    def fetch_latest_columns(self, table, columns=None, limit=10, boats=None):
+        # The newest `limit` rows as typed columns, oldest first
+        columns = list(columns or TABLE_SCHEMAS[table])
+        limit = min(limit, PAGE_SIZE)
+        boats = tuple(sorted(boats)) if boats is not None else None
+
+        def load():
+            with query_span(table) as query:
+                batch = self._read_latest_columns(table, columns, limit, boats)
+                query.rows = len(batch)
+            return batch
+
+        empty = ColumnBatch.empty(table, _select_columns(columns).split(','))
+        return self._guarded((table, 'latest', None, None, tuple(columns), limit, boats), load, empty)
+
+    def iter_columns(self, table, start=None, end=None, columns=None, after=None):
+        # Pages of typed columns straight from the server, one at a time, for streaming
+        # consumers such as export.py. No cache and no fallback, failures are raised.
+        yield from self._iter_pages(table, start, end, list(columns or TABLE_SCHEMAS[table]), after=after, columnar=True)
+
+    def fetch_fleet_columns(self, table, boats, start=None, end=None, columns=None, after_id=None):
+        # One batched query for every boat in `boats`, rows of all boats interleaved in
+        # (created_at, id) order with the boat column added; see fleet.py. With after_id,
+        # the rows inserted after that id in id order instead. Fleet reads bypass the
+        # local cache, which holds a single boat's history.
+        columns = list(columns or TABLE_SCHEMAS[table])
+        if BOAT_COLUMN not in columns:
+            columns.append(BOAT_COLUMN)
+        boats = sorted(boats)
+
+        def load():
+            with query_span(table) as query:
+                if after_id is None:
+                    pages = self._iter_pages(table, start, end, columns, columnar=True, boats=boats)
+                else:
+                    pages = self._iter_new_pages(table, after_id, columns, columnar=True, boats=boats)
+                batch = self._collect(table, pages, columns, True)
+                query.rows = len(batch)
+            return batch
+
+        empty = ColumnBatch.empty(table, _select_columns(columns).split(','))
+        return self._guarded((table, 'fleet', start, end, tuple(boats), tuple(columns), after_id), load, empty)
+
+    def fetch_rollup(self, table, resolution, start=None, end=None, boats=None):
+        # Hourly or daily aggregates (see rollups.py), None when they are disabled or
+        # were never built so callers can fall back to raw rows. Rollups mix every boat,
+        # so there are none for a selection of boats.
+        if self.rollups is None or boats is not None:
+            return None
+        try:
+            with query_span(table) as query:
+                try:
+                    self._sync_rollups(table)
+                    stale = None
+                except Exception as e:
+                    if self.rollups.watermark(table) is None:
+                        raise
+                    # Buckets already stored are still good, only the newest rows are missing
+                    logger.warning(f"Rollup sync of {table} failed ({str(e)}), serving stored buckets")
+                    stale = str(e)
+                df = self.rollups.query(table, resolution, start, end)
+                if stale is not None:
+                    df.attrs.update(stale=True, as_of=self._synced_at.get(('rollup', table)), error=stale)
+                query.rows = len(df)
+            return df
+        except Exception as e:
+            logger.error(f"Error fetching {table} rollup: {str(e)}")
+            return None
+
+    def _fetch_rows(self, table, start=None, end=None, columns='*', bulk=False, descending=False, limit=None):
+        def load():
+            with query_span(table) as query:
+                all_data = self._read(table, start, end, columns, bulk, descending, limit)
+                query.rows = len(all_data)
+            return all_data
+
+        key = (table, 'rows', start, end, _select_columns(columns), descending, limit)
+        return self._guarded(key, load, [])
+
+    def fetch_battery_data(self, start=None, end=None, columns='*', bulk=False):
+        return self._fetch_rows('BatteryStatus', start, end, columns, bulk)
+
+    def fetch_boat_positions(self, start=None, end=None, columns='*', bulk=False):
+        return self._fetch_rows('BoatPositions', start, end, columns, bulk)
+
+    def fetch_bilge_pump_data(self, start=None, end=None, columns='*', bulk=False, descending=False, limit=None):
+        return self._fetch_rows('BilgePumpStatus', start, end, columns, bulk, descending, limit)
 
     def sign_in(self, email, password):
         try:
             response = self.client.auth.sign_in_with_password({"email": email, "password": password})
-            print("Sign in successful")
+            logger.info("Sign in successful")
             return response
         except Exception as e:
-            print(f"Error signing in: {str(e)}")
+            logger.error(f"Error signing in: {str(e)}")
             raise
 
     def sign_out(self):
         try:
             response = self.client.auth.sign_out()
-            print("Sign out successful")
+            logger.info("Sign out successful")
             return response
         except Exception as e:
-            print(f"Error signing out: {str(e)}")
+            logger.error(f"Error signing out: {str(e)}")
             raise
 
     def get_user(self):
         try:
             user = self.client.auth.get_user()
-            print(f"Current user: {user.id if user else 'None'}")
+            logger.info(f"Current user: {user.id if user else 'None'}")
             return user
         except Exception as e:
-            print(f"Error getting user: {str(e)}")
+            logger.error(f"Error getting user: {str(e)}")
             return None
 
-supabase = SupabaseClient()
+supabase = None
+_supabase_lock = threading.Lock()
 
 def init_supabase():
+    # One client per process, created on first use and shared by every page, rerun and
+    # session (its HTTP connections and local cache included)
+    global supabase
+    if supabase is None:
+        with _supabase_lock:
+            if supabase is None:
+                # In fleet mode the local cache and rollups would mix the boats, every
+                # read goes to the server with the boat selection instead
+                from fleet import FLEET_BOATS
+                supabase = SupabaseClient(cache_path='', rollup_path='') if FLEET_BOATS else SupabaseClient()
     return supabase
@@ -0,0 +1,98 @@
+import numpy as np
+
+# Reading intervals of the onboard loggers
+BATTERY_INTERVAL_S = 300
+POSITION_INTERVAL_S = 60
+# Default start of generated data, 2024-01-01 00:00 UTC
+DEFAULT_START_S = 1704067200
+
+def utc_text(epoch_s):
+    # Vectorized epoch seconds -> fixed-width UTC text as stored by SQLiteBackend
+    stamps = np.datetime_as_string((np.asarray(epoch_s) * 1e6).astype('datetime64[us]'), unit='us')
+    return np.char.add(stamps, '+00:00')
+
+def _timeline(rng, n, interval_s, start_s, gap_rate=0.0005, max_gap_steps=288):
+    # Regular logging interval with jitter and occasional outages (logger offline)
+    steps = np.full(n, float(interval_s))
+    steps += rng.normal(0, interval_s * 0.02, n)
+    gaps = rng.random(n) < gap_rate
+    steps[gaps] += rng.integers(1, max_gap_steps, gaps.sum()) * interval_s
+    return start_s + np.cumsum(steps)
+
+def battery_status(n, seed=0, start_s=DEFAULT_START_S):
+    # House bank discharging overnight and charging on solar during the day, with an
+    # occasional shore-power top-up
+    rng = np.random.default_rng(seed)
+    t = _timeline(rng, n, BATTERY_INTERVAL_S, start_s)
+    hour = (t % 86400) / 3600
+    solar = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None)
+    drift = np.cumsum(rng.normal(0, 0.002, n))
+    state = 0.5 + 0.3 * np.sin(2 * np.pi * t / (86400 * 9)) + 0.05 * np.tanh(drift)
+    voltage = 11.9 + 1.0 * np.clip(state, 0, 1) + 0.6 * solar + rng.normal(0, 0.02, n)
+    shore = (t // 86400) % 14 == 0
+    voltage[shore] = 13.6 + rng.normal(0, 0.02, shore.sum())
+    return {'created_at': utc_text(t), 'Voltage': voltage.round(3)}
+
+def boat_positions(n, seed=0, start_s=DEFAULT_START_S, anchor=(43.55, 7.02)):
+    # Long stays at anchor (jitter around the swing circle) separated by passages
+    rng = np.random.default_rng(seed)
+    t = _timeline(rng, n, POSITION_INTERVAL_S, start_s)
+    lat = np.empty(n)
+    lon = np.empty(n)
+    position = np.array(anchor, dtype=float)
+    i = 0
+    while i < n:
+        stay = min(int(rng.integers(2000, 20000)), n - i)
+        swing = rng.normal(0, 0.0002, (stay, 2))
+        lat[i:i + stay] = position[0] + swing[:, 0]
+        lon[i:i + stay] = position[1] + swing[:, 1]
+        i += stay
+        passage = min(int(rng.integers(100, 600)), n - i)
+        if passage <= 0:
+            break
+        target = position + rng.normal(0, 0.2, 2)
+        path = np.linspace(position, target, passage) + rng.normal(0, 0.0001, (passage, 2))
+        lat[i:i + passage] = path[:, 0]
+        lon[i:i + passage] = path[:, 1]
+        position = target
+        i += passage
+    accuracy = rng.gamma(2.0, 2.5, n).round(1)
+    return {'created_at': utc_text(t), 'Lat': lat.round(6), 'Long': lon.round(6), 'Accuracy': accuracy}
+
+def bilge_pump_status(n, seed=0, start_s=DEFAULT_START_S):
+    # ON/OFF event pairs, the OFF event carries the run time in El_Time seconds
+    rng = np.random.default_rng(seed)
+    runs = (n + 1) // 2
+    run_time = rng.gamma(2.0, 8.0, runs).round(1)
+    # Runs get more frequent over time, the pattern of a slowly worsening leak
+    waits = rng.exponential(3600 * np.linspace(4, 1, runs))
+    on = start_s + np.cumsum(waits + run_time)
+    t = np.empty(2 * runs)
+    t[0::2] = on
+    t[1::2] = on + run_time
+    status = np.empty(2 * runs, dtype=object)
+    status[0::2] = 'ON'
+    status[1::2] = 'OFF'
+    el_time = np.zeros(2 * runs)
+    el_time[1::2] = run_time
+    return {'created_at': utc_text(t[:n]), 'Status': status[:n], 'El_Time': el_time[:n]}
+
+GENERATORS = {
+    'BatteryStatus': battery_status,
+    'BoatPositions': boat_positions,
+    'BilgePumpStatus': bilge_pump_status,
+}
+
+def populate(backend, rows, seed=0, chunk_size=100_000):
+    # Fill a SQLiteBackend with `rows` rows per table, generated in chunks to bound memory
+    for table, generate in GENERATORS.items():
+        start_s = DEFAULT_START_S
+        done = 0
+        while done < rows:
+            size = min(chunk_size, rows - done)
+            columns = generate(size, seed=seed + done, start_s=start_s)
+            backend.insert(table, {name: values.tolist() for name, values in columns.items()})
+            # Continue the next chunk where this one ended
+            last = np.datetime64(columns['created_at'][-1][:26])
+            start_s = (last - np.datetime64(0, 's')) / np.timedelta64(1, 's')
+            done += size
@@ -0,0 +1,176 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from columnar import decode_rows
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# The keyset cursor needs created_at and id on every row, they are returned with any selection
+CURSOR_COLUMNS = ('created_at', 'id')
+
+def to_epoch_us(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        # Supabase timestamps are UTC, treat naive values the same way
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+class TelemetryCache:
+    # Local SQLite copy of the telemetry tables. Each table keeps the raw rows as JSON,
+    # indexed by an integer epoch so range queries never touch the network. A table holds
+    # every row from its fill start (filled_from) on, the start is lowered by backfills.
+    def __init__(self, path, retention_days=None):
+        self.path = path
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS _sync_state (tbl TEXT PRIMARY KEY, created_at TEXT, row_id INTEGER, filled_from INTEGER)"
+        )
+        # Files from before fill starts were recorded hold the whole retained history,
+        # which an empty filled_from stands for
+        if 'filled_from' not in {row[1] for row in self._conn.execute("PRAGMA table_info(_sync_state)")}:
+            self._conn.execute("ALTER TABLE _sync_state ADD COLUMN filled_from INTEGER")
+        self._tables = set()
+
+    def _ensure_table(self, table):
+        if table in self._tables:
+            return
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS "{table}" (id INTEGER PRIMARY KEY, ts INTEGER NOT NULL, data TEXT NOT NULL)'
+        )
+        self._conn.execute(f'CREATE INDEX IF NOT EXISTS "{table}_ts" ON "{table}" (ts, id)')
+        self._tables.add(table)
+
+    def cutoff(self):
+        if self.retention_days is None:
+            return None
+        return datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+
+    def covers(self, start):
+        # Ranges reaching past the retention window have to go to the server
+        cutoff = self.cutoff()
+        return cutoff is None or (start is not None and to_epoch_us(start) >= to_epoch_us(cutoff))
+
+    def watermark(self, table):
+        # Highest id synced, None before the first fill. Ids follow insert order, readings a
+        # boat uploads late get new ids however old their created_at is.
+        with self._lock:
+            row = self._conn.execute("SELECT row_id FROM _sync_state WHERE tbl = ?", (table,)).fetchone()
+        return row[0] if row else None
+
+    def filled_from(self, table):
+        # Epoch microseconds of the fill start, None when the whole history is held (or
+        # nothing was filled yet, see holds)
+        with self._lock:
+            row = self._conn.execute("SELECT filled_from FROM _sync_state WHERE tbl = ?", (table,)).fetchone()
+        return row[0] if row else None
+
+    def set_filled_from(self, table, start):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE _sync_state SET filled_from = ? WHERE tbl = ?",
+                (None if start is None else to_epoch_us(start), table),
+            )
+
+    def holds(self, table, start):
+        # Whether every row from start on is held: the table was filled, from start or
+        # before it
+        with self._lock:
+            row = self._conn.execute("SELECT filled_from FROM _sync_state WHERE tbl = ?", (table,)).fetchone()
+        if row is None:
+            return False
+        return row[0] is None or (start is not None and to_epoch_us(start) >= row[0])
+
+    def insert(self, table, rows, advance=True):
+        # advance=False stores older rows (a backfill) without moving the id watermark,
+        # the ids between it and theirs may not have been synced yet
+        if not rows:
+            return
+        records = [(row['id'], to_epoch_us(row['created_at']), json.dumps(row)) for row in rows]
+        last_id = max(row['id'] for row in rows)
+        with self._lock, self._conn:
+            self._ensure_table(table)
+            self._conn.executemany(f'INSERT OR REPLACE INTO "{table}" (id, ts, data) VALUES (?, ?, ?)', records)
+            if advance:
+                self._conn.execute(
+                    "INSERT INTO _sync_state (tbl, row_id) VALUES (?, ?) "
+                    "ON CONFLICT (tbl) DO UPDATE SET row_id = max(row_id, excluded.row_id)",
+                    (table, last_id),
+                )
+
+    def query(self, table, start=None, end=None, columns='*', descending=False, limit=None):
+        sql = f'SELECT data FROM "{table}"'
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(to_epoch_us(start))
+        if end is not None:
+            clauses.append("ts <= ?")
+            params.append(to_epoch_us(end))
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY ts DESC, id DESC" if descending else " ORDER BY ts, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            self._ensure_table(table)
+            rows = [json.loads(data) for (data,) in self._conn.execute(sql, params)]
+        if columns == '*':
+            return rows
+        if isinstance(columns, str):
+            columns = [c.strip() for c in columns.split(',')]
+        # Same keys as a server read of the selection
+        columns = list(columns) + [c for c in CURSOR_COLUMNS if c not in columns]
+        return [{c: row.get(c) for c in columns} for row in rows]
+
+    def query_columns(self, table, start=None, end=None, names=('created_at',), limit=None):
+        # Columns pulled out of the stored JSON by SQLite, decoded straight into arrays.
+        # With a limit only the newest rows are returned, still oldest first
+        selects = []
+        for name in names:
+            if name == 'created_at':
+                selects.append('ts * 1000')
+            elif name == 'id':
+                selects.append('id')
+            else:
+                selects.append(f"json_extract(data, '$.\"{name}\"')")
+        sql = f'SELECT {", ".join(selects)} FROM "{table}"'
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(to_epoch_us(start))
+        if end is not None:
+            clauses.append("ts <= ?")
+            params.append(to_epoch_us(end))
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if limit is None:
+            sql += " ORDER BY ts, id"
+        else:
+            sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            self._ensure_table(table)
+            rows = self._conn.execute(sql, params).fetchall()
+        if limit is not None:
+            rows.reverse()
+        return decode_rows(table, rows, list(names))
+
+    def evict(self, table):
+        cutoff = self.cutoff()
+        if cutoff is None:
+            return 0
+        with self._lock, self._conn:
+            self._ensure_table(table)
+            cursor = self._conn.execute(f'DELETE FROM "{table}" WHERE ts < ?', (to_epoch_us(cutoff),))
+        return cursor.rowcount
+
+    def clear(self, table):
+        with self._lock, self._conn:
+            self._conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+            self._conn.execute("DELETE FROM _sync_state WHERE tbl = ?", (table,))
+            self._tables.discard(table)
@@ -0,0 +1,111 @@
+import json
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pytest
+from alert_worker import Alert, AlertWorker, BoatMonitor, FileSink, PumpCyclesRule, StdoutSink, TimeTo12VRule, make_sink
+from backends import SQLiteBackend
+from supabase_client import SupabaseClient
+
+NOW = datetime(2024, 1, 1, 12, 30, tzinfo=timezone.utc)
+
+class ListSink:
+    def __init__(self):
+        self.alerts = []
+
+    def send(self, alert):
+        self.alerts.append(alert)
+
+def _client(backend):
+    return SupabaseClient(backend=backend, cache_path='', rollup_path='')
+
+def _pump_runs(backend, times):
+    backend.insert('BilgePumpStatus', {
+        'created_at': times, 'Status': ['OFF'] * len(times), 'El_Time': [20.0] * len(times),
+    })
+
+def _voltages(backend, minutes, start=NOW - timedelta(hours=6)):
+    # Discharging 0.05 V per hour from 12.5 V
+    backend.insert('BatteryStatus', {
+        'created_at': [start + timedelta(minutes=m) for m in minutes],
+        'Voltage': [12.5 - 0.05 * m / 60 for m in minutes],
+    })
+
+def test_rule_fires_once_and_resolves():
+    backend = SQLiteBackend()
+    _pump_runs(backend, [NOW - timedelta(minutes=m) for m in (25, 20, 15)])
+    sink = ListSink()
+    worker = AlertWorker({'boat': _client(backend)}, sink, rules=[PumpCyclesRule(threshold=2)])
+    worker.run_cycle(NOW)
+    assert [(a.boat, a.rule, a.state, a.value) for a in sink.alerts] == [('boat', 'pump_cycles_per_hour', 'firing', 3)]
+    # Still firing, nothing new is sent
+    worker.run_cycle(NOW + timedelta(minutes=5))
+    _pump_runs(backend, [NOW + timedelta(minutes=10)])
+    worker.run_cycle(NOW + timedelta(minutes=10))
+    assert len(sink.alerts) == 1
+    # The next hour starts without runs
+    worker.run_cycle(NOW + timedelta(minutes=40))
+    assert [a.state for a in sink.alerts] == ['firing', 'resolved']
+    assert sink.alerts[1].message.startswith('Resolved: ')
+    assert worker.firing == set()
+
+def test_rules_without_a_forecast_stay_quiet():
+    sink = ListSink()
+    worker = AlertWorker({'boat': _client(SQLiteBackend())}, sink, rules=[TimeTo12VRule()])
+    worker.run_cycle(NOW)
+    assert sink.alerts == []
+
+def test_falling_voltage_fires_time_to_12v():
+    backend = SQLiteBackend()
+    _voltages(backend, range(0, 360, 5))
+    sink = ListSink()
+    worker = AlertWorker({'boat': _client(backend)}, sink, rules=[TimeTo12VRule(threshold=24)])
+    worker.run_cycle(NOW)
+    (alert,) = sink.alerts
+    assert alert.state == 'firing'
+    assert alert.value == pytest.approx(4.0, abs=0.1)
+
+def test_sinks(tmp_path, capsys):
+    path = tmp_path / 'alerts.jsonl'
+    sink = make_sink(f'file:{path}')
+    assert isinstance(sink, FileSink)
+    record = lambda state: Alert('boat', 'rule', state, 1.5, 1.0, 'message', NOW)
+    sink.send(record('firing'))
+    sink.send(record('resolved'))
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line['state'] for line in lines] == ['firing', 'resolved']
+    assert lines[0]['at'] == str(NOW)
+    stdout = make_sink('stdout')
+    assert isinstance(stdout, StdoutSink)
+    stdout.send(record('firing'))
+    assert json.loads(capsys.readouterr().out)['boat'] == 'boat'
+    with pytest.raises(ValueError):
+        make_sink('file:')
+    with pytest.raises(ValueError):
+        make_sink('pager')
+
+def test_refresh_applies_new_rows_once():
+    backend = SQLiteBackend()
+    _pump_runs(backend, [NOW - timedelta(minutes=m) for m in (25, 20)])
+    monitor = BoatMonitor('boat', _client(backend))
+    assert monitor.refresh(NOW) == 2
+    assert monitor.refresh(NOW + timedelta(minutes=1)) == 0
+    _pump_runs(backend, [NOW + timedelta(minutes=1)])
+    # Uploaded late: older than the newest run, but inserted after it
+    _pump_runs(backend, [NOW - timedelta(minutes=15)])
+    assert monitor.refresh(NOW + timedelta(minutes=2)) == 2
+    assert monitor.pump.cycles_in_last_hour(NOW) == 4
+    assert monitor.refresh(NOW + timedelta(minutes=3)) == 0
+    assert monitor.cursors['BilgePumpStatus'] == 4
+
+def test_late_readings_refit_the_forecast():
+    backend = SQLiteBackend()
+    _voltages(backend, range(180, 360, 5))
+    monitor = BoatMonitor('boat', _client(backend))
+    monitor.refresh(NOW)
+    # The first three hours arrive after the rest
+    _voltages(backend, range(0, 180, 5))
+    assert monitor.refresh(NOW + timedelta(seconds=30)) == 36
+    whole = BoatMonitor('boat', _client(backend))
+    whole.refresh(NOW + timedelta(seconds=30))
+    assert monitor.forecast.segment_start_ns == whole.forecast.segment_start_ns
+    np.testing.assert_allclose(monitor.forecast.rate(), whole.forecast.rate())
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+from battery_forecast import (HOUR_NS, NS_PER_S, LinearTrend, SegmentForecaster, SlidingForecast, epoch_ns,
+                              rolling_fit, segment_phases, window_fit)
+from synthetic_telemetry import battery_status
+
+def _line(n=200, slope=-0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    x = 1.7e9 + np.arange(n) * 300.0 + rng.normal(0, 5, n)
+    y = 12.8 + slope * (x - x[0]) / 3600 + rng.normal(0, 0.01, n)
+    return x, y
+
+def test_add_matches_linregress():
+    x, y = _line()
+    trend = LinearTrend()
+    for xi, yi in zip(x, y):
+        trend.add(xi, yi)
+    slope, intercept, r_value = trend.fit()
+    expected = stats.linregress(x, y)
+    assert slope == pytest.approx(expected.slope, rel=1e-9)
+    assert intercept == pytest.approx(expected.intercept, rel=1e-9)
+    assert r_value == pytest.approx(expected.rvalue, rel=1e-9)
+    assert trend.slope_stderr() == pytest.approx(expected.stderr, rel=1e-6)
+
+def test_add_arrays_matches_single_adds():
+    x, y = _line()
+    batched, single = LinearTrend(), LinearTrend()
+    for part in np.array_split(np.arange(len(x)), 7):
+        batched.add_arrays(x[part], y[part])
+    for xi, yi in zip(x, y):
+        single.add(xi, yi)
+    assert batched.n == single.n
+    np.testing.assert_allclose(batched.fit(), single.fit(), rtol=1e-9)
+
+def test_remove_undoes_add():
+    x, y = _line()
+    trend = LinearTrend()
+    trend.add_arrays(x, y)
+    for xi, yi in zip(x[:50], y[:50]):
+        trend.remove(xi, yi)
+    expected = stats.linregress(x[50:], y[50:])
+    slope, intercept, _ = trend.fit()
+    assert trend.n == len(x) - 50
+    assert slope == pytest.approx(expected.slope, rel=1e-7)
+    assert intercept == pytest.approx(expected.intercept, rel=1e-7)
+
+def test_remove_last_point_resets():
+    trend = LinearTrend()
+    trend.add(1.0, 2.0)
+    trend.remove(1.0, 2.0)
+    assert trend.n == 0 and trend.fit() is None
+
+def test_time_to_interval_brackets_crossing():
+    x, y = _line(slope=-0.02)
+    trend = LinearTrend()
+    trend.add_arrays(x, y)
+    crossing, lower, upper, slope, intercept, _ = trend.time_to(12.0)
+    assert slope < 0
+    assert intercept + slope * crossing == pytest.approx(12.0)
+    assert lower < crossing < upper
+
+def test_time_to_far_bound_open_when_slope_uncertain():
+    rng = np.random.default_rng(1)
+    x = np.arange(20) * 300.0
+    y = 12.5 + rng.normal(0, 0.05, 20)
+    trend = LinearTrend()
+    trend.add_arrays(x, y)
+    result = trend.time_to(12.0)
+    assert result is None or result[2] is None
+
+def test_sliding_forecast_keeps_window_only():
+    x, y = _line(n=300, slope=-0.02)
+    times = (x * NS_PER_S).astype(np.int64)
+    window_ns = 6 * HOUR_NS
+    forecast = SlidingForecast(window_ns)
+    for part in np.array_split(np.arange(len(x)), 10):
+        forecast.update(times[part], y[part])
+    keep = times >= times[-1] - window_ns
+    expected = stats.linregress(x[keep], y[keep])
+    assert forecast.trend.n == keep.sum()
+    assert forecast.trend.fit()[0] == pytest.approx(expected.slope, rel=1e-6)
+
+def test_sliding_forecast_ignores_old_readings():
+    forecast = SlidingForecast()
+    forecast.update([1 * NS_PER_S, 2 * NS_PER_S], [12.6, 12.5])
+    forecast.update([2 * NS_PER_S, 1 * NS_PER_S], [99.0, 99.0])
+    assert forecast.trend.n == 2
+
+def test_rolling_fit_matches_linregress():
+    x, y = _line(n=120)
+    slope, intercept = rolling_fit(x, y, 25)
+    for i in (1, 10, 24, 60, 119):
+        lo = max(i + 1 - 25, 0)
+        expected = stats.linregress(x[lo:i + 1], y[lo:i + 1])
+        assert slope[i] == pytest.approx(expected.slope, rel=1e-6)
+        assert intercept[i] == pytest.approx(expected.intercept, rel=1e-6)
+
+def test_window_fit_stderr_matches_linregress():
+    x, y = _line(n=100)
+    lo, hi = np.array([0, 20, 50]), np.array([30, 45, 100])
+    slope, _, stderr = window_fit(x, y, lo, hi)
+    for i in range(3):
+        expected = stats.linregress(x[lo[i]:hi[i]], y[lo[i]:hi[i]])
+        assert slope[i] == pytest.approx(expected.slope, rel=1e-6)
+        assert stderr[i] == pytest.approx(expected.stderr, rel=1e-5)
+
+def _synthetic_battery(days, seed=0):
+    data = battery_status(days * 288, seed=seed)
+    return epoch_ns(pd.to_datetime(data['created_at'], utc=True)), data['Voltage'].astype(np.float64)
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_segments_follow_the_daily_charge_cycle(seed):
+    # Solar charging in the morning, discharging from the afternoon: about two phases a
+    # day, not a new segment every time the noise tips the slope
+    times, voltages = _synthetic_battery(30, seed)
+    _, starts, _ = segment_phases(times, voltages)
+    days = (times[-1] - times[0]) / (24 * HOUR_NS)
+    assert 1.5 <= len(starts) / days <= 2.5
+
+def test_segments_do_not_depend_on_logging_interval():
+    times, voltages = _synthetic_battery(20)
+    _, starts, _ = segment_phases(times, voltages)
+    _, sparse_starts, _ = segment_phases(times[::3], voltages[::3])
+    assert abs(len(sparse_starts) - len(starts)) <= 0.2 * len(starts)
+
+def test_forecaster_fed_in_parts_matches_one_pass():
+    times, voltages = _synthetic_battery(10)
+    whole, parts = SegmentForecaster(), SegmentForecaster()
+    whole.update(times, voltages)
+    for part in np.array_split(np.arange(len(times)), 40):
+        parts.update(times[part], voltages[part])
+    assert parts.phase == whole.phase
+    assert parts.segment_start_ns == whole.segment_start_ns
+    assert len(parts.segments) == pytest.approx(len(whole.segments), abs=2)
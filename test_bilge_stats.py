@@ -0,0 +1,76 @@
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+import pytest
+from bilge_stats import PumpDutyStats
+from columnar import decode_rows
+
+START = datetime(2024, 1, 1, 22, tzinfo=timezone.utc)
+NAMES = ['id', 'created_at', 'Status', 'El_Time']
+
+def _events(n=200, seed=0):
+    # Pump ON events without a runtime, OFF events with one, every few minutes across midnight
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        created_at = (START + timedelta(minutes=3 * i)).isoformat()
+        if i % 2:
+            rows.append({'id': i + 1, 'created_at': created_at, 'Status': 'OFF', 'El_Time': float(rng.integers(5, 90))})
+        else:
+            rows.append({'id': i + 1, 'created_at': created_at, 'Status': 'ON', 'El_Time': None})
+    return rows
+
+def _batch(rows):
+    return decode_rows('BilgePumpStatus', [tuple(row[name] for name in NAMES) for row in rows], NAMES)
+
+def test_missing_runtime_is_not_a_cycle():
+    stats = PumpDutyStats()
+    rows = [{'id': 1, 'created_at': START.isoformat(), 'Status': 'ON', 'El_Time': float('nan')},
+            {'id': 2, 'created_at': (START + timedelta(seconds=30)).isoformat(), 'Status': 'OFF', 'El_Time': 30.0}]
+    stats.update(rows)
+    assert stats.cycles_in_last_hour(START) == 1
+    assert stats.runtime_per_day[START.date()] == 30.0
+
+def test_columns_match_rows():
+    rows = _events()
+    by_rows, by_columns = PumpDutyStats(), PumpDutyStats()
+    by_rows.update(rows)
+    for part in (rows[:37], rows[37:38], rows[38:150], rows[150:]):
+        by_columns.update_columns(_batch(part))
+    assert by_columns.cycles_per_hour == by_rows.cycles_per_hour
+    assert by_columns.runtime_per_day == pytest.approx(by_rows.runtime_per_day)
+    assert by_columns.longest_per_day == by_rows.longest_per_day
+    assert (by_columns.last_id, by_columns.latest) == (by_rows.last_id, by_rows.latest)
+    assert set(by_columns.runtime_per_day) == {date(2024, 1, 1), date(2024, 1, 2)}
+
+def test_columns_skip_events_already_applied():
+    rows = _events(20)
+    stats = PumpDutyStats()
+    assert stats.update_columns(_batch(rows[:10])) == 10
+    # A delta query from since() returns the last event again
+    assert stats.update_columns(_batch(rows[9:])) == 10
+    assert sum(stats.cycles_per_hour.values()) == 10
+
+def test_late_events_are_applied_once():
+    rows = _events()
+    whole = PumpDutyStats()
+    whole.update_columns(_batch(rows))
+    # The first 40 events are uploaded after the rest, with higher ids
+    late = [dict(row, id=row['id'] + len(rows)) for row in rows[:40]]
+    stats, by_rows = PumpDutyStats(), PumpDutyStats()
+    for part in (rows[40:120], rows[120:] + late[:15], late[10:]):
+        stats.update_columns(_batch(part))
+        by_rows.update(part)
+    for result in (stats, by_rows):
+        assert result.cycles_per_hour == whole.cycles_per_hour
+        assert result.runtime_per_day == pytest.approx(whole.runtime_per_day)
+        assert result.longest_per_day == whole.longest_per_day
+        assert result.latest == whole.latest
+
+def test_old_buckets_are_evicted():
+    stats = PumpDutyStats(retention_days=1)
+    old = {'id': 1, 'created_at': START.isoformat(), 'Status': 'OFF', 'El_Time': 10.0}
+    new = {'id': 2, 'created_at': (START + timedelta(days=3)).isoformat(), 'Status': 'OFF', 'El_Time': 20.0}
+    stats.update_columns(_batch([old]))
+    stats.update_columns(_batch([new]))
+    assert list(stats.runtime_per_day) == [(START + timedelta(days=3)).date()]
+    assert stats.longest_run() == 20.0
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from columnar import decode_csv, decode_rows
+
+PUMP = ['id', 'created_at', 'Status', 'El_Time']
+
+def _ns(text):
+    return pd.Timestamp(text).as_unit('ns').value
+
+def test_null_and_empty_fields():
+    text = 'id,created_at,Status,El_Time\n1,2024-01-01 00:00:00+00,ON,\n2,2024-01-01 00:00:30+00,,12.5\n'
+    batch = decode_csv('BilgePumpStatus', text, PUMP)
+    assert batch['Status'][0] == 'ON' and pd.isna(batch['Status'][1])
+    assert batch['El_Time'].dtype == np.float32
+    assert np.isnan(batch['El_Time'][0]) and batch['El_Time'][1] == np.float32(12.5)
+
+def test_timestamps_with_and_without_fractions_and_offsets():
+    text = ('id,created_at,Voltage\n'
+            '1,2024-01-01 00:00:00+00,12.1\n'
+            '2,2024-01-01T00:00:01.5+00:00,12.2\n'
+            '3,2024-01-01 02:00:02.123456+02,12.3\n'
+            '4,2024-01-01 00:00:03Z,12.4\n'
+            '5,2024-01-01 00:00:04,12.5\n')
+    batch = decode_csv('BatteryStatus', text, ['id', 'created_at', 'Voltage'])
+    assert batch['created_at'].dtype == np.int64
+    # Every value in UTC epoch nanoseconds, timestamps without an offset are UTC too
+    expected = ['2024-01-01 00:00:00Z', '2024-01-01 00:00:01.5Z', '2024-01-01 00:00:02.123456Z',
+                '2024-01-01 00:00:03Z', '2024-01-01 00:00:04Z']
+    np.testing.assert_array_equal(batch['created_at'], [_ns(t) for t in expected])
+    frame = batch.to_frame()
+    assert str(frame['created_at'].dt.tz) == 'UTC'
+
+def test_numeric_columns_with_missing_values():
+    text = 'id,created_at,Lat,Long,Accuracy\n1,2024-01-01 00:00:00+00,,7.1,\n2,2024-01-01 00:00:01+00,43.551234567,7.2,4.5\n'
+    batch = decode_csv('BoatPositions', text, ['id', 'created_at', 'Lat', 'Long', 'Accuracy'])
+    assert batch['id'].dtype == np.int64
+    assert batch['Lat'].dtype == np.float64 and batch['Accuracy'].dtype == np.float32
+    assert np.isnan(batch['Lat'][0]) and np.isnan(batch['Accuracy'][0])
+    # float64 keeps a fix to well under a metre
+    assert batch['Lat'][1] == 43.551234567
+
+def test_csv_and_rows_decode_alike():
+    text = 'id,created_at,Status,El_Time\n1,2024-01-01 00:00:00+00,ON,\n2,2024-01-01 00:00:30.25+00,OFF,30\n'
+    rows = [(1, '2024-01-01T00:00:00+00:00', 'ON', None), (2, '2024-01-01T00:00:30.250000+00:00', 'OFF', 30.0)]
+    from_csv = decode_csv('BilgePumpStatus', text, PUMP)
+    from_rows = decode_rows('BilgePumpStatus', rows, PUMP)
+    for name in ('id', 'created_at', 'El_Time'):
+        np.testing.assert_array_equal(from_csv[name], from_rows[name])
+    assert list(from_csv['Status']) == list(from_rows['Status'])
+
+def test_empty_responses():
+    for text in ('', '  \n', 'id,created_at,Voltage\n'):
+        batch = decode_csv('BatteryStatus', text, ['id', 'created_at', 'Voltage'])
+        assert len(batch) == 0
+        assert batch['created_at'].dtype == np.int64
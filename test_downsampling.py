@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from downsampling import downsample, lttb_indices, min_max_indices, pixel_budget
+
+def _series(n=10_000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.arange(n, dtype=np.float64)
+    y = np.cumsum(rng.normal(0, 1, n))
+    return x, y
+
+def test_lttb_keeps_ends_and_budget():
+    x, y = _series()
+    idx = lttb_indices(x, y, 500)
+    assert len(idx) == 500
+    assert idx[0] == 0 and idx[-1] == len(x) - 1
+    assert np.all(np.diff(idx) > 0)
+
+def test_lttb_small_input_untouched():
+    x, y = _series(50)
+    np.testing.assert_array_equal(lttb_indices(x, y, 100), np.arange(50))
+    np.testing.assert_array_equal(lttb_indices(x, y, 2), np.arange(50))
+
+def test_lttb_keeps_a_spike():
+    x, y = _series()
+    y[4321] = 1e6
+    assert 4321 in lttb_indices(x, y, 200)
+
+def test_min_max_keeps_every_bucket_extreme():
+    x, y = _series()
+    n_out = 400
+    idx = min_max_indices(x, y, n_out)
+    assert len(idx) <= n_out + 2
+    assert idx[0] == 0 and idx[-1] == len(x) - 1
+    bucket = np.arange(len(y)) * (n_out // 2) // len(y)
+    for b in range(n_out // 2):
+        members = np.flatnonzero(bucket == b)
+        assert y[members].min() in y[idx] and y[members].max() in y[idx]
+
+def test_downsample_frame_with_datetimes():
+    x, y = _series(5000)
+    df = pd.DataFrame({'created_at': pd.to_datetime(x, unit='s', utc=True), 'Voltage': y})
+    for mode in ('lttb', 'minmax'):
+        out = downsample(df, 'created_at', 'Voltage', pixel_budget(200, mode), mode)
+        assert len(out) <= pixel_budget(200, mode) + 2
+        assert out['created_at'].is_monotonic_increasing
+    assert downsample(df.head(10), 'created_at', 'Voltage', 100) is not None
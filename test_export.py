@@ -0,0 +1,112 @@
+import json
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+import pytest
+import export
+from backends import SQLiteBackend
+from export import cursor_path, export_range
+from supabase_client import SupabaseClient
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+ROWS = 3500
+
+class Interrupted(Exception):
+    pass
+
+def _client():
+    backend = SQLiteBackend()
+    # Pairs of readings share a timestamp, so the cursor has to break ties on id
+    backend.insert('BatteryStatus', {
+        'created_at': [START + timedelta(seconds=30 * (i // 2)) for i in range(ROWS)],
+        'Voltage': [12.0 + i / ROWS for i in range(ROWS)],
+    })
+    return SupabaseClient(backend=backend, cache_path='', rollup_path='')
+
+def _interrupt_after(pages):
+    def on_progress(progress):
+        if progress.pages >= pages:
+            raise Interrupted()
+    return on_progress
+
+def test_csv_export_resumes_after_interruption(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, 'PROGRESS_EVERY', 1)
+    client = _client()
+    output = str(tmp_path / 'battery.csv')
+    with pytest.raises(Interrupted):
+        export_range(client, 'BatteryStatus', output, columns=['created_at', 'Voltage'], on_progress=_interrupt_after(2))
+    state = json.load(open(cursor_path(output)))
+    assert state['rows'] == 2000 and not state['complete']
+
+    progress = export_range(client, 'BatteryStatus', output, columns=['created_at', 'Voltage'], resume=True)
+    assert progress.rows == ROWS
+    frame = pd.read_csv(output)
+    np.testing.assert_array_equal(frame['id'], np.arange(1, ROWS + 1))
+    assert json.load(open(cursor_path(output)))['complete']
+
+def test_resume_with_partial_page_on_disk_drops_it(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, 'PROGRESS_EVERY', 1)
+    client = _client()
+    output = str(tmp_path / 'battery.csv')
+    with pytest.raises(Interrupted):
+        export_range(client, 'BatteryStatus', output, columns=['Voltage'], on_progress=_interrupt_after(1))
+    # Rows written after the checkpoint, as a crash mid-page would leave them
+    with open(output, 'a') as f:
+        f.write('12.5,2024-01-01 00:00:00+00:00,99999\n12.6,')
+    export_range(client, 'BatteryStatus', output, columns=['Voltage'], resume=True)
+    np.testing.assert_array_equal(pd.read_csv(output)['id'], np.arange(1, ROWS + 1))
+
+def test_interrupt_right_after_a_write_repeats_no_rows(tmp_path, monkeypatch):
+    # The page is on disk but the progress never saw it, the cursor must still cover it
+    client = _client()
+    output = str(tmp_path / 'battery.csv')
+    add = export.ExportProgress.add
+
+    def interrupted_add(self, batch, nbytes):
+        if self.pages == 1:
+            raise Interrupted()
+        add(self, batch, nbytes)
+    monkeypatch.setattr(export.ExportProgress, 'add', interrupted_add)
+    with pytest.raises(Interrupted):
+        export_range(client, 'BatteryStatus', output, columns=['Voltage'])
+    assert json.load(open(cursor_path(output)))['rows'] == 2000
+    monkeypatch.setattr(export.ExportProgress, 'add', add)
+    progress = export_range(client, 'BatteryStatus', output, columns=['Voltage'], resume=True)
+    assert progress.rows == ROWS
+    np.testing.assert_array_equal(pd.read_csv(output)['id'], np.arange(1, ROWS + 1))
+
+def test_parquet_export_resumes_from_closed_parts(tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(export, 'PROGRESS_EVERY', 1)
+    monkeypatch.setattr(export, 'ROW_GROUP_ROWS', 500)
+    monkeypatch.setattr(export, 'PART_ROWS', 2000)
+    client = _client()
+    output = str(tmp_path / 'battery.parquet')
+    # The third page is buffered in an open part when the export stops
+    with pytest.raises(Interrupted):
+        export_range(client, 'BatteryStatus', output, columns=['Voltage'], on_progress=_interrupt_after(3))
+    state = json.load(open(cursor_path(output)))
+    assert state['rows'] == 2000 and len(state['parts']) == 1
+    progress = export_range(client, 'BatteryStatus', output, columns=['Voltage'], resume=True)
+    assert progress.rows == ROWS
+    frame = pd.read_parquet(output).sort_values('id')
+    np.testing.assert_array_equal(frame['id'], np.arange(1, ROWS + 1))
+    np.testing.assert_allclose(frame['Voltage'], [12.0 + i / ROWS for i in range(ROWS)], rtol=1e-6)
+
+def test_resume_of_a_different_export_is_refused(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, 'PROGRESS_EVERY', 1)
+    client = _client()
+    output = str(tmp_path / 'battery.csv')
+    with pytest.raises(Interrupted):
+        export_range(client, 'BatteryStatus', output, columns=['Voltage'], on_progress=_interrupt_after(1))
+    with pytest.raises(ValueError):
+        export_range(client, 'BatteryStatus', output, start=START, columns=['Voltage'], resume=True)
+
+def test_resume_of_a_complete_export_writes_nothing(tmp_path):
+    client = _client()
+    output = str(tmp_path / 'battery.csv')
+    export_range(client, 'BatteryStatus', output, columns=['Voltage'])
+    size = (tmp_path / 'battery.csv').stat().st_size
+    progress = export_range(client, 'BatteryStatus', output, columns=['Voltage'], resume=True)
+    assert progress.rows == ROWS
+    assert (tmp_path / 'battery.csv').stat().st_size == size
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from backends import SQLiteBackend
+from columnar import BOAT_COLUMN, decode_rows
+from fleet import BoatIndex, FleetIndex, partition
+from supabase_client import SupabaseClient
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+NAMES = ['id', 'created_at', 'Status', 'El_Time', 'boat_id']
+
+def _pump_batch():
+    # Two boats interleaved, OFF events carry the runtime, ON events none
+    rows = [(i + 1, (START + timedelta(minutes=i)).isoformat(), 'OFF' if i % 4 >= 2 else 'ON',
+             10.0 if i % 4 >= 2 else None, 'ab'[i % 2]) for i in range(40)]
+    return decode_rows('BilgePumpStatus', rows, NAMES)
+
+def test_partition_keeps_time_order_per_boat():
+    parts = partition(_pump_batch())
+    assert sorted(parts) == ['a', 'b']
+    np.testing.assert_array_equal(parts['a']['id'], np.arange(1, 41, 2))
+    np.testing.assert_array_equal(parts['b']['id'], np.arange(2, 41, 2))
+
+def test_boat_index_counts_pump_runs_once():
+    index = BoatIndex('a')
+    part = partition(_pump_batch())['a']
+    index.append('BilgePumpStatus', part)
+    assert index.pump.cycles_in_last_hour(START) == 10
+    assert index.pump.runtime_per_day[START.date()] == 100.0
+    assert index.latest('BilgePumpStatus')['id'] == 39
+
+def _insert_voltages(backend, boat, minutes):
+    backend.insert('BatteryStatus', {
+        'created_at': [START + timedelta(minutes=m) for m in minutes],
+        'Voltage': [13.0 - m / 100 for m in minutes],
+        BOAT_COLUMN: [boat] * len(minutes),
+    })
+
+def test_refresh_picks_up_late_uploads():
+    backend = SQLiteBackend()
+    _insert_voltages(backend, 'a', range(30, 60))
+    _insert_voltages(backend, 'b', range(0, 60))
+    client = SupabaseClient(backend=backend, cache_path='', rollup_path='')
+    fleet = FleetIndex(client, ['a', 'b'])
+    now = START + timedelta(hours=2)
+    assert fleet.refresh(now) == 90
+    assert fleet.cursors['BatteryStatus'] == 90
+    # Boat a uploads its buffered first half hour after the rest
+    _insert_voltages(backend, 'a', range(0, 30))
+    assert fleet.refresh(now + timedelta(minutes=1)) == 30
+    assert fleet.refresh(now + timedelta(minutes=2)) == 0
+    battery = fleet.boats['a'].batches['BatteryStatus']
+    np.testing.assert_allclose(battery['Voltage'], 13.0 - np.arange(60) / 100, rtol=1e-6)
+    assert len(fleet.boats['b'].batches['BatteryStatus']) == 60
+    # The forecast covers the late readings too
+    assert fleet.boats['a'].forecast.segment_start_ns == battery['created_at'][0]
@@ -0,0 +1,100 @@
+import re
+import threading
+import time
+import instrumentation
+from instrumentation import Registry, begin_run, count_page, current_run, export_run, query_span, span
+
+SAMPLE = re.compile(r'^(boatstatus_[a-z_]+)\{(span|table)="([^"]+)"\} (\d+(\.\d+)?)$')
+
+def test_nested_spans(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'registry', Registry())
+    run = begin_run('page')
+    with span('page.load', rows=0) as outer:
+        with span('page.frame'):
+            time.sleep(0.01)
+        with span('page.frame'):
+            pass
+        # Fields set while the span runs are recorded with it
+        outer['rows'] = 42
+    assert current_run() is run
+    assert [name for name, _, _ in run.spans] == ['page.frame', 'page.frame', 'page.load']
+    (outer_seconds, outer_fields), = [(s, f) for name, s, f in run.spans if name == 'page.load']
+    assert outer_fields == {'rows': 42}
+    assert outer_seconds >= sum(s for name, s, _ in run.spans if name == 'page.frame') >= 0.01
+    assert instrumentation.registry.span_count == {'page.load': 1, 'page.frame': 2}
+
+def test_span_recorded_when_body_raises(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'registry', Registry())
+    run = begin_run('page')
+    try:
+        with span('page.load'):
+            raise ValueError('bad data')
+    except ValueError:
+        pass
+    assert [name for name, _, _ in run.spans] == ['page.load']
+
+def test_runs_are_kept_per_thread(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'registry', Registry())
+    runs = {}
+
+    def page(name):
+        runs[name] = begin_run(name)
+        with query_span('BatteryStatus') as query:
+            count_page(100)
+            count_page(50)
+            query.rows = 10
+        with span(f'{name}.render'):
+            pass
+
+    threads = [threading.Thread(target=page, args=(name,)) for name in ('battery', 'bilge')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for name, run in runs.items():
+        assert [span_name for span_name, _, _ in run.spans] == [f'{name}.render']
+        (query,) = run.as_dict()['queries']
+        assert (query['rows'], query['bytes'], query['pages']) == (10, 150, 2)
+    totals = instrumentation.registry.query_totals['BatteryStatus']
+    assert (totals['rows'], totals['bytes'], totals['pages'], totals['queries']) == (20, 300, 4, 2)
+
+def test_prometheus_text_format(monkeypatch, tmp_path):
+    registry = Registry()
+    monkeypatch.setattr(instrumentation, 'registry', registry)
+    run = begin_run('page')
+    with span('battery.frame'):
+        pass
+    with query_span('BatteryStatus') as query:
+        count_page(2048)
+        query.rows = 7
+    with query_span('BoatPositions'):
+        count_page()
+    text = registry.prometheus_text()
+    assert text.endswith('\n')
+    declared = {}
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, metric, kind = line.split(' ')
+            assert kind in ('summary', 'counter')
+            declared[metric] = kind
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, label, value = match.group(1), match.group(3), float(match.group(4))
+        # Every sample belongs to the family declared before it
+        family = re.sub(r'_(sum|count)$', '', name) if name.startswith('boatstatus_span_seconds') else name
+        assert family in declared, line
+        samples[name, label] = value
+    assert declared['boatstatus_span_seconds'] == 'summary'
+    assert all(kind == 'counter' for metric, kind in declared.items() if metric.endswith('_total'))
+    assert samples['boatstatus_span_seconds_count', 'battery.frame'] == 1
+    assert samples['boatstatus_query_rows_total', 'BatteryStatus'] == 7
+    assert samples['boatstatus_query_bytes_total', 'BatteryStatus'] == 2048
+    assert samples['boatstatus_query_pages_total', 'BoatPositions'] == 1
+    assert samples['boatstatus_queries_total', 'BoatPositions'] == 1
+
+    path = tmp_path / 'boatstatus.prom'
+    export_run(run, str(path))
+    assert path.read_text() == text
+    assert not (tmp_path / 'boatstatus.prom.tmp').exists()
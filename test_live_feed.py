@@ -0,0 +1,83 @@
+import threading
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+from backends import SQLiteBackend
+from live_feed import LiveBuffer, LocalEventSource, PollingSource, frame_cursor, open_source, set_source_factory
+from supabase_client import SupabaseClient
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def _time(i):
+    return START + timedelta(seconds=10 * i)
+
+def _row(i):
+    # As the server sends it
+    return {'id': i, 'created_at': _time(i).isoformat(), 'Voltage': 12.0 + i / 1000}
+
+def test_live_buffer_fed_by_local_events():
+    source = LocalEventSource()
+    buffer = LiveBuffer(maxlen=100)
+    pushers = [threading.Thread(target=lambda lo=lo: [source.push(_row(i)) for i in range(lo, lo + 50)]) for lo in (0, 50)]
+    for thread in pushers:
+        thread.start()
+    for thread in pushers:
+        thread.join()
+    assert buffer.append_rows(source.poll()) == 100
+    assert source.poll() == []
+    for i in range(100, 250, 10):
+        for j in range(i, i + 10):
+            source.push(_row(j))
+        buffer.append_rows(source.poll())
+    df = buffer.frame()
+    assert len(buffer) == len(df) == 100
+    np.testing.assert_array_equal(df['id'], np.arange(150, 250))
+    assert str(df['created_at'].dt.tz) == 'UTC'
+    assert buffer.latest()['id'] == 249
+
+def test_open_source_uses_installed_factory():
+    local = LocalEventSource()
+    set_source_factory(lambda supabase, table, columns, after, boats: local)
+    try:
+        source = open_source(None, 'BatteryStatus', ['created_at', 'Voltage'])
+        local.push(_row(1))
+        assert [row['id'] for row in source.poll()] == [1]
+    finally:
+        set_source_factory(None)
+
+def test_polling_continues_from_loaded_frame():
+    backend = SQLiteBackend()
+    backend.insert('BatteryStatus', {'created_at': [_time(i) for i in range(20)], 'Voltage': [12.0] * 20})
+    client = SupabaseClient(backend=backend, cache_path='', rollup_path='')
+    frame = client.fetch_columns('BatteryStatus', columns=['created_at', 'Voltage']).to_frame()
+    # Rows arriving between the load and the first poll
+    backend.insert('BatteryStatus', {'created_at': [_time(i) for i in range(20, 25)], 'Voltage': [11.9] * 5})
+    source = open_source(client, 'BatteryStatus', ['created_at', 'Voltage'], frame_cursor(frame))
+    assert isinstance(source, PollingSource)
+    assert [row['id'] for row in source.poll()] == [21, 22, 23, 24, 25]
+    assert source.poll() == []
+
+def test_polling_picks_up_late_uploads():
+    backend = SQLiteBackend()
+    backend.insert('BatteryStatus', {'created_at': [_time(i) for i in range(10, 20)], 'Voltage': [12.0] * 10})
+    client = SupabaseClient(backend=backend, cache_path='', rollup_path='')
+    source = open_source(client, 'BatteryStatus', ['created_at', 'Voltage'])
+    assert source.poll() == []
+    # Readings buffered on the boat arrive after newer ones
+    backend.insert('BatteryStatus', {'created_at': [_time(i) for i in range(0, 10)], 'Voltage': [11.9] * 10})
+    rows = source.poll()
+    assert [row['id'] for row in rows] == list(range(11, 21))
+    buffer = LiveBuffer()
+    buffer.append_rows([_row(i) for i in range(10, 20)])
+    buffer.append_rows(rows)
+    df = buffer.frame()
+    assert df['created_at'].is_monotonic_increasing
+    assert buffer.latest()['created_at'] == df['created_at'].iloc[-1]
+
+def test_frame_cursor_is_highest_id():
+    df = pd.DataFrame({'created_at': [pd.Timestamp(START + timedelta(seconds=i)) for i in range(3)], 'id': [7, 9, 8]})
+    assert frame_cursor(df) == 9
+
+def test_frame_cursor_needs_ids():
+    assert frame_cursor(pd.DataFrame()) is None
+    assert frame_cursor(pd.DataFrame({'created_at': [pd.Timestamp(START)], 'Voltage': [12.0]})) is None
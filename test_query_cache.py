@@ -0,0 +1,105 @@
+import threading
+import pytest
+import query_cache
+from query_cache import QueryCache
+from transport import mark_stale
+
+class CountingLoader:
+    # Loader that counts its calls, optionally held until released so callers overlap
+    def __init__(self, value='rows', gate=None, error=None):
+        self.value = value
+        self.gate = gate
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+def _run(cache, key, loader, results, n):
+    threads = [threading.Thread(target=lambda: results.append(_call(cache, key, loader))) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def _call(cache, key, loader):
+    try:
+        return cache.get_or_load(key, loader)
+    except Exception as e:
+        return e
+
+def test_concurrent_misses_share_one_load():
+    cache = QueryCache(ttl=60)
+    loader = CountingLoader(gate=threading.Event())
+    results = []
+    threads = _run(cache, 'window', loader, results, 8)
+    assert loader.started.wait(5)
+    loader.gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert loader.calls == 1
+    assert results == ['rows'] * 8
+    assert cache.stats() == {'hits': 7, 'misses': 1, 'entries': 1}
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(query_cache.time, 'monotonic', lambda: clock[0])
+    cache = QueryCache(ttl=60)
+    loader = CountingLoader()
+    cache.get_or_load('window', loader)
+    clock[0] += 59
+    cache.get_or_load('window', loader)
+    assert loader.calls == 1
+    clock[0] += 1
+    cache.get_or_load('window', loader)
+    assert loader.calls == 2
+    assert cache.find(lambda key: key == 'window') == 'rows'
+    clock[0] += 60
+    assert cache.find(lambda key: key == 'window') is None
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(ttl=60, max_entries=2)
+    loaders = {key: CountingLoader(key) for key in 'abc'}
+    cache.get_or_load('a', loaders['a'])
+    cache.get_or_load('b', loaders['b'])
+    # a is used again, so b is the one evicted for c
+    cache.get_or_load('a', loaders['a'])
+    cache.get_or_load('c', loaders['c'])
+    assert cache.stats()['entries'] == 2
+    cache.get_or_load('a', loaders['a'])
+    cache.get_or_load('b', loaders['b'])
+    assert {key: loader.calls for key, loader in loaders.items()} == {'a': 1, 'b': 2, 'c': 1}
+
+def test_stale_results_are_not_cached():
+    cache = QueryCache(ttl=60)
+    loader = CountingLoader(mark_stale([{'id': 1}], None, 'unreachable'))
+    first = cache.get_or_load('window', loader)
+    assert first.stale
+    cache.get_or_load('window', loader)
+    assert loader.calls == 2
+    assert cache.stats()['entries'] == 0
+
+def test_failing_load_releases_waiters():
+    cache = QueryCache(ttl=60)
+    failing = CountingLoader(gate=threading.Event(), error=RuntimeError('server down'))
+    results = []
+    (first,) = _run(cache, 'window', failing, results, 1)
+    assert failing.started.wait(5)
+    # Waiters queue up behind the failing load and then load themselves
+    waiting = _run(cache, 'window', CountingLoader('retried'), results, 3)
+    failing.gate.set()
+    for thread in [first] + waiting:
+        thread.join(5)
+        assert not thread.is_alive()
+    assert sum(isinstance(result, RuntimeError) for result in results) == 1
+    assert results.count('retried') == 3
+    assert cache._inflight == {}
+    with pytest.raises(RuntimeError):
+        cache.get_or_load('other', CountingLoader(error=RuntimeError('again')))
+    assert cache.get_or_load('other', CountingLoader('loaded')) == 'loaded'
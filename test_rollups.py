@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+import pytest
+from columnar import ColumnBatch
+from rollups import RollupStore, pick_resolution
+
+START_NS = 1_704_067_200 * 1_000_000_000  # 2024-01-01 00:00 UTC
+
+def _battery(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    times = START_NS + np.arange(n, dtype=np.int64) * 97 * 1_000_000_000
+    voltage = (12.5 + rng.normal(0, 0.2, n)).astype(np.float32)
+    voltage[::50] = np.nan
+    return ColumnBatch('BatteryStatus', {'id': np.arange(1, n + 1), 'created_at': times, 'Voltage': voltage})
+
+def _part(batch, lo, hi):
+    return ColumnBatch(batch.table, {name: column[lo:hi] for name, column in batch.columns.items()})
+
+@pytest.mark.parametrize('resolution', ['hour', 'day'])
+def test_incremental_updates_merge_like_one_update(resolution):
+    batch = _battery()
+    whole, split = RollupStore(':memory:'), RollupStore(':memory:')
+    whole.update('BatteryStatus', batch)
+    # Cut points inside buckets, so stored buckets are merged with newer rows
+    for lo, hi in [(0, 333), (333, 1000), (1000, 1001), (1001, 2000)]:
+        split.update('BatteryStatus', _part(batch, lo, hi))
+    a = whole.query('BatteryStatus', resolution)
+    b = split.query('BatteryStatus', resolution)
+    np.testing.assert_array_equal(a['readings'], b['readings'])
+    for column in ('Voltage', 'Voltage_min', 'Voltage_max', 'Voltage_last'):
+        np.testing.assert_allclose(a[column], b[column], rtol=1e-9)
+
+def test_hourly_buckets_match_raw_readings():
+    batch = _battery()
+    store = RollupStore(':memory:')
+    store.update('BatteryStatus', batch)
+    df = store.query('BatteryStatus', 'hour')
+    hours = batch['created_at'] // (3600 * 1_000_000_000)
+    voltage = batch['Voltage'].astype(np.float64)
+    first = hours == hours[0]
+    row = df.iloc[0]
+    assert row['readings'] == np.count_nonzero(~np.isnan(voltage[first]))
+    assert row['Voltage'] == pytest.approx(np.nanmean(voltage[first]))
+    assert row['Voltage_min'] == pytest.approx(np.nanmin(voltage[first]))
+    assert row['Voltage_last'] == pytest.approx(voltage[first][~np.isnan(voltage[first])][-1])
+    last = np.flatnonzero((hours == hours[0]) & ~np.isnan(voltage))[-1]
+    assert row['Voltage_last_at'] == pd.Timestamp(int(batch['created_at'][last]), unit='ns', tz='UTC')
+    assert store.watermark('BatteryStatus') == len(batch)
+
+def test_late_rows_merge_into_their_buckets():
+    batch = _battery()
+    # The first 300 readings were uploaded late: they come after the rest, with higher ids
+    late = np.r_[np.arange(300, len(batch)), np.arange(300)]
+    ids = np.r_[np.arange(1, len(batch) - 299), np.arange(len(batch) - 299, len(batch) + 1)]
+    reordered = ColumnBatch(batch.table, {**{name: column[late] for name, column in batch.columns.items()}, 'id': ids})
+    whole, split = RollupStore(':memory:'), RollupStore(':memory:')
+    whole.update('BatteryStatus', batch)
+    split.update('BatteryStatus', _part(reordered, 0, len(batch) - 300))
+    split.update('BatteryStatus', _part(reordered, len(batch) - 300, len(batch)))
+    a, b = whole.query('BatteryStatus', 'hour'), split.query('BatteryStatus', 'hour')
+    np.testing.assert_array_equal(a['readings'], b['readings'])
+    for column in ('Voltage', 'Voltage_min', 'Voltage_max', 'Voltage_last'):
+        np.testing.assert_allclose(a[column], b[column], rtol=1e-9)
+    assert (a['Voltage_last_at'] == b['Voltage_last_at']).all()
+    assert split.watermark('BatteryStatus') == len(batch)
+
+def test_file_without_last_at_is_rebuilt(tmp_path):
+    import sqlite3
+    path = str(tmp_path / 'rollups.db')
+    store = RollupStore(path)
+    store.update('BatteryStatus', _battery())
+    store._conn.close()
+    # A file from before the last reading time was stored
+    conn = sqlite3.connect(path)
+    conn.execute('ALTER TABLE "BatteryStatus_rollup" DROP COLUMN v_last_at')
+    conn.commit()
+    conn.close()
+    store = RollupStore(path)
+    assert store.watermark('BatteryStatus') is None
+    assert store.query('BatteryStatus', 'hour').empty
+
+def test_unsorted_batch_is_bucketed_in_time_order():
+    batch = _battery(500)
+    order = np.random.default_rng(1).permutation(len(batch))
+    shuffled = ColumnBatch(batch.table, {name: column[order] for name, column in batch.columns.items()})
+    a, b = RollupStore(':memory:'), RollupStore(':memory:')
+    a.update('BatteryStatus', batch)
+    b.update('BatteryStatus', shuffled)
+    np.testing.assert_allclose(a.query('BatteryStatus', 'hour')['Voltage_last'], b.query('BatteryStatus', 'hour')['Voltage_last'])
+
+def test_query_includes_bucket_the_range_starts_in():
+    store = RollupStore(':memory:')
+    store.update('BatteryStatus', _battery())
+    start = datetime(2024, 1, 1, 2, 30, tzinfo=timezone.utc)
+    df = store.query('BatteryStatus', 'hour', start, start + timedelta(hours=3))
+    assert df['created_at'].iloc[0] == datetime(2024, 1, 1, 2, tzinfo=timezone.utc)
+    assert len(df) == 4
+
+def test_pick_resolution():
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert pick_resolution(start, start + timedelta(days=2), 1000) is None
+    assert pick_resolution(start, start + timedelta(days=60), 1000) == 'hour'
+    assert pick_resolution(start, start + timedelta(days=3000), 1000) == 'day'
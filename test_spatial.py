@@ -0,0 +1,112 @@
+import math
+import numpy as np
+from spatial import (ACCURACY_SIGMAS, AnchorWatch, FixIndex, Geofence, GeofenceSet, anchor_drag,
+                     haversine, search_radius)
+from track_processing import EARTH_RADIUS_M, project
+
+def _haversine(lat1, lon1, lat2, lon2):
+    # One pair at a time with math, the reference for every vectorized distance
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+
+def _track(n=3000, lat=43.55, lon=7.02, spread_m=800.0, seed=0):
+    rng = np.random.default_rng(seed)
+    dlat = np.degrees(rng.normal(0, spread_m, n) / EARTH_RADIUS_M)
+    dlon = np.degrees(rng.normal(0, spread_m, n) / EARTH_RADIUS_M) / np.cos(np.radians(lat))
+    return lat + dlat, lon + dlon, rng.uniform(2, 30, n)
+
+def test_haversine_matches_pairwise():
+    lat, lon, _ = _track(200)
+    distances = haversine(43.55, 7.02, lat, lon)
+    np.testing.assert_allclose(distances, [_haversine(43.55, 7.02, a, b) for a, b in zip(lat, lon)], rtol=1e-12)
+    assert math.isclose(haversine(0, 0, 1, 0), EARTH_RADIUS_M * math.pi / 180, rel_tol=1e-12)
+    assert haversine(10, 20, 10, 20) == 0
+
+def test_fix_index_matches_brute_force():
+    lat, lon, accuracy = _track()
+    index = FixIndex(ref_lat=float(lat[0]))
+    # Uneven batches, so queries hit the tree and the pending tail
+    for lo, hi in [(0, 1000), (1000, 1001), (1001, 1200), (1200, 3000)]:
+        index.add(lat[lo:hi], lon[lo:hi], accuracy[lo:hi])
+        assert len(index) == hi
+        x, y = project(lat[:hi], lon[:hi], index.ref_lat)
+        for i in (0, hi // 2, hi - 1):
+            for radius in (50.0, 400.0):
+                expected = np.flatnonzero(np.hypot(x - x[i], y - y[i]) <= radius)
+                np.testing.assert_array_equal(index.within(lat[i], lon[i], radius), expected)
+                # Widened to search_radius, the projected query holds every fix within
+                # the radius on the sphere
+                exact = np.flatnonzero(haversine(lat[i], lon[i], lat[:hi], lon[:hi]) <= radius)
+                widened = index.within(lat[i], lon[i], search_radius(radius, index.ref_lat, lat[i]))
+                assert set(exact) <= set(widened)
+    np.testing.assert_array_equal(index.accuracy, accuracy)
+
+def test_densest_finds_the_mooring():
+    # A few hundred fixes swinging around a mooring, the rest spread along a passage
+    rng = np.random.default_rng(1)
+    moored_lat, moored_lon, _ = _track(600, spread_m=15.0, seed=2)
+    passage_lat = np.linspace(43.40, 43.70, 400)
+    passage_lon = np.linspace(6.90, 7.20, 400) + rng.normal(0, 1e-4, 400)
+    index = FixIndex(ref_lat=43.55)
+    index.add(np.r_[passage_lat, moored_lat], np.r_[passage_lon, moored_lon])
+    best = index.densest(40.0)
+    assert haversine(43.55, 7.02, index.lat[best], index.lon[best]) < 40.0
+
+def test_anchor_watch_drift_and_drag():
+    anchor = (43.55, 7.02)
+    swing = 60.0
+    # Swinging within the circle, then dragging away 2 m per fix
+    lat, lon, accuracy = _track(300, *anchor, spread_m=10.0)
+    steps = np.degrees(np.arange(1, 101) * 2.0 / EARTH_RADIUS_M)
+    lat, lon, accuracy = np.r_[lat, anchor[0] + steps], np.r_[lon, np.full(100, anchor[1])], np.r_[accuracy, np.full(100, 5.0)]
+    beyond = np.array([_haversine(*anchor, a, b) for a, b in zip(lat, lon)]) - swing - ACCURACY_SIGMAS * accuracy
+    outside = beyond > 0
+
+    watch = AnchorWatch(swing, anchor=anchor)
+    flags = [watch.update(lat[lo:lo + 37], lon[lo:lo + 37], accuracy[lo:lo + 37]) for lo in range(0, len(lat), 37)]
+    # Brute force: consecutive outside fixes ending at the latest one
+    run = len(outside) - 1 - np.flatnonzero(~outside)[-1]
+    assert watch.outside_run == run
+    assert watch.dragging and flags[-1] and not flags[0]
+    assert math.isclose(watch.max_drift, beyond.max(), rel_tol=1e-9)
+    assert math.isclose(watch.latest_distance, _haversine(*anchor, lat[-1], lon[-1]), rel_tol=1e-12)
+
+    dragged = anchor_drag(lat, lon, accuracy, *anchor, swing, min_fixes=3)
+    expected = np.zeros(len(outside), dtype=bool)
+    for i in range(len(outside)):
+        # Part of a run of at least three outside fixes
+        for start in range(max(0, i - 2), min(i, len(outside) - 3) + 1):
+            if outside[start:start + 3].all():
+                expected[i] = True
+    np.testing.assert_array_equal(dragged, expected)
+
+def test_anchor_watch_estimates_anchor_and_follows():
+    lat, lon, accuracy = _track(500, spread_m=8.0, seed=3)
+    watch = AnchorWatch(50.0)
+    assert not watch.update(lat, lon, accuracy)
+    assert haversine(43.55, 7.02, *watch.anchor) < 5.0
+    live = watch.follow()
+    assert live.anchor == watch.anchor and live.index is None
+    assert live.update(lat[-1] + np.full(3, 0.01), np.full(3, lon[-1]))
+    assert len(watch.index) == 500 and not watch.dragging
+
+def test_geofences_match_brute_force():
+    # Fences far from the fix index's reference latitude, where the projection stretches
+    fences = [Geofence('south', 43.50, 7.00, 900.0), Geofence('north', 60.10, 5.30, 1500.0),
+              Geofence('arctic', 78.22, 15.60, 700.0)]
+    geofences = GeofenceSet(fences)
+    tracks = [_track(700, f.lat, f.lon, spread_m=f.radius_m, seed=i) for i, f in enumerate(fences)]
+    lat = np.concatenate([t[0] for t in tracks])
+    lon = np.concatenate([t[1] for t in tracks])
+    inside = np.array([[_haversine(f.lat, f.lon, a, b) <= f.radius_m for f in fences] for a, b in zip(lat, lon)])
+
+    for i in range(0, len(lat), 7):
+        assert [f.name for f in geofences.containing(lat[i], lon[i])] == [f.name for f, hit in zip(fences, inside[i]) if hit]
+
+    index = FixIndex(ref_lat=43.5)
+    index.add(lat, lon)
+    expected = sorted(((f, int(i)) for k, f in enumerate(fences)
+                       for i in range(1, len(lat)) if inside[i - 1, k] and not inside[i, k]), key=lambda event: event[1])
+    assert geofences.exits(index) == expected
+    assert GeofenceSet([]).containing(43.5, 7.0) == []
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta, timezone
+import httpx
+import numpy as np
+import pytest
+from backends import SQLiteBackend
+from supabase_client import SupabaseClient
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def _client(n, same_time_every=1, page_size=None):
+    backend = SQLiteBackend()
+    # Runs of `same_time_every` rows share one timestamp, so pages split ties
+    times = [START + timedelta(seconds=60 * (i // same_time_every)) for i in range(n)]
+    backend.insert('BatteryStatus', {'created_at': times, 'Voltage': [float(i) for i in range(n)]})
+    return SupabaseClient(backend=backend, cache_path='', rollup_path='')
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_keyset_pages_return_every_row_once(columnar):
+    client = _client(2500, same_time_every=7)
+    pages = list(client._iter_pages('BatteryStatus', columns=['created_at', 'Voltage'], page_size=100, columnar=columnar))
+    if columnar:
+        ids = np.concatenate([page['id'] for page in pages])
+    else:
+        ids = np.array([row['id'] for page in pages for row in page])
+    assert len(pages) == 25
+    np.testing.assert_array_equal(ids, np.arange(1, 2501))
+
+def test_keyset_after_cursor_skips_seen_rows():
+    client = _client(50, same_time_every=5)
+    rows = client.fetch_battery_data(columns='created_at,Voltage')
+    cursor = (rows[21]['created_at'], rows[21]['id'])
+    newer = [row for page in client._iter_pages('BatteryStatus', columns='created_at,Voltage', after=cursor) for row in page]
+    assert [row['id'] for row in newer] == [row['id'] for row in rows[22:]]
+
+def test_range_bounds_are_inclusive():
+    client = _client(100)
+    batch = client.fetch_columns('BatteryStatus', START + timedelta(minutes=10), START + timedelta(minutes=19), ['Voltage'])
+    np.testing.assert_array_equal(batch['Voltage'], np.arange(10, 20))
+
+def _late_upload_client(n=3000):
+    # A block of readings uploaded late: their ids come after newer readings
+    backend = SQLiteBackend()
+    order = list(range(1000, 1500)) + list(range(0, 1000)) + list(range(1500, n))
+    backend.insert('BatteryStatus', {
+        'created_at': [START + timedelta(seconds=10 * i) for i in order],
+        'Voltage': [float(i) for i in order],
+    })
+    client = SupabaseClient(backend=backend, cache_path='', rollup_path='')
+    requests = []
+    for name in ('fetch_page', 'fetch_columns'):
+        fetch = getattr(backend, name)
+        setattr(backend, name, lambda *a, fetch=fetch, **k: requests.append(1) or fetch(*a, **k))
+    return client, requests
+
+def test_bulk_columns_in_time_order_one_request_per_slice():
+    client, requests = _late_upload_client()
+    batch = client._fetch_bulk('BatteryStatus', columns=['created_at', 'Voltage'], columnar=True)
+    assert len(requests) == 3
+    np.testing.assert_array_equal(batch['Voltage'], np.arange(3000.0))
+
+def test_bulk_rows_in_time_order():
+    client, _ = _late_upload_client()
+    rows = client._fetch_bulk('BatteryStatus', columns='created_at,Voltage')
+    assert [row['Voltage'] for row in rows] == [float(i) for i in range(3000)]
+
+@pytest.mark.parametrize('cache_path', ['', ':memory:'])
+def test_latest_columns_oldest_first(cache_path):
+    backend = SQLiteBackend()
+    backend.insert('BilgePumpStatus', {
+        'created_at': [START + timedelta(minutes=i) for i in range(30)],
+        'Status': ['ON', 'OFF'] * 15,
+        'El_Time': [None, 20.0] * 15,
+    })
+    client = SupabaseClient(backend=backend, cache_path=cache_path, rollup_path='', retention_days=None)
+    batch = client.fetch_latest_columns('BilgePumpStatus', ['created_at', 'Status', 'El_Time'], limit=10)
+    np.testing.assert_array_equal(batch['id'], np.arange(21, 31))
+    assert list(batch['Status'][:2]) == ['ON', 'OFF']
+    assert np.isnan(batch['El_Time'][0]) and batch['El_Time'][1] == 20.0
+    assert batch.last_cursor()[1] == 30
+
+def test_moving_window_falls_back_to_overlapping_copy():
+    client = _client(600)
+    columns = ['created_at', 'Voltage']
+    fresh = client.fetch_columns('BatteryStatus', START, START + timedelta(minutes=300), columns)
+    assert not getattr(fresh, 'stale', False)
+
+    def unreachable(*args, **kwargs):
+        raise httpx.ConnectError('refused')
+    client.backend.fetch_columns = unreachable
+    client._call = lambda fn: fn()
+    # The window has moved on a minute, the earlier copy is cut to it
+    stale = client.fetch_columns('BatteryStatus', START + timedelta(minutes=1), START + timedelta(minutes=301), columns)
+    assert stale.stale
+    np.testing.assert_array_equal(stale['Voltage'], np.arange(1, 301))
+    # Nothing overlaps a window before the copy
+    empty = client.fetch_columns('BatteryStatus', START - timedelta(days=2), START - timedelta(days=1), columns)
+    assert empty.stale and len(empty) == 0
+
+def test_boat_selection_reads_one_boat():
+    backend = SQLiteBackend()
+    backend.insert('BatteryStatus', {
+        'created_at': [START + timedelta(minutes=i) for i in range(60)],
+        'Voltage': [float(i) for i in range(60)],
+        'boat_id': ['a', 'b', 'c'] * 20,
+    })
+    # The local cache holds every boat's rows, a boat selection bypasses it
+    client = SupabaseClient(backend=backend, cache_path=':memory:', rollup_path=':memory:', retention_days=None)
+    batch = client.fetch_columns('BatteryStatus', columns=['Voltage'], boats=['b'])
+    np.testing.assert_array_equal(batch['Voltage'], np.arange(1.0, 60.0, 3.0))
+    bulk = client.fetch_columns('BatteryStatus', columns=['Voltage'], bulk=True, boats=['b'])
+    np.testing.assert_array_equal(bulk['Voltage'], batch['Voltage'])
+    assert len(client.fetch_columns('BatteryStatus', columns=['Voltage'])) == 60
+    assert list(client.fetch_latest_columns('BatteryStatus', ['Voltage'], limit=2, boats=['a'])['Voltage']) == [54.0, 57.0]
+    assert client.latest_id('BatteryStatus', ['a']) == 58
+    assert [row['id'] for row in client.fetch_rows_after('BatteryStatus', client.latest_id('BatteryStatus', ['a']), boats=['c'])] == [60]
+    assert client.fetch_rollup('BatteryStatus', 'hour', boats=['a']) is None
@@ -0,0 +1,61 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from backends import SQLiteBackend
+from columnar import TABLE_SCHEMAS
+from synthetic_telemetry import DEFAULT_START_S, GENERATORS, populate
+
+EXPECTED_COLUMNS = {
+    'BatteryStatus': ['created_at', 'Voltage'],
+    'BoatPositions': ['created_at', 'Lat', 'Long', 'Accuracy'],
+    'BilgePumpStatus': ['created_at', 'Status', 'El_Time'],
+}
+
+@pytest.mark.parametrize('table', sorted(GENERATORS))
+def test_schema_and_dtypes(table):
+    columns = GENERATORS[table](1000, seed=3)
+    # Every stored column but the id, which the database assigns
+    assert list(columns) == EXPECTED_COLUMNS[table]
+    assert set(columns) == set(TABLE_SCHEMAS[table]) - {'id'}
+    assert all(len(values) == 1000 for values in columns.values())
+    # Fixed-width UTC text in time order, starting after the default start
+    stamps = columns['created_at']
+    assert stamps.dtype.kind == 'U' and len({len(s) for s in stamps}) == 1
+    times = np.array([datetime.fromisoformat(s).timestamp() for s in stamps])
+    assert all(s.endswith('+00:00') for s in stamps)
+    assert np.all(np.diff(times) > 0) and times[0] > DEFAULT_START_S
+    for name, values in columns.items():
+        kind = TABLE_SCHEMAS[table][name]
+        if kind == 'category':
+            assert set(values) <= {'ON', 'OFF'}
+        elif kind != 'timestamp':
+            assert values.dtype == np.float64 and not np.isnan(values).any()
+
+def test_value_ranges():
+    battery = GENERATORS['BatteryStatus'](5000)
+    assert 11.0 < battery['Voltage'].min() and battery['Voltage'].max() < 15.0
+    positions = GENERATORS['BoatPositions'](5000)
+    assert np.all(np.abs(positions['Lat']) <= 90) and np.all(positions['Accuracy'] >= 0)
+    pump = GENERATORS['BilgePumpStatus'](999)
+    # OFF events carry the run time, ON events none
+    assert list(pump['Status'][:4]) == ['ON', 'OFF', 'ON', 'OFF']
+    assert np.all(pump['El_Time'][0::2] == 0) and np.all(pump['El_Time'][1::2] > 0)
+
+@pytest.mark.parametrize('table', sorted(GENERATORS))
+def test_same_seed_same_data(table):
+    first, again, other = (GENERATORS[table](2000, seed=seed) for seed in (7, 7, 8))
+    for name in first:
+        np.testing.assert_array_equal(first[name], again[name])
+    assert any(not np.array_equal(first[name], other[name]) for name in first)
+
+def test_populate_is_deterministic():
+    backends = [SQLiteBackend(), SQLiteBackend()]
+    for backend in backends:
+        populate(backend, 2500, seed=1, chunk_size=1000)
+    for table, names in EXPECTED_COLUMNS.items():
+        rows = [backend.fetch_page(table, ','.join(['id'] + names), limit=5000) for backend in backends]
+        assert len(rows[0]) == 2500
+        assert rows[0] == rows[1]
+        # Chunks continue in time order
+        stamps = [row['created_at'] for row in rows[0]]
+        assert stamps == sorted(stamps)
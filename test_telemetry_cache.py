@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from backends import SQLiteBackend
+from supabase_client import SupabaseClient
+from telemetry_cache import TelemetryCache
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def _insert(backend, minutes):
+    backend.insert('BatteryStatus', {
+        'created_at': [START + timedelta(minutes=m) for m in minutes],
+        'Voltage': [float(m) for m in minutes],
+    })
+
+def _cached_client(backend):
+    return SupabaseClient(backend=backend, cache_path=':memory:', rollup_path='', retention_days=None)
+
+def test_sync_picks_up_late_uploaded_rows():
+    backend = SQLiteBackend()
+    _insert(backend, range(10, 20))
+    client = _cached_client(backend)
+    assert len(client.fetch_columns('BatteryStatus', START, START + timedelta(hours=1), ['Voltage'])) == 10
+    # A buffer uploaded late: new ids, readings older than everything cached
+    _insert(backend, range(0, 10))
+    _insert(backend, range(20, 25))
+    batch = client.fetch_columns('BatteryStatus', START, START + timedelta(hours=1), ['Voltage'])
+    np.testing.assert_array_equal(batch['Voltage'], np.arange(25.0))
+    assert client.cache.watermark('BatteryStatus') == 25
+
+def test_sync_fetches_only_new_ids():
+    backend = SQLiteBackend()
+    _insert(backend, range(30))
+    client = _cached_client(backend)
+    client.fetch_columns('BatteryStatus', START, columns=['Voltage'])
+    pages = []
+    fetch = backend.fetch_page
+    backend.fetch_page = lambda *a, **k: pages.append(k.get('after_id')) or fetch(*a, **k)
+    _insert(backend, [5])
+    client.fetch_columns('BatteryStatus', START, columns=['Voltage'])
+    assert pages == [30]
+    assert len(client.cache.query('BatteryStatus')) == 31
+
+def test_watermark_only_moves_forward():
+    cache = TelemetryCache(':memory:')
+    assert cache.watermark('BatteryStatus') is None
+    row = lambda i: {'id': i, 'created_at': (START + timedelta(minutes=i)).isoformat(), 'Voltage': 12.0}
+    cache.insert('BatteryStatus', [row(7), row(3)])
+    cache.insert('BatteryStatus', [row(5)])
+    assert cache.watermark('BatteryStatus') == 7
+    assert [r['id'] for r in cache.query('BatteryStatus')] == [3, 5, 7]
+
+def test_column_selection_keeps_the_cursor_columns():
+    backend = SQLiteBackend()
+    _insert(backend, range(5))
+    client = _cached_client(backend)
+    cached = client.fetch_battery_data(START, columns='Voltage')
+    assert cached == SupabaseClient(backend=backend, cache_path='', rollup_path='').fetch_battery_data(START, columns='Voltage')
+    assert set(cached[0]) == {'Voltage', 'created_at', 'id'}
+
+def test_latest_rows_of_a_cold_cache_are_one_request():
+    backend = SQLiteBackend()
+    _insert(backend, range(3000))
+    client = _cached_client(backend)
+    pages = []
+    fetch = backend.fetch_page
+    backend.fetch_page = lambda *a, **k: pages.append(k) or fetch(*a, **k)
+    batch = client.fetch_latest_columns('BatteryStatus', ['Voltage'], limit=5)
+    np.testing.assert_array_equal(batch['Voltage'], np.arange(2995.0, 3000.0))
+    assert pages == []
+    assert client.cache.watermark('BatteryStatus') is None
+
+def test_first_fill_covers_the_window_read():
+    backend = SQLiteBackend()
+    _insert(backend, range(3000))
+    client = _cached_client(backend)
+    since = START + timedelta(minutes=2990)
+    assert len(client.fetch_columns('BatteryStatus', since, columns=['Voltage'])) == 10
+    assert len(client.cache.query('BatteryStatus')) == 10
+    # Cached now, the newest rows come from the local copy
+    np.testing.assert_array_equal(client.fetch_latest_columns('BatteryStatus', ['Voltage'], limit=3)['Voltage'],
+                                  [2997.0, 2998.0, 2999.0])
+    # More than the local copy holds, from the server
+    np.testing.assert_array_equal(client.fetch_latest_columns('BatteryStatus', ['Voltage'], limit=20)['Voltage'],
+                                  np.arange(2980.0, 3000.0))
+    # A read reaching further back backfills the rows before the fill start, without
+    # moving the watermark past rows not synced yet
+    _insert(backend, [5, 2995])
+    earlier = START + timedelta(minutes=2900)
+    batch = client.fetch_columns('BatteryStatus', earlier, columns=['Voltage'])
+    np.testing.assert_array_equal(np.sort(batch['Voltage']), np.sort(np.r_[np.arange(2900.0, 3000.0), 2995.0]))
+    assert client.cache.watermark('BatteryStatus') == 3002
+    assert client.cache.holds('BatteryStatus', earlier)
+    assert not client.cache.holds('BatteryStatus', START)
+    assert len(client.fetch_columns('BatteryStatus', START, columns=['Voltage'])) == 3002
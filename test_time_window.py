@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+import pytest
+from columnar import ColumnBatch
+from query_cache import shared_cache
+from rollups import RESOLUTIONS, RollupStore
+from time_window import load_window, normalize_window, slice_window
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    shared_cache.clear()
+    yield
+    shared_cache.clear()
+
+def _rollup_loader(resolution, calls):
+    n = 5000
+    times = (pd.Timestamp(START).value + np.arange(n, dtype=np.int64) * 300 * 1_000_000_000)
+    store = RollupStore(':memory:')
+    store.update('BatteryStatus', ColumnBatch('BatteryStatus', {
+        'id': np.arange(1, n + 1), 'created_at': times, 'Voltage': np.linspace(12, 13, n).astype(np.float32)}))
+
+    def loader(start, end):
+        calls.append((start, end))
+        return store.query('BatteryStatus', resolution, start, end)
+    return loader
+
+@pytest.mark.parametrize('resolution', ['hour', 'day'])
+def test_rollup_slice_keeps_the_starting_bucket(resolution):
+    calls = []
+    loader = _rollup_loader(resolution, calls)
+    bucket = RESOLUTIONS[resolution]
+    load_window('BatteryStatus', START, START + timedelta(days=15), loader, variant=resolution, bucket=bucket)
+    start, end = START + timedelta(days=2, hours=5, minutes=30), START + timedelta(days=9)
+    sliced = load_window('BatteryStatus', start, end, loader, variant=resolution, bucket=bucket)
+    assert len(calls) == 1
+    direct = loader(*normalize_window(start, end))
+    pd.testing.assert_frame_equal(sliced.reset_index(drop=True), direct.reset_index(drop=True))
+
+def test_raw_slice_starts_at_the_window():
+    calls = []
+    frame = pd.DataFrame({'created_at': pd.date_range(START, periods=1000, freq='min', tz='UTC'), 'Voltage': np.arange(1000.0)})
+
+    def loader(start, end):
+        calls.append(1)
+        return slice_window(frame, start, end)
+    load_window('BatteryStatus', START, START + timedelta(hours=16), loader, variant='raw')
+    sliced = load_window('BatteryStatus', START + timedelta(minutes=90), START + timedelta(hours=3), loader, variant='raw')
+    assert len(calls) == 1
+    np.testing.assert_array_equal(sliced['Voltage'], np.arange(90.0, 181.0))
@@ -0,0 +1,49 @@
+import numpy as np
+from track_processing import dedup_stationary, douglas_peucker, simplify_track, track_colors, LATEST_COLOR
+
+def _segment_distance(px, py, ax, ay, bx, by):
+    dx, dy = bx - ax, by - ay
+    length = np.hypot(dx, dy)
+    if length == 0:
+        return np.hypot(px - ax, py - ay)
+    return np.abs(dx * (py - ay) - dy * (px - ax)) / length
+
+def test_douglas_peucker_straight_line_keeps_ends():
+    x = np.linspace(0, 100, 50)
+    np.testing.assert_array_equal(douglas_peucker(x, 2 * x, 0.5), [0, 49])
+
+def test_douglas_peucker_within_tolerance():
+    rng = np.random.default_rng(0)
+    x = np.cumsum(rng.normal(1, 0.5, 2000))
+    y = np.cumsum(rng.normal(0, 1, 2000))
+    tolerance = 3.0
+    kept = douglas_peucker(x, y, tolerance)
+    assert kept[0] == 0 and kept[-1] == len(x) - 1
+    # Every dropped point lies within tolerance of the kept segment spanning it
+    for a, b in zip(kept[:-1], kept[1:]):
+        between = np.arange(a + 1, b)
+        if len(between):
+            assert _segment_distance(x[between], y[between], x[a], y[a], x[b], y[b]).max() <= tolerance + 1e-9
+
+def test_douglas_peucker_keeps_corner():
+    x = np.r_[np.arange(10.0), np.full(10, 9.0)]
+    y = np.r_[np.zeros(10), np.arange(1.0, 11.0)]
+    assert 9 in douglas_peucker(x, y, 0.1)
+
+def test_dedup_stationary_keeps_first_and_last():
+    x = np.r_[np.zeros(5), np.full(5, 100.0)]
+    np.testing.assert_array_equal(dedup_stationary(x, np.zeros(10), 10.0), [0, 5, 9])
+
+def test_simplify_track_fewer_points_when_zoomed_out():
+    rng = np.random.default_rng(1)
+    lat = 43.5 + np.cumsum(rng.normal(0, 1e-4, 5000))
+    lon = 7.0 + np.cumsum(rng.normal(0, 1e-4, 5000))
+    far, near = simplify_track(lat, lon, 8), simplify_track(lat, lon, 16)
+    assert len(far) < len(near) <= len(lat)
+    assert far[-1] == near[-1] == len(lat) - 1
+    assert len(simplify_track(np.empty(0), np.empty(0), 10)) == 0
+
+def test_track_colors_highlight_latest():
+    colors = track_colors(3)
+    assert tuple(colors[-1]) == LATEST_COLOR and tuple(colors[0]) != LATEST_COLOR
+    assert track_colors(0).shape == (0, 3)
@@ -0,0 +1,61 @@
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+from transport import CircuitBreaker, CircuitOpenError, is_transient, with_retry
+
+def _api_error(code):
+    return APIError({'message': 'failed', 'code': code, 'hint': None, 'details': None})
+
+@pytest.mark.parametrize('error, transient', [
+    (httpx.ConnectError('refused'), True),
+    (httpx.ReadTimeout('stalled'), True),
+    (TimeoutError(), True),
+    (_api_error(502), True),
+    (_api_error('503'), True),
+    (_api_error('PGRST000'), True),
+    (_api_error('57014'), True),
+    (_api_error(404), False),
+    (_api_error('PGRST116'), False),
+    (_api_error('42703'), False),
+    (ValueError('bad data'), False),
+    (CircuitOpenError(), False),
+])
+def test_transient_errors(error, transient):
+    assert is_transient(error) is transient
+
+def _failing(error):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise error
+    return fn, calls
+
+def test_client_errors_are_not_retried_or_counted():
+    breaker = CircuitBreaker(threshold=2)
+    fn, calls = _failing(_api_error('42703'))
+    for _ in range(3):
+        with pytest.raises(APIError):
+            with_retry(fn, backoff=0, breaker=breaker)
+    assert len(calls) == 3
+    assert breaker.state == 'closed' and breaker.failures == 0
+
+def test_transport_errors_are_retried_and_open_the_circuit():
+    breaker = CircuitBreaker(threshold=3, reset_after=60)
+    fn, calls = _failing(httpx.ConnectError('refused'))
+    with pytest.raises(httpx.ConnectError):
+        with_retry(fn, retries=2, backoff=0, breaker=breaker)
+    assert len(calls) == 3
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        with_retry(fn, retries=2, backoff=0, breaker=breaker)
+    assert len(calls) == 3
+
+def test_server_answer_closes_a_half_open_circuit():
+    breaker = CircuitBreaker(threshold=1, reset_after=0)
+    with pytest.raises(httpx.ConnectError):
+        breaker.call(_failing(httpx.ConnectError('refused'))[0])
+    assert breaker.state == 'half-open'
+    with pytest.raises(APIError):
+        breaker.call(_failing(_api_error('PGRST116'))[0])
+    assert breaker.state == 'closed'
@@ -0,0 +1,102 @@
+from datetime import datetime, time, timedelta, timezone
+import numpy as np
+import pandas as pd
+from query_cache import shared_cache
+
+# Date ranges shared by every page: sidebar selections become UTC bounds, bounds are
+# normalized into one cache key per window, and loaded frames are cut to a window by
+# binary search on their sorted created_at column instead of a mask over every row.
+# The telemetry is stored in UTC, so every bound here is UTC too.
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+def utc_today():
+    # Today's date in UTC, not the server's local date
+    return utc_now().date()
+
+def to_utc(value):
+    # A date is midnight UTC, a naive datetime is taken as UTC, an aware one is converted
+    if not isinstance(value, datetime):
+        return datetime.combine(value, time.min, tzinfo=timezone.utc)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def day_bounds(start_day, end_day):
+    # Whole UTC days from the date inputs, the end day included
+    if isinstance(start_day, datetime):
+        start_day = to_utc(start_day).date()
+    if isinstance(end_day, datetime):
+        end_day = to_utc(end_day).date()
+    return (datetime.combine(start_day, time.min, tzinfo=timezone.utc),
+            datetime.combine(end_day, time.max, tzinfo=timezone.utc))
+
+def recent_bounds(hours, now=None):
+    now = to_utc(now) if now is not None else utc_now()
+    return now - timedelta(hours=hours), now
+
+def floor_to_minute(value):
+    return value - timedelta(seconds=value.second, microseconds=value.microsecond)
+
+def normalize_window(start, end):
+    # Widen the window to whole minutes in UTC so requests made within the same minute
+    # match, whichever page or timezone they came from
+    start = floor_to_minute(to_utc(start))
+    end = to_utc(end)
+    rounded_end = floor_to_minute(end)
+    if rounded_end != end:
+        rounded_end += timedelta(minutes=1)
+    return start, rounded_end
+
+def window_key(table, start, end, variant=None):
+    # variant tells apart frames of the same window that hold different data, such as
+    # raw rows and hourly rollups
+    return (table, variant, start.isoformat(), end.isoformat())
+
+def utc_column(values):
+    # Timestamps as a UTC datetime column, whatever offset or format they arrive in
+    return pd.to_datetime(values, format='ISO8601', utc=True)
+
+def _epoch_ns(value):
+    return pd.Timestamp(to_utc(value)).value
+
+def _times_ns(times):
+    # Sorted datetime column (or epoch nanoseconds) as int64, without a per-row conversion
+    if isinstance(times, (pd.Series, pd.Index)) and not pd.api.types.is_integer_dtype(times):
+        return pd.DatetimeIndex(times).as_unit('ns').asi8
+    return np.asarray(times, dtype=np.int64)
+
+def window_positions(times, start=None, end=None):
+    # (lo, hi) of the rows with start <= time <= end, two binary searches
+    times = _times_ns(times)
+    lo = 0 if start is None else int(np.searchsorted(times, _epoch_ns(start), side='left'))
+    hi = len(times) if end is None else int(np.searchsorted(times, _epoch_ns(end), side='right'))
+    return lo, max(lo, hi)
+
+def slice_window(df, start=None, end=None, column='created_at'):
+    # Rows of a frame sorted by column that fall in the window, as a positional slice
+    lo, hi = window_positions(df[column], start, end)
+    return df.iloc[lo:hi]
+
+def floor_to_bucket(value, seconds):
+    return value - timedelta(seconds=value.timestamp() % seconds)
+
+def load_window(table, start, end, loader, variant=None, bucket=None):
+    # Frame for the window from the process-wide cache. A cached frame of a wider window
+    # is sliced instead of loading again, so narrowing a range costs two binary searches.
+    # loader(start, end) gets the normalized bounds and must return a frame sorted by
+    # created_at. Cached frames are shared across sessions, callers get a copy.
+    # bucket is the width in seconds of aggregated rows stamped with their bucket start,
+    # the bucket the window starts in is kept when slicing.
+    start, end = normalize_window(start, end)
+    key = window_key(table, start, end, variant)
+    first, last = start.isoformat(), end.isoformat()
+
+    def covers(other):
+        return other[:2] == key[:2] and other[2] <= first and other[3] >= last
+
+    wider = shared_cache.find(covers)
+    if wider is not None:
+        return slice_window(wider, floor_to_bucket(start, bucket) if bucket else start, end).copy()
+    return shared_cache.get_or_load(key, lambda: loader(start, end)).copy()
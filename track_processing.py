@@ -0,0 +1,80 @@
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+# Ground resolution of a web-mercator tile pixel at the equator for zoom 0
+METERS_PER_PIXEL_Z0 = 156543.03392
+
+TRACK_COLOR = (255, 0, 0)
+LATEST_COLOR = (0, 0, 255)
+
+def meters_per_pixel(lat, zoom):
+    return METERS_PER_PIXEL_Z0 * np.cos(np.radians(lat)) / 2 ** zoom
+
+def project(lat, lon, ref_lat=None):
+    # Local equirectangular projection in meters, accurate enough over a boat's range
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    if ref_lat is None:
+        ref_lat = lat.mean() if len(lat) else 0.0
+    x = np.radians(lon) * EARTH_RADIUS_M * np.cos(np.radians(ref_lat))
+    y = np.radians(lat) * EARTH_RADIUS_M
+    return x, y
+
+def dedup_stationary(x, y, cell_m):
+    # Snap fixes to a grid of cell_m meters and keep only the first fix of every run
+    # spent in the same cell. The last fix is always kept.
+    n = len(x)
+    if n < 3 or cell_m <= 0:
+        return np.arange(n)
+    cx = np.floor(x / cell_m).astype(np.int64)
+    cy = np.floor(y / cell_m).astype(np.int64)
+    moved = np.empty(n, dtype=bool)
+    moved[0] = True
+    moved[1:] = (cx[1:] != cx[:-1]) | (cy[1:] != cy[:-1])
+    moved[-1] = True
+    return np.flatnonzero(moved)
+
+def douglas_peucker(x, y, tolerance):
+    # Iterative Douglas-Peucker, each segment's point distances are computed at once
+    n = len(x)
+    if n < 3 or tolerance <= 0:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            dist = np.hypot(px, py)
+        else:
+            dist = np.abs(dx * py - dy * px) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep)
+
+def simplify_track(lat, lon, zoom, pixel_tolerance=1.0):
+    # Indices of the fixes worth drawing at this zoom: stationary fixes within one
+    # tolerance cell are collapsed, then the remaining line is simplified.
+    if len(lat) == 0:
+        return np.arange(0)
+    x, y = project(lat, lon)
+    tolerance = pixel_tolerance * meters_per_pixel(np.mean(lat), zoom)
+    idx = dedup_stationary(x, y, tolerance)
+    return idx[douglas_peucker(x[idx], y[idx], tolerance)]
+
+def track_colors(n):
+    # One RGB row per fix, the most recent fix highlighted
+    colors = np.empty((n, 3), dtype=np.uint8)
+    colors[:] = TRACK_COLOR
+    if n:
+        colors[-1] = LATEST_COLOR
+    return colors
@@ -0,0 +1,182 @@
+import copy
+import os
+import random
+import threading
+import time
+from instrumentation import logger
+
+# Per-request timeouts in seconds, a stalled cellular link fails instead of blocking the rerun
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("BOATSTATUS_HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT = float(os.environ.get("BOATSTATUS_HTTP_TIMEOUT", "20"))
+# Keep-alive connections pooled for all sessions and bulk workers
+HTTP_MAX_CONNECTIONS = int(os.environ.get("BOATSTATUS_HTTP_MAX_CONNECTIONS", "16"))
+
+# Retries of idempotent reads, the delay doubles on every attempt
+RETRIES = 3
+BACKOFF = 0.5  # Seconds
+
+# Consecutive failures that open the circuit, and seconds before a trial request is let through
+BREAKER_THRESHOLD = int(os.environ.get("BOATSTATUS_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET = float(os.environ.get("BOATSTATUS_BREAKER_RESET", "30"))
+
+def http_client():
+    # One pooled, thread-safe HTTP client for the process, handed to supabase
+    import httpx
+    return httpx.Client(
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+    )
+
+class CircuitOpenError(Exception):
+    pass
+
+# SQLSTATE classes of failures that go away on their own: connection exceptions,
+# transaction rollbacks (serialization failures), insufficient resources and operator
+# intervention (statement timeouts, shutdowns)
+TRANSIENT_SQLSTATE_CLASSES = ('08', '40', '53', '57')
+
+def _status(error):
+    # HTTP status of a failed request when the error carries one. PostgREST errors without
+    # a JSON body carry the status as their code.
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is None:
+        code = getattr(error, 'code', None)
+        if isinstance(code, int) or (isinstance(code, str) and len(code) == 3 and code.isdigit()):
+            status = int(code)
+    return status
+
+def server_answered(error):
+    # True when the server returned an error response, it is up whatever the error says
+    return _status(error) is not None or isinstance(getattr(error, 'code', None), str)
+
+def is_transient(error):
+    # Failures worth retrying and counted by the circuit breaker: network errors, timeouts
+    # and 5xx responses. A 4xx (bad filter, missing column, expired token) fails the same
+    # way on every attempt and says nothing about the server being unreachable.
+    if isinstance(error, CircuitOpenError):
+        return False
+    status = _status(error)
+    if status is not None:
+        return status >= 500
+    code = getattr(error, 'code', None)
+    if isinstance(code, str):
+        # PostgREST's own PGRST0xx codes mean it cannot reach the database
+        return code.startswith('PGRST0') or code[:2] in TRANSIENT_SQLSTATE_CLASSES
+    if isinstance(error, (TimeoutError, ConnectionError, OSError)):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(error, httpx.TransportError)
+
+class CircuitBreaker:
+    # Stops hammering an unreachable server: after `threshold` consecutive failures every
+    # call fails fast until `reset_after` seconds have passed, then a single trial call
+    # decides whether the circuit closes again
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_after=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half-open' if self._trial or time.monotonic() - self.opened_at >= self.reset_after else 'open'
+
+    def _allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self.opened_at >= self.reset_after:
+                self._trial = True
+                return True
+            return False
+
+    def _release(self):
+        # A call that neither proved nor disproved the server, a trial may run again
+        with self._lock:
+            self._trial = False
+
+    def _record(self, ok):
+        with self._lock:
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self._trial or self.failures >= self.threshold:
+                    if self.opened_at is None:
+                        logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                    self.opened_at = time.monotonic()
+            self._trial = False
+
+    def call(self, fn):
+        if not self._allow():
+            raise CircuitOpenError("Telemetry server unavailable, circuit open")
+        try:
+            result = fn()
+        except Exception as e:
+            if is_transient(e):
+                self._record(False)
+            elif server_answered(e):
+                self._record(True)
+            else:
+                self._release()
+            raise
+        self._record(True)
+        return result
+
+def with_retry(fn, retries=RETRIES, backoff=BACKOFF, breaker=None):
+    # Jittered exponential backoff, for reads only. Only transient failures are retried,
+    # an open circuit or a 4xx is raised at once.
+    for attempt in range(retries + 1):
+        try:
+            return breaker.call(fn) if breaker is not None else fn()
+        except Exception as e:
+            if attempt == retries or not is_transient(e):
+                raise
+            delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning(f"Request failed ({str(e)}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+class StaleResult(list):
+    # Rows served from the last-known-good copy while the server is unreachable
+    stale = True
+
+    def __init__(self, rows=(), as_of=None, error=None):
+        super().__init__(rows)
+        self.as_of = as_of
+        self.error = error
+
+def mark_stale(result, as_of, error):
+    # Flagged copy, the stored last-known-good result itself stays unmarked
+    if isinstance(result, list):
+        return StaleResult(result, as_of, error)
+    result = copy.copy(result)
+    result.stale, result.as_of, result.error = True, as_of, error
+    return result
+
+def _stale_info(result):
+    # DataFrames carry the flag in attrs, rows and column batches as attributes
+    info = getattr(result, 'attrs', None)
+    if isinstance(info, dict):
+        return info
+    return {name: getattr(result, name, None) for name in ('stale', 'as_of', 'error')}
+
+def is_stale(result):
+    return bool(_stale_info(result).get('stale'))
+
+def stale_notice(result):
+    # Warning for the pages, None when the result is fresh
+    info = _stale_info(result)
+    if not info.get('stale'):
+        return None
+    if info.get('as_of') is None:
+        return f"Telemetry server unreachable ({info.get('error')}), no earlier data to show."
+    return f"Telemetry server unreachable, showing data last refreshed {info['as_of']:%Y-%m-%d %H:%M:%S} UTC."